@@ -1,127 +1,496 @@
-from data import FIELD_H_BOUND, FIELD_HEIGHT, FIELD_WIDTH
+from collections import OrderedDict
 
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_HEIGHT, FIELD_WIDTH
+from tetramino import pieces_data
+import reachability
+import board_arena
+import game_clock
+import vector_ai
 
-def AI_worker(ready_queue, todo_queue):
+# Candidate piece positions
+COLS = range(FIELD_H_BOUND - 1, FIELD_WIDTH + FIELD_H_BOUND - 1)
+ROWS = range(0, FIELD_HEIGHT)
+
+# Row masks of the board outside of the play field (see player_game.ActiveBoard)
+FULL_ROW = (1 << (FIELD_WIDTH + 2 * FIELD_H_BOUND)) - 1
+NEW_LINE_MASK = FULL_ROW ^ (((1 << FIELD_WIDTH) - 1) << FIELD_H_BOUND)
+FIELD_ROWS = FIELD_HEIGHT + FIELD_V_BOUND
+SPAWN_ROW = 0
+SPAWN_COL = (FIELD_WIDTH + 2 * FIELD_H_BOUND) // 2 - 2
+
+# Lookahead effort with idle workers: pieces placed per line of play, lines kept and seconds per decision
+BEAM_DEPTH = 3
+BEAM_WIDTH = 6
+BEAM_BUDGET = 0.05
+
+
+def column_heights(board, masks=None):
     """
-    Basic worker for multiprocessing of AI
+    Return the first occupied row of every board column, walls included
+
+    Rows are read top down through their bitmasks, each set bit being resolved once,
+    from masks when given or else from the rows themselves
+    """
+    if masks is None:
+        masks = [line.mask for line in board]
+    heights = [len(board)] * len(board[0])
+    seen = 0
+    for row, mask in enumerate(masks):
+        new = mask & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = row
+            new ^= low
+        seen |= mask
+    return heights
 
-    Listens to todo_queue for games in need of AI calculations
 
-    Returns new piece positions through ready_queue
+def below_piece_score(board, row, col, bottoms, size):
     """
+    Calculate and return a scored based on what would be under a piece
 
-    def quick_fill():
-        """
-        Calculate ideal position to drop tetramino piece
+    Looks at the slots between the lowest block of each piece column and the bottom of the piece's square
+
+    From 0 (worst) to 10 (best)
+    """
+    holes_total = 0
+    floors_total = 0
+
+    # Calculate for each column
+    for piece_col, bottom in bottoms:
+        for piece_row in range(bottom + 1, size):
+            slot = board[row + piece_row][col + piece_col]
+            if slot == 0:
+                holes_total += 1
+            elif slot == 9:
+                floors_total += 1
+
+    if holes_total > 1:
+        return 0
+    elif holes_total == 1:
+        if floors_total == 0:
+            return 1
+        else:
+            return 2
+    else:
+        if floors_total == 0:
+            return 6
+        else:
+                return 10
+
+
+def below_piece_score_masks(masks, row, col, bottoms, size):
+    """
+    Same score as below_piece_score, on a tuple of row bitmasks
+
+    Occupied slots outside of the play field are walls, standing for the floors of below_piece_score
+    """
+    holes_total = 0
+    floors_total = 0
+
+    for piece_col, bottom in bottoms:
+        bit = 1 << (col + piece_col)
+        wall_col = not FIELD_H_BOUND <= col + piece_col < FIELD_H_BOUND + FIELD_WIDTH
+        for piece_row in range(bottom + 1, size):
+            if not masks[row + piece_row] & bit:
+                holes_total += 1
+            elif wall_col or row + piece_row >= FIELD_ROWS:
+                floors_total += 1
+
+    if holes_total > 1:
+        return 0
+    elif holes_total == 1:
+        if floors_total == 0:
+            return 1
+        else:
+            return 2
+    else:
+        if floors_total == 0:
+            return 6
+        else:
+                return 10
+
+
+def quick_fill(board, piece_data, evaluate=below_piece_score, max_bonus=10, masks=None):
+    """
+    Calculate ideal position to drop tetramino piece
+
+    Constraints are:
+     - A clear drop path
+     - Lowest row reachable weighted by covered open slots
+
+    board is a list of rows carrying bitmasks (see player_game.Row), piece_data a compiled data.pieces_data entry,
+    masks the row bitmasks when the rows don't carry them
+
+    evaluate(board, row, col, bottoms, size) scores a position from 0 to max_bonus, added to its row
+
+    Returns a tuple containing new shape and new column to drop from
+
+    Each rotation and column drops straight onto the column heights: the piece lands one row above the
+    first surface under any of its columns. Every row of the drop path within max_bonus of the landing
+    row is scored, higher ones can never win. Ties go to the lowest row, then the first shape and column
+    """
+    heights = column_heights(board, masks)
+    size = len(piece_data['positions'][0])
+
+    best_found = None
+    new_col = 0
+    new_shape = 0
+    for shape_index, bottoms in enumerate(piece_data['bottoms']):
+        for col in COLS:
+            # Landing row of a straight drop from the top
+            landing = ROWS[-1]
+            for piece_col, bottom in bottoms:
+                if col + piece_col < 0:
+                    landing = -1
+                    break
+                landing = min(landing, heights[col + piece_col] - 1 - bottom)
+            # Blocked from the start
+            if landing < 0:
+                continue
+
+            for row in range(landing, max(landing - max_bonus, 0) - 1, -1):
+                # Rows going up, none left can beat the best score
+                if best_found is not None and row + max_bonus < best_found[0]:
+                    break
+                # Weight this solution and check against best so far
+                found = (row + evaluate(board, row, col, bottoms, size), row, -shape_index, -col)
+                if best_found is None or found > best_found:
+                    best_found = found
+                    new_col = col
+                    new_shape = shape_index
+
+    return new_shape, new_col
+
+
+def best_move(board, type_id, row, col, evaluate=below_piece_score, masks=None):
+    """
+    Calculate ideal resting position for a piece anywhere it can reach, tucks and spins included
+
+    (row, col) is where the piece starts, in its first rotation
+
+    Positions are scored like quick_fill: their row plus evaluate(board, row, col, bottoms, size),
+    ties going to the lowest row, then the first shape and column
+
+    masks are the row bitmasks of the board, read from its rows when not given
+
+    Returns a tuple of new shape, row, column and the moves leading there, None if the piece can't move
+    """
+    piece_data = pieces_data[type_id]
+    size = len(piece_data['positions'][0])
+    if masks is None:
+        masks = tuple(line.mask for line in board)
+
+    best_found = None
+    best = None
+    for (new_row, new_col, new_shape), moves in reachability.landing_positions(masks, type_id, row, col):
+        # Weight this solution and check against best so far
+        found = (new_row + evaluate(board, new_row, new_col, piece_data['bottoms'][new_shape], size),
+                 new_row, -new_shape, -new_col)
+        if best_found is None or found > best_found:
+            best_found = found
+            best = new_shape, new_row, new_col, moves
+
+    return best
+
+
+def quick_move(board, type_id, row, col, masks=None):
+    """
+    Cheap stand-in for best_move when time is short: straight drops only, picked by quick_fill
+
+    Returns the moves leading there (see drop_moves)
+    """
+    if masks is None:
+        masks = tuple(line.mask for line in board)
+    new_shape, new_col = quick_fill(board, pieces_data[type_id], masks=masks)
+    return drop_moves(masks, type_id, row, col, new_shape, new_col)
+
+
+def drop_moves(masks, type_id, row, col, new_shape, new_col):
+    """
+    Return the moves turning a piece to new_shape then sliding it above new_col for a straight drop,
+    following kicks like the game does
+    """
+    piece_data = pieces_data[type_id]
+    size = len(piece_data['positions'][0])
+    moves = []
+    shape_index = 0
+    while shape_index != new_shape:
+        turned_col = reachability.turn(masks, row, col, shape_index, (shape_index + 1) % size, piece_data)
+        if turned_col is not None:
+            shape_index, col = (shape_index + 1) % size, turned_col
+            moves.append('turn_clockwise')
+        # Pieces spawning above the field may need to come down to turn
+        elif reachability.is_position_valid(masks, row + 1, col, piece_data['masks'][shape_index]):
+            row += 1
+            moves.append('move_down')
+        else:
+            break
+
+    step, move = (1, 'move_right') if new_col > col else (-1, 'move_left')
+    shape_masks = piece_data['masks'][shape_index]
+    while col != new_col and reachability.is_position_valid(masks, row, col + step, shape_masks):
+        col += step
+        moves.append(move)
+    return tuple(moves)
+
+
+def lock_masks(masks, row, col, shape_masks):
+    """
+    Return the row bitmasks of a board once a piece is locked at (row, col) and full lines are cleared
+    """
+    left, rows = shape_masks
+    new_masks = list(masks)
+    for piece_row, mask in rows:
+        new_masks[row + piece_row] |= mask << (col + left)
+    kept = [mask for mask in new_masks[:FIELD_ROWS] if mask != FULL_ROW]
+    return tuple([NEW_LINE_MASK] * (FIELD_ROWS - len(kept)) + kept + new_masks[FIELD_ROWS:])
 
-        Constraints are:
-         - A clear drop path
-         - Lowest row reachable weighted by covered open slots
 
-        Relies on board, piece_range, piece_data, rows, cols from outer function
+def spawn_position(masks, type_id):
+    """
+    Return where a piece from the queue starts, like ActiveBoard.next_piece
+    """
+    shape_masks = pieces_data[type_id]['masks'][0]
+    row = SPAWN_ROW
+    while reachability.is_position_valid(masks, row - 1, SPAWN_COL, shape_masks):
+        row -= 1
+    return row, SPAWN_COL
+
+
+def lookahead_move(masks, type_id, queue, hold_type, row, col, width=BEAM_WIDTH, depth=BEAM_DEPTH,
+                   budget=BEAM_BUDGET, evaluate=below_piece_score_masks, hold_shape=0):
+    """
+    Calculate ideal moves for a piece looking ahead at the queue and the hold piece
+
+    Beam search: each line of play places the current piece, or the hold piece after a swap, then the
+    next pieces of the queue. Lines score the sum of their placements' scores (row plus evaluate bonus,
+    as in best_move) and only the best width lines are carried on to the next piece
+
+    Anytime: stops once budget seconds are spent, returning the first moves of the best line among
+    the deepest fully searched ones
+
+    queue holds the type ids of the next pieces, hold_type is -1 when nothing is held. The hold piece keeps
+    the rotation it was held in, hold_shape, pieces held along a line being held as they spawn
+
+    Returns the moves for the current piece, 'store_piece' first when it is held, None if it can't move
+    """
+    deadline = game_clock.wall_time() + budget
+    # Lines of play: (score, masks, current type, next queue index, hold type, first moves)
+    beam = [(0, masks, type_id, 0, hold_type, None)]
+    best = None
+    for level in range(min(depth, len(queue) + 1)):
+        children = []
+        for score, line_masks, current, next_index, held, first_moves in beam:
+            # Place the current piece, or swap it with the hold piece first
+            options = []
+            start = (row, col, 0) if first_moves is None else (*spawn_position(line_masks, current), 0)
+            options.append(((), current, start, held, next_index))
+            if held != -1:
+                held_shape = hold_shape if first_moves is None else 0
+                options.append((('store_piece',), held, (SPAWN_ROW, SPAWN_COL, held_shape), current, next_index))
+            elif next_index < len(queue):
+                options.append((('store_piece',), queue[next_index],
+                                (*spawn_position(line_masks, queue[next_index]), 0), current, next_index + 1))
+
+            for prefix, piece_type, (start_row, start_col, start_shape), new_held, new_index in options:
+                piece_data = pieces_data[piece_type]
+                size = len(piece_data['positions'][0])
+                for (new_row, new_col, new_shape), moves in reachability.landing_positions(
+                        line_masks, piece_type, start_row, start_col, start_shape):
+                    child_score = score + new_row + evaluate(line_masks, new_row, new_col,
+                                                             piece_data['bottoms'][new_shape], size)
+                    child_masks = lock_masks(line_masks, new_row, new_col, piece_data['masks'][new_shape])
+                    next_type = queue[new_index] if new_index < len(queue) else None
+                    children.append((child_score, child_masks, next_type, new_index + 1, new_held,
+                                     first_moves if first_moves is not None else prefix + moves))
+
+            if game_clock.wall_time() > deadline and best is not None:
+                return best
+
+        if not children:
+            break
+        # Keep the best lines, the first found on ties
+        children.sort(key=lambda child: -child[0])
+        best = children[0][5]
+        beam = [child for child in children[:width] if child[2] is not None]
+        if not beam or game_clock.wall_time() > deadline:
+            break
+
+    return best
 
-        Returns a tuple containing new shape and new column to drop from
 
-        Function tests each rows from the bottom up, testing each piece position at each slot before moving up
+class EvaluationCache:
+    """
+    Least recently used store of AI decisions
+
+    Keyed by board hash (see zobrist.py), piece and hold types and piece start: boards repeat a lot
+    across AI games, early on especially. hits and misses tell whether it pays off
+    """
+
+    def __init__(self, maxsize=4096):
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
         """
-        def below_piece_score():
-            """
-            Calculate and return a scored based on what would be under a piece
-
-            Relies on piece_len, piece_row, board and shape from outer
-
-            From 0 (worst) to 10 (best)
-            """
-            holes_total = 0
-            floors_total = 0
-            normals_total = 0
-
-            # Calculate for each column
-            for piece_col in range(piece_len):
-                holes_this_col = 0
-                floors_this_col = 0
-                normals_this_col = 0
-                for piece_row in reversed(range(piece_len)):  # Coming up from bottom
-                    slot = board[row + piece_row][col + piece_col]
-                    if shape[piece_row][piece_col] == 0:  # Empty slot: increment weight from slots underneath
-                        if slot == 0:
-                            holes_this_col += 1
-                        elif slot == 9:
-                            floors_this_col += 1
-                        else:
-                            normals_this_col += 1
-                    else:
-                        # Piece was found: tally up
-                        if piece_row != piece_len - 1:
-                            holes_total += holes_this_col
-                            floors_total += floors_this_col
-                            normals_total += normals_this_col
-                            break
-                        # If not found, then column is ignored
-
-            if holes_total > 1:
-                return 0
-            elif holes_total == 1:
-                if floors_total == 0:
-                    return 1
-                else:
-                    return 2
-            else:
-                if floors_total == 0:
-                    return 6
-                else:
-                        return 10
-
-        def is_position_valid(test_row, test_col):
-            """
-            Fast checking of potential location for a given piece
-
-            Relies on board and shape from outer function
-
-            Returns False if position isn't valid, True otherwise
-            """
-            for row in range(len(shape)):
-                for col in range(len(shape)):
-                    # Empty slots are contain 0, any number means collision
-                    if board[test_row + row][test_col + col] and shape[row][col]:
-                        return False
-            return True
-
-        best_found = -1
-        new_col = 0
-        new_shape = 0
-        for row in reversed(rows):
-            for shape_index in piece_range:
-                shape = piece_data['positions'][shape_index]
-                for col in cols:
-                    if is_position_valid(row, col):
-                        # Found a slot, check above for obstructions
-                        clear_above = True
-                        for test_row in reversed(range(0, row)):
-                            if not is_position_valid(test_row, col):
-                                clear_above = False
-                                break
-                        if clear_above:
-                            # Weight this solution and check against best so far
-                            score = row + below_piece_score()
-                            if score > best_found:
-                                best_found = score
-                                new_col = col
-                                new_shape = shape_index
-
-        return new_shape, new_col
-
-    cols = range(FIELD_H_BOUND - 1, FIELD_WIDTH + FIELD_H_BOUND - 1)
-    rows = range(0, FIELD_HEIGHT)
+        Return the decision stored for key, None if there is none
+        """
+        decision = self.entries.get(key)
+        if decision is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return decision
+
+    def put(self, key, decision):
+        """
+        Store a decision, forgetting the least recently used one when full
+        """
+        self.entries[key] = decision
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+evaluation_cache = EvaluationCache()
+
+
+def search_effort(pending, workers):
+    """
+    Return lookahead width, depth and budget, shrinking as jobs wait for the workers
+
+    With no job waiting a decision gets the full BEAM_* effort, with one job waiting per worker half of it
+    """
+    spare = 1 / (1 + pending / workers)
+    return max(1, round(BEAM_WIDTH * spare)), max(1, round(BEAM_DEPTH * spare)), BEAM_BUDGET * spare
+
+
+def solve_job(arena, job, effort=None):
+    """
+    Find the moves for an AI job read from a job_board.JobBoard, its board being in arena
+
+    effort is the (width, depth, budget) of a lookahead search, None to only consider the current piece.
+    Lookahead decisions are cached per width and depth, unless the budget cut their search short.
+    Jobs flagged cheap skip both for quick_move, and the cache
+
+    Return the moves, None if the board of the job was replaced by a newer one
+    """
+    game_ID, epoch, generation, board_hash, type_id, hold_type, hold_shape, piece_row, piece_col, cheap, *queue = job
+    if arena.generation(game_ID) != generation:
+        return None
+    # Speculative jobs don't know the last queued piece yet
+    queue = [queued_type for queued_type in queue if queued_type >= 0]
+    if cheap:
+        key = None
+    elif effort is None:
+        key = (board_hash, type_id, hold_type, piece_row, piece_col)
+    else:
+        key = (board_hash, type_id, hold_type, hold_shape, piece_row, piece_col, tuple(queue), effort[:2])
+    moves = evaluation_cache.get(key) if key is not None else None
+    if moves is None:
+        masks, board = arena.read(game_ID)
+        if cheap:
+            moves = quick_move(board, type_id, piece_row, piece_col, masks)
+        elif effort is None:
+            best = best_move(board, type_id, piece_row, piece_col, masks=masks)
+            moves = best[3] if best is not None else ()
+        else:
+            deadline = game_clock.wall_time() + effort[2]
+            moves = lookahead_move(masks, type_id, queue, hold_type, piece_row, piece_col, *effort,
+                                   hold_shape=hold_shape) or ()
+            # A search its budget cut short is not kept, a request with more time to spare would get it
+            if game_clock.wall_time() > deadline:
+                key = None
+        # Views into the arena must be gone for it to close
+        board = None
+        # Only trust a search whose board did not change under it
+        if arena.generation(game_ID) != generation:
+            return None
+        if key is not None:
+            evaluation_cache.put(key, moves)
+    return moves
+
+
+def solve_batch(arena, jobs):
+    """
+    Find the moves for a batch of AI jobs with one call to the vectorized evaluator (see vector_ai.py)
+
+    Straight drops are cheap enough this way for jobs flagged cheap to be treated like the others
+
+    Return a list of (game_ID, epoch, generation, moves) for the jobs whose board was not replaced meanwhile
+    """
+    results = []
+    todo = []
+    for job in jobs:
+        game_ID, epoch, generation, board_hash, type_id, hold_type, hold_shape, piece_row, piece_col = job[:9]
+        if arena.generation(game_ID) != generation:
+            continue
+        key = (board_hash, type_id, hold_type, piece_row, piece_col)
+        moves = evaluation_cache.get(key)
+        if moves is None:
+            todo.append((job, key))
+        else:
+            results.append((game_ID, epoch, generation, moves))
+    if not todo:
+        return results
+
+    boards = vector_ai.numpy.stack([vector_ai.numpy.frombuffer(arena.cells(job[0]), dtype=vector_ai.numpy.uint8)
+                                    for job, key in todo]).reshape(len(todo), arena.rows, arena.cols)
+    shapes, cols, rows = vector_ai.best_drops(boards, [job[4] for job, key in todo])
+    for (job, key), new_shape, new_col in zip(todo, shapes.tolist(), cols.tolist()):
+        game_ID, epoch, generation, board_hash, type_id, hold_type, hold_shape, piece_row, piece_col = job[:9]
+        masks = arena.read_masks(game_ID) if new_shape >= 0 else None
+        # Only trust a search whose board did not change under it
+        if arena.generation(game_ID) != generation:
+            continue
+        moves = drop_moves(masks, type_id, piece_row, piece_col, new_shape, new_col) if new_shape >= 0 else ()
+        evaluation_cache.put(key, moves)
+        results.append((game_ID, epoch, generation, moves))
+    return results
+
+
+def AI_worker(ready_queue, todo_queue, arena_name, job_board, worker, lookahead=False, vectorized=False):
+    """
+    Basic worker for multiprocessing of AI
+
+    Every signal from todo_queue sends the worker through job_board until no job is left,
+    boards being read from the shared board_arena.BoardArena called arena_name
+
+    With lookahead, decisions also weigh the queue and hold pieces, with less effort as jobs pile up.
+    Vectorized, every batch of jobs taken is decided at once by straight drops (see solve_batch)
+
+    Returns the moves leading new pieces to their best position through ready_queue,
+    as one list of (game_ID, job epoch, job generation, moves) per signal, along with the evaluation cache
+    hits and misses counted meanwhile. Jobs cancelled before the worker got to them are skipped
+    """
+    arena = board_arena.BoardArena(name=arena_name)
 
     # Main worker loop
-    item_in_queue = False
-    while item_in_queue != - 1:
-        item_in_queue = todo_queue.get()
-        if item_in_queue and item_in_queue != - 1:
-            game_ID, board, piece_data, piece_row = item_in_queue
-            piece_len = len(piece_data['positions'])
-            piece_range = range(piece_len)
-            new_shape, new_col = quick_fill()
-            ready_queue.put((game_ID, new_shape, new_col))
-            item_in_queue = False
+    signal = False
+    while signal != - 1:
+        signal = todo_queue.get()
+        if signal != - 1:
+            results = []
+            hits, misses = evaluation_cache.hits, evaluation_cache.misses
+            jobs = job_board.take(worker)
+            while jobs:
+                if vectorized:
+                    results.extend(solve_batch(arena, [job for job in jobs if not job_board.cancelled(job)]))
+                else:
+                    for job in jobs:
+                        if job_board.cancelled(job):
+                            continue
+                        effort = search_effort(job_board.pending(), job_board.workers) if lookahead else None
+                        moves = solve_job(arena, job, effort)
+                        if moves is not None:
+                            results.append((job[0], job[1], job[2], moves))
+                jobs = job_board.take(worker)
+            hits, misses = evaluation_cache.hits - hits, evaluation_cache.misses - misses
+            if results or hits or misses:
+                ready_queue.put((results, hits, misses))
+
+    arena.close()
@@ -0,0 +1,329 @@
+try:
+    import numpy
+except ImportError:
+    # Batch mode is optional, the game itself only needs pygame
+    numpy = None
+
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, EMPTY, WALL, QUEUE_LENGTH,\
+    STARTING_TICK_LENGTH, score_map, bad_block, default_speed, fast_speed, lines_per_level
+from tetramino import pieces_data
+
+# Actions understood by BatchEngine.step, one per game
+NOTHING, MOVE_LEFT, MOVE_RIGHT, MOVE_DOWN, TURN_CLOCKWISE, TURN_COUNTER_CLOCKWISE, DROP, HOLD, PLACE,\
+    SPEED_UP, SLOW_DOWN = range(11)
+
+
+class BatchEngine:
+    """
+    Step many Tetris games in lockstep with NumPy
+
+    All boards live in one (games, rows, cols) uint8 array laid out like player_game.ActiveBoard.board,
+    walls and bottom buffer included, and piece state in one array per attribute, so collision checks,
+    gravity, line clears and garbage insertion are array operations over every game at once
+
+    player_game.ActiveBoard stays the reference implementation of the rules. Games are reproducible
+    from the seed but do not draw the same pieces as an ActiveBoard with that seed
+    """
+    NEW_LINE = [WALL] * FIELD_H_BOUND + [EMPTY] * FIELD_WIDTH + [WALL] * FIELD_H_BOUND
+    FIELD_ROWS = FIELD_HEIGHT + FIELD_V_BOUND
+    ROWS = FIELD_ROWS + FIELD_WIDTH // 2
+    COLS = len(NEW_LINE)
+    SPAWN_ROW = 0
+    SPAWN_COL = len(NEW_LINE) // 2 - 2
+    # Lateral offsets tried in turn when a rotation needs a kick, as in ActiveBoard.check_kick
+    KICKS = (0, 0, 1, -1, 2, -2, 3, -3)
+
+    def __init__(self, games, seed=None):
+        """
+        Prepare the boards and first pieces of games parallel games
+        """
+        if numpy is None:
+            raise ImportError('BatchEngine requires numpy')
+        self.games = games
+        self.random = numpy.random.default_rng(seed)
+
+        # Boards
+        self.new_line = numpy.array(self.NEW_LINE, dtype=numpy.uint8)
+        self.boards = numpy.full((games, self.ROWS, self.COLS), WALL, dtype=numpy.uint8)
+        self.boards[:, :self.FIELD_ROWS] = self.new_line
+        self.field_cols = numpy.arange(FIELD_H_BOUND, FIELD_H_BOUND + FIELD_WIDTH)
+
+        # Piece tables: (type, rotation, cell, (row, col)) offsets and colors
+        self.cells = numpy.array([piece['cells'] for piece in pieces_data], dtype=numpy.int16)[..., :2]
+        self.colors = numpy.array([piece['color'] for piece in pieces_data], dtype=numpy.uint8)
+        self.rotations = self.cells.shape[1]
+        self.score_table = numpy.array([0] + [score_map[lines] for lines in sorted(score_map)], dtype=numpy.int64)
+
+        # Game state
+        self.piece = numpy.zeros(games, dtype=numpy.int8)
+        self.rotation = numpy.zeros(games, dtype=numpy.int8)
+        self.piece_row = numpy.zeros(games, dtype=numpy.int16)
+        self.piece_col = numpy.zeros(games, dtype=numpy.int16)
+        self.hold = numpy.full(games, -1, dtype=numpy.int8)
+        self.hold_rotation = numpy.zeros(games, dtype=numpy.int8)
+        self.hold_lock = numpy.zeros(games, dtype=bool)
+        self.timers = numpy.zeros(games)
+        self.speed = numpy.full(games, default_speed, dtype=numpy.int16)
+        self.level = numpy.ones(games, dtype=numpy.int32)
+        self.lines_cleared = numpy.zeros(games, dtype=numpy.int32)
+        self.score = numpy.zeros(games, dtype=numpy.int64)
+        self.bonus_lines = numpy.zeros(games, dtype=numpy.int16)
+        self.lost = numpy.zeros(games, dtype=bool)
+
+        # Piece bags and preview queue
+        self.bags = self.new_bags(games)
+        self.bag_index = numpy.zeros(games, dtype=numpy.int8)
+        everyone = numpy.arange(games)
+        self.queue = numpy.zeros((games, QUEUE_LENGTH), dtype=numpy.int8)
+        for slot in range(QUEUE_LENGTH):
+            self.queue[:, slot] = self.draw(everyone)
+
+        self.spawn(everyone)
+
+    def new_bags(self, count):
+        """
+        Return count freshly shuffled bags holding one of each piece type
+        """
+        return self.random.permuted(numpy.tile(numpy.arange(len(pieces_data), dtype=numpy.int8), (count, 1)), axis=1)
+
+    def draw(self, games):
+        """
+        Return the next piece type out of the bag of each game in games
+        """
+        types = self.bags[games, self.bag_index[games]]
+        self.bag_index[games] += 1
+        empty = games[self.bag_index[games] == len(pieces_data)]
+        if len(empty):
+            self.bags[empty] = self.new_bags(len(empty))
+            self.bag_index[empty] = 0
+        return types
+
+    def is_position_valid(self, games, rows, cols, rotations):
+        """
+        Return for each of games whether its current piece fits at rows, cols in rotations
+        """
+        cells = self.cells[self.piece[games], rotations]
+        cell_rows = numpy.clip(rows[:, None] + cells[:, :, 0], -self.ROWS, self.ROWS - 1)
+        # Negative columns wrap around onto the right wall, as they do on an ActiveBoard
+        cell_cols = numpy.clip(cols[:, None] + cells[:, :, 1], -self.COLS, self.COLS - 1)
+        return ~self.boards[games[:, None], cell_rows, cell_cols].any(axis=1)
+
+    def lowest_possible(self, games):
+        """
+        Return the lowest row the current piece of each of games can fall to
+        """
+        rows = self.piece_row[games].copy()
+        falling = numpy.arange(len(games))
+        while len(falling):
+            fits = self.is_position_valid(games[falling], rows[falling] + 1, self.piece_col[games[falling]],
+                                          self.rotation[games[falling]])
+            falling = falling[fits]
+            rows[falling] += 1
+        return rows
+
+    def move(self, games, row_step, col_step):
+        """
+        Move the pieces of games by the given steps where possible
+        """
+        fits = self.is_position_valid(games, self.piece_row[games] + row_step, self.piece_col[games] + col_step,
+                                      self.rotation[games])
+        self.piece_row[games[fits]] += row_step
+        self.piece_col[games[fits]] += col_step
+
+    def turn(self, games, direction):
+        """
+        Rotate the pieces of games by direction (1 clockwise, -1 counter-clockwise), kicking sideways if needed
+        """
+        rotations = (self.rotation[games] + direction) % self.rotations
+        fits = numpy.stack([self.is_position_valid(games, self.piece_row[games], self.piece_col[games] + kick,
+                                                   rotations) for kick in self.KICKS], axis=1)
+        turned = fits.any(axis=1)
+        kicks = numpy.array(self.KICKS, dtype=numpy.int16)[fits.argmax(axis=1)]
+        self.rotation[games[turned]] = rotations[turned]
+        self.piece_col[games[turned]] += kicks[turned]
+
+    def place(self, games, rotations, cols):
+        """
+        Move the pieces of games to new rotations and columns at their current row, where they fit
+
+        Like ActiveBoard.unsafe_move_to, pieces raised above the board are brought down to row 0
+        """
+        rows = numpy.maximum(self.piece_row[games], 0)
+        fits = self.is_position_valid(games, rows, cols, rotations)
+        self.rotation[games[fits]] = rotations[fits]
+        self.piece_row[games[fits]] = rows[fits]
+        self.piece_col[games[fits]] = cols[fits]
+
+    def store(self, games):
+        """
+        Swap the current piece of games with their hold piece, once per piece
+
+        As on an ActiveBoard, pieces keep their rotation while held
+        """
+        games = games[~self.hold_lock[games]]
+        empty = games[self.hold[games] == -1]
+        swap = games[self.hold[games] != -1]
+
+        self.hold[empty] = self.piece[empty]
+        self.hold_rotation[empty] = self.rotation[empty]
+        self.spawn(empty)
+
+        self.piece[swap], self.hold[swap] = self.hold[swap], self.piece[swap].copy()
+        self.rotation[swap], self.hold_rotation[swap] = self.hold_rotation[swap], self.rotation[swap].copy()
+        self.piece_row[swap] = self.SPAWN_ROW
+        self.piece_col[swap] = self.SPAWN_COL
+        self.hold_lock[games] = True
+
+    def lock(self, games):
+        """
+        Lock the pieces of games where they land, clear lines and spawn the next pieces
+
+        Return the cleared lines count of each game, as carried by ActiveBoard 'clear' reports
+        """
+        self.piece_row[games] = self.lowest_possible(games)
+        cells = self.cells[self.piece[games], self.rotation[games]]
+        self.boards[games[:, None], self.piece_row[games][:, None] + cells[:, :, 0],
+                    self.piece_col[games][:, None] + cells[:, :, 1]] = self.colors[self.piece[games]][:, None]
+        cleared = self.clear_full_lines(games)
+        self.spawn(games)
+        return cleared
+
+    def clear_full_lines(self, games):
+        """
+        Remove filled lines from the boards of games
+
+        Return the cleared lines count of each game, zeroed when it only cancelled incoming bonus lines
+        """
+        field = self.boards[games, :self.FIELD_ROWS]
+        full = (field != EMPTY).all(axis=2)
+        counts = full.sum(axis=1)
+        cleared = numpy.zeros(len(games), dtype=numpy.int16)
+        hit = counts > 0
+        if not hit.any():
+            return cleared
+
+        games, field, full, counts = games[hit], field[hit], full[hit], counts[hit]
+        # Stable sort brings full lines to the top keeping the others in order, then they are emptied
+        order = numpy.argsort(~full, axis=1, kind='stable')
+        field = numpy.take_along_axis(field, order[:, :, None], axis=1)
+        field[numpy.arange(self.FIELD_ROWS)[None, :] < counts[:, None]] = self.new_line
+        self.boards[games, :self.FIELD_ROWS] = field
+
+        self.lines_cleared[games] += counts
+        self.level[games] = 1 + self.lines_cleared[games] // lines_per_level
+        self.score[games] += self.level[games] * self.score_table[counts]
+
+        # Cleared lines counter incoming lines
+        sent = counts.astype(numpy.int16)
+        pending = self.bonus_lines[games] > 0
+        self.bonus_lines[games] -= numpy.where(pending, counts, 0).astype(numpy.int16)
+        cancelled = pending & (self.bonus_lines[games] <= 0)
+        self.bonus_lines[games[cancelled]] = 0
+        sent[cancelled] = 0
+        cleared[hit] = sent
+        return cleared
+
+    def insert_bonus_lines(self, games):
+        """
+        Push the bonus lines queued for games up from the bottom, one shared hole per game
+        """
+        lines = self.bonus_lines[games].astype(numpy.int64)
+        holes = self.random.integers(FIELD_H_BOUND, FIELD_H_BOUND + FIELD_WIDTH, size=len(games))
+
+        source = numpy.arange(self.FIELD_ROWS)[None, :] + lines[:, None]
+        field = numpy.take_along_axis(self.boards[games, :self.FIELD_ROWS],
+                                      numpy.minimum(source, self.FIELD_ROWS - 1)[:, :, None], axis=1)
+        garbage = numpy.tile(self.new_line, (len(games), 1))
+        garbage[:, self.field_cols] = bad_block
+        garbage[numpy.arange(len(games)), holes] = EMPTY
+        field = numpy.where((source < self.FIELD_ROWS)[:, :, None], field, garbage[:, None, :])
+        self.boards[games, :self.FIELD_ROWS] = field
+        self.bonus_lines[games] = 0
+
+    def spawn(self, games):
+        """
+        Bring the next queued piece of games into play, after any bonus lines
+
+        Games whose piece cannot spawn are lost
+        """
+        bonus = games[self.bonus_lines[games] > 0]
+        if len(bonus):
+            self.insert_bonus_lines(bonus)
+
+        self.hold_lock[games] = False
+        self.piece[games] = self.queue[games, 0]
+        self.queue[games, :-1] = self.queue[games, 1:]
+        self.queue[games, -1] = self.draw(games)
+        self.rotation[games] = 0
+        self.piece_row[games] = self.SPAWN_ROW
+        self.piece_col[games] = self.SPAWN_COL
+
+        # Move to top
+        rising = games
+        while len(rising):
+            rising = rising[self.is_position_valid(rising, self.piece_row[rising] - 1, self.piece_col[rising],
+                                                   self.rotation[rising])]
+            self.piece_row[rising] -= 1
+
+        blocked = ~self.is_position_valid(games, self.piece_row[games], self.piece_col[games], self.rotation[games])
+        self.lost[games[blocked]] = True
+        self.timers[games] = 0
+
+    def tick_length(self):
+        """
+        Return time allowed per gravity tick of every game
+        """
+        return STARTING_TICK_LENGTH / (self.level * self.speed)
+
+    def step(self, actions=None, dt=0, rotations=None, cols=None):
+        """
+        Apply one action per game then advance every game by dt seconds
+
+        actions is an array of action codes, one per game; PLACE uses rotations and cols as targets
+
+        Gravity gets at most one move per tick length, so long steps are split into ticks
+
+        Return a dictionary of per game arrays: 'cleared' lines counts as in ActiveBoard 'clear'
+        reports and 'lost' for games lost during this step
+        """
+        was_lost = self.lost.copy()
+        cleared = numpy.zeros(self.games, dtype=numpy.int16)
+
+        if actions is not None:
+            actions = numpy.where(self.lost, NOTHING, actions)
+            for code, row_step, col_step in ((MOVE_LEFT, 0, -1), (MOVE_RIGHT, 0, 1), (MOVE_DOWN, 1, 0)):
+                games = numpy.flatnonzero(actions == code)
+                if len(games):
+                    self.move(games, row_step, col_step)
+            for code, direction in ((TURN_CLOCKWISE, 1), (TURN_COUNTER_CLOCKWISE, -1)):
+                games = numpy.flatnonzero(actions == code)
+                if len(games):
+                    self.turn(games, direction)
+            games = numpy.flatnonzero(actions == PLACE)
+            if len(games):
+                self.place(games, numpy.asarray(rotations)[games] % self.rotations,
+                           numpy.asarray(cols, dtype=numpy.int16)[games])
+            self.speed[actions == SPEED_UP] = fast_speed
+            self.speed[actions == SLOW_DOWN] = default_speed
+            games = numpy.flatnonzero(actions == HOLD)
+            if len(games):
+                self.store(games)
+            games = numpy.flatnonzero((actions == DROP) & ~self.lost)
+            if len(games):
+                cleared[games] += self.lock(games)
+
+        while dt > 0 and not self.lost.all():
+            playing = ~self.lost
+            tick_length = self.tick_length()
+            elapsed = min(dt, tick_length[playing].min())
+            dt -= elapsed
+            self.timers[playing] += elapsed
+            due = numpy.flatnonzero(playing & (self.timers >= tick_length))
+            if len(due):
+                self.timers[due] = 0
+                landed = self.lowest_possible(due) == self.piece_row[due]
+                self.move(due[~landed], 1, 0)
+                if landed.any():
+                    cleared[due[landed]] += self.lock(due[landed])
+
+        return {'cleared': cleared, 'lost': self.lost & ~was_lost}
@@ -0,0 +1,90 @@
+import struct
+from itertools import chain
+from multiprocessing import shared_memory
+
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT
+
+# Board dimensions, bottom wall rows included (see player_game.ActiveBoard)
+ROWS = FIELD_HEIGHT + FIELD_V_BOUND + FIELD_WIDTH // 2
+COLS = FIELD_WIDTH + 2 * FIELD_H_BOUND
+
+
+class BoardArena:
+    """
+    Boards of the AI games in one shared memory block, read by AI workers without copies
+
+    Every game owns a fixed stride slot holding a generation counter, the row masks and the slot values.
+    The generation moves forward whenever a board is written, so a reader can tell whether the board
+    it looked at was replaced meanwhile
+
+    The main process creates the arena, workers attach to it by name
+    """
+    GENERATION = struct.Struct('I')
+
+    def __init__(self, slots=0, name=None, rows=ROWS, cols=COLS):
+        self.rows = rows
+        self.cols = cols
+        self.masks = struct.Struct('{}H'.format(rows))
+        self.masks_offset = self.GENERATION.size
+        self.cells_offset = self.masks_offset + self.masks.size
+        self.stride = (self.cells_offset + rows * cols + 7) // 8 * 8
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(slots, 1) * self.stride)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+    def write(self, slot, board):
+        """
+        Copy a board into its slot
+
+        Return the new generation of the slot
+        """
+        base = slot * self.stride
+        buffer = self.memory.buf
+        generation = (self.generation(slot) + 1) & 0xffffffff
+        self.GENERATION.pack_into(buffer, base, generation)
+        self.masks.pack_into(buffer, base + self.masks_offset, *[line.mask for line in board])
+        start = base + self.cells_offset
+        buffer[start:start + self.rows * self.cols] = bytes(chain.from_iterable(board))
+        return generation
+
+    def invalidate(self, slot):
+        """
+        Move the generation of a slot forward without writing a board, so work started on it is dropped
+        """
+        self.GENERATION.pack_into(self.memory.buf, slot * self.stride, (self.generation(slot) + 1) & 0xffffffff)
+
+    def generation(self, slot):
+        return self.GENERATION.unpack_from(self.memory.buf, slot * self.stride)[0]
+
+    def read(self, slot):
+        """
+        Return the row masks of a slot and a view of each of its rows, indexed like board rows
+
+        Row views point straight into shared memory: check the generation once done with them
+        """
+        masks = self.read_masks(slot)
+        cells = self.cells(slot)
+        return masks, [cells[row * self.cols:(row + 1) * self.cols] for row in range(self.rows)]
+
+    def read_masks(self, slot):
+        """
+        Return the row masks of a slot alone, a copy that needs no care once read
+        """
+        return self.masks.unpack_from(self.memory.buf, slot * self.stride + self.masks_offset)
+
+    def cells(self, slot):
+        """
+        Return a flat view of the slot values of a board, row after row
+        """
+        start = slot * self.stride + self.cells_offset
+        return self.memory.buf[start:start + self.rows * self.cols]
+
+    def close(self, unlink=False):
+        """
+        Detach from the arena, and free it if unlink (owner only)
+        """
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
@@ -31,10 +31,9 @@ title_tiles = [[1, 1, 1, 0, 1, 1, 1, 0, 1, 1, 1, 0, 1, 1, 1, 0, 1, 1, 1, 0, 1, 1
                         [0, 1, 0, 0, 1, 1, 1, 0, 0, 1, 0, 0, 1, 0, 1, 0, 1, 1, 1, 0, 1, 1, 1]]
 
 # Network data
-socket_time_out = 0.1
 broadcast_delay = 1
 time_to_expire = 5
-incoming_buffer = 1024
+incoming_buffer = 2048
 
 # Board
 FIELD_H_BOUND = 3
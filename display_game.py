@@ -1,11 +1,14 @@
 from collections import deque
 
+import events
+import tetramino
+
 
 class Board:
     """
     Contain all the display information about a game board
     """
-    from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, EMPTY, WALL
+    from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, EMPTY, WALL, bad_block
     NEW_LINE = [WALL]*FIELD_H_BOUND + [EMPTY] * FIELD_WIDTH + [WALL] * FIELD_H_BOUND
 
     def __init__(self, ghost=False):
@@ -22,7 +25,7 @@ class Board:
         # Needed variables
         self.piece_col = len(self.board[0]) // 2
         self.piece_row = 0
-        self.reports = deque()
+        self.events = events.EventRing()
         self.pieces = deque()
         self.piece = [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
         self.hold_piece = [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
@@ -30,3 +33,26 @@ class Board:
         self.ghost = True if ghost else False
         self.score = 0
         self.light_speed_flag = False
+        # Remote boards only follow changes once a full board came in (see apply_changes)
+        self.has_keyframe = False
+
+    def apply_changes(self, shape_id, row, col, cleared, bonus, empty):
+        """
+        Replay on the board, in place, the changes reported with a new piece (see events.BOARD)
+
+        The locked piece is written first, then cleared rows are removed, then bonus lines come in from below
+        """
+        for shape_row, line in enumerate(tetramino.SHAPES[shape_id]):
+            for shape_col, color in enumerate(line):
+                if color:
+                    self.board[row + shape_row][col + shape_col] = color
+
+        if cleared:
+            field = len(self.board) - self.BOTTOM_BUFFER
+            kept = [line for index, line in enumerate(self.board[:field]) if not cleared >> index & 1]
+            self.board[:field] = [list(self.NEW_LINE) for _ in range(field - len(kept))] + kept
+
+        if bonus:
+            line = [self.WALL] * self.FIELD_H_BOUND + [self.bad_block] * self.FIELD_WIDTH + [self.WALL] * self.FIELD_H_BOUND
+            line[empty] = self.EMPTY
+            self.board[:self.FIELD_HEIGHT] = self.board[bonus:self.FIELD_HEIGHT] + [list(line) for _ in range(bonus)]
@@ -0,0 +1,114 @@
+from array import array
+
+from data import QUEUE_LENGTH
+
+# Event opcodes, followed in their record by:
+LOSS = 0    # nothing
+MOVE = 1    # piece row, piece col
+HOLD = 2    # hold shape id
+SHAPE = 3   # piece shape id
+PIECE = 4   # piece shape id, piece row, piece col
+BOARD = 5   # changes since the previous BOARD: locked shape id (empty shape if none), its row and col,
+            # cleared rows bitmask, bonus lines count and their empty col (see display_game.Board.apply_changes)
+QUEUE = 6   # one shape id per queued piece
+CLEAR = 7   # cleared lines count, score
+WINNER = 8  # winning game ID
+
+# Argument count of every opcode
+ARITY = (0, 2, 1, 1, 3, 6, QUEUE_LENGTH, 2, 1)
+
+# Every event takes one fixed size record: opcode then arguments
+RECORD_SIZE = 1 + max(ARITY)
+
+
+class EventRing:
+    """
+    Preallocated ring buffer of integer game events
+
+    Events are fixed size records in an array('i') so reporting allocates nothing.
+    Consumers iterate over drain() and read each record from buffer at the yielded offset:
+    buffer[record] is the opcode, buffer[record + 1:] its arguments
+
+    A full ring doubles in size rather than dropping events
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.buffer = array('i', bytes(capacity * RECORD_SIZE * array('i').itemsize))
+        self.head = 0  # next record to read
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, opcode, a=0, b=0, c=0):
+        """
+        Write an event with up to three arguments
+        """
+        if self.count == self.capacity:
+            self.grow()
+        record = (self.head + self.count) % self.capacity * RECORD_SIZE
+        buffer = self.buffer
+        buffer[record] = opcode
+        buffer[record + 1] = a
+        buffer[record + 2] = b
+        buffer[record + 3] = c
+        self.count += 1
+
+    def push_values(self, opcode, values):
+        """
+        Write an event whose arguments come from an iterable, e.g. shape ids of the queue
+        """
+        if self.count == self.capacity:
+            self.grow()
+        record = (self.head + self.count) % self.capacity * RECORD_SIZE
+        self.buffer[record] = opcode
+        for index, value in enumerate(values, record + 1):
+            self.buffer[index] = value
+        self.count += 1
+
+    def drain(self):
+        """
+        Yield the offset of every pending record in order, freeing each once the next is asked for
+        """
+        while self.count:
+            yield self.head * RECORD_SIZE
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def grow(self):
+        """
+        Double capacity, moving pending records to the start of the new buffer
+        """
+        pending = array('i')
+        for record in range(self.head, self.head + self.count):
+            start = record % self.capacity * RECORD_SIZE
+            pending.extend(self.buffer[start:start + RECORD_SIZE])
+        self.capacity *= 2
+        pending.extend(bytes((self.capacity - self.count) * RECORD_SIZE * pending.itemsize))
+        self.buffer = pending
+        self.head = 0
+
+    def decode(self):
+        """
+        Drain the ring into (opcode, arguments...) tuples, for callers that are not performance bound
+        """
+        decoded = []
+        for record in self.drain():
+            opcode = self.buffer[record]
+            decoded.append((opcode,) + tuple(self.buffer[record + 1:record + 1 + ARITY[opcode]]))
+        return decoded
+
+
+def push_args(ring, opcode, args):
+    """
+    Write an event from its opcode and a sequence of arguments, as decoded from the network (see protocol.py)
+    """
+    if len(args) > 3:
+        ring.push_values(opcode, args)
+    else:
+        ring.push(opcode, *args)
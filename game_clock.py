@@ -0,0 +1,79 @@
+import time
+
+NS_PER_SECOND = 1000000000
+
+# Policies for frames that fall behind by more than max_steps
+CATCH_UP = 'catch_up'
+SLOW_MOTION = 'slow_motion'
+
+
+def wall_time():
+    """
+    Seconds from the monotonic clock, for timeouts that should not follow game time
+    """
+    return time.monotonic_ns() / NS_PER_SECOND
+
+
+class GameClock:
+    """
+    Game time service advancing in fixed timesteps from the monotonic clock
+
+    Wall time elapsed between frames goes into an accumulator that is spent in whole timesteps,
+    so every game timer sees the same time for the whole frame and moves by exact multiples of timestep
+
+    When a frame owes more than max_steps:
+     - CATCH_UP takes max_steps and carries the rest to the next frames, up to max_lag seconds
+     - SLOW_MOTION takes max_steps and drops the rest, so the game slows down instead of jumping
+    """
+
+    def __init__(self, timestep=1 / 120, max_steps=30, policy=CATCH_UP, max_lag=1, source=time.monotonic_ns):
+        if policy not in (CATCH_UP, SLOW_MOTION):
+            raise ValueError('Unknown clock policy: {}'.format(policy))
+        self.source = source
+        self.timestep = timestep
+        self.timestep_ns = int(timestep * NS_PER_SECOND)
+        self.max_steps = max_steps
+        self.max_lag_ns = int(max_lag * NS_PER_SECOND)
+        self.policy = policy
+        self.steps = 0
+        self.accumulator = 0
+        self.last = self.source()
+
+    def advance(self):
+        """
+        Spend wall time elapsed since last call in fixed timesteps
+
+        Returns the number of timesteps game time moved by
+        """
+        now = self.source()
+        self.accumulator += now - self.last
+        self.last = now
+
+        steps = self.accumulator // self.timestep_ns
+        if steps > self.max_steps:
+            steps = self.max_steps
+            if self.policy == SLOW_MOTION:
+                self.accumulator = self.accumulator % self.timestep_ns + steps * self.timestep_ns
+            else:
+                self.accumulator = min(self.accumulator, self.max_lag_ns + steps * self.timestep_ns)
+        self.accumulator -= steps * self.timestep_ns
+        self.steps += steps
+        return steps
+
+    def hold(self):
+        """
+        Let wall time pass without moving game time (paused game)
+        """
+        self.last = self.source()
+
+    def time(self):
+        """
+        Return game time in seconds
+        """
+        return self.steps * self.timestep
+
+    def lag(self):
+        """
+        Return wall time owed to game time, in seconds
+        """
+        return self.accumulator / NS_PER_SECOND
@@ -174,7 +174,7 @@ class Graphics:
         self.active_range = active_range
         self.remote_range = remote_range
 
-        self.game_start_time = time.process_time()
+        self.game_start_time = time.monotonic()
 
         # max possible size: the most that can fit for standard 20 by 10 grid with queue and info on its side
         units_per_col = self.units_per_col
@@ -0,0 +1,132 @@
+import multiprocessing
+import struct
+
+from data import QUEUE_LENGTH
+
+
+class JobBoard:
+    """
+    AI jobs shared between the main process and the AI workers
+
+    A frame's jobs are submitted as one batch: each job is written in the slot of its game, then game IDs
+    are dealt to the workers' deques in contiguous chunks. Workers take chunks from their own deque and,
+    once it is empty, steal half of the fullest other one, so a worker stuck on slow searches gets help
+
+    A game is queued once at most: submitting a job for a game still queued rewrites its job in place
+
+    Jobs carry the epoch they were submitted in. Starting a new epoch (new match, pause) cancels every job
+    at once: queued ones are dropped and workers skip the ones they claimed but did not start
+
+    Everything lives in shared ctypes arrays guarded by a single lock, to be handed to workers on creation
+    """
+    # game_ID, epoch, generation, board hash, piece type, hold type, hold rotation, piece row, piece col,
+    # cheap search flag, then queued piece types
+    JOB = struct.Struct('=iIIQiiiii?{}i'.format(QUEUE_LENGTH))
+
+    def __init__(self, workers, capacity, chunk=2):
+        self.workers = workers
+        self.capacity = capacity
+        self.chunk = chunk
+        self.lock = multiprocessing.Lock()
+        self.jobs = multiprocessing.RawArray('B', capacity * self.JOB.size)
+        # One ring of game IDs per worker, with its head and count
+        self.deques = multiprocessing.RawArray('i', workers * capacity)
+        self.heads = multiprocessing.RawArray('i', workers)
+        self.counts = multiprocessing.RawArray('i', workers)
+        # Whether each game has a job in one of the deques
+        self.queued = multiprocessing.RawArray('b', capacity)
+        self.epoch = multiprocessing.RawValue('I', 0)
+
+    def submit(self, jobs):
+        """
+        Write a batch of jobs and deal them to the workers
+
+        Return the number of workers that were dealt jobs
+        """
+        with self.lock:
+            dealt = []
+            for job in jobs:
+                self.JOB.pack_into(self.jobs, job[0] * self.JOB.size, *job)
+                # A game still queued keeps its place in its deque, with the new job
+                if not self.queued[job[0]]:
+                    self.queued[job[0]] = True
+                    dealt.append(job[0])
+            if not dealt:
+                return 0
+            per_worker = -(-len(dealt) // self.workers)
+            for worker, start in enumerate(range(0, len(dealt), per_worker)):
+                for game_ID in dealt[start:start + per_worker]:
+                    self.push(worker, game_ID)
+        return worker + 1
+
+    def take(self, worker):
+        """
+        Claim up to chunk jobs for a worker, stealing from another worker if it has none left
+
+        Return the claimed jobs, an empty list once there is no job left anywhere
+        """
+        with self.lock:
+            if not self.counts[worker]:
+                victim = max(range(self.workers), key=lambda other: self.counts[other])
+                # Take the back half of the victim's jobs, the ones it would get to last
+                for _ in range((self.counts[victim] + 1) // 2):
+                    self.counts[victim] -= 1
+                    self.push(worker, self.deques[self.slot(victim, self.counts[victim])])
+
+            jobs = []
+            while self.counts[worker] and len(jobs) < self.chunk:
+                game_ID = self.deques[self.slot(worker, 0)]
+                self.heads[worker] = (self.heads[worker] + 1) % self.capacity
+                self.counts[worker] -= 1
+                self.queued[game_ID] = False
+                jobs.append(self.JOB.unpack_from(self.jobs, game_ID * self.JOB.size))
+        return jobs
+
+    def cancel(self, game_ID):
+        """
+        Drop the queued job of a game, if any
+        """
+        with self.lock:
+            self.queued[game_ID] = False
+            for worker in range(self.workers):
+                kept = [self.deques[self.slot(worker, index)] for index in range(self.counts[worker])]
+                kept = [other for other in kept if other != game_ID]
+                self.counts[worker] = 0
+                for other in kept:
+                    self.push(worker, other)
+
+    def new_epoch(self):
+        """
+        Cancel every job and return the epoch new jobs should carry
+        """
+        with self.lock:
+            self.epoch.value += 1
+            for worker in range(self.workers):
+                self.counts[worker] = 0
+            self.queued[:] = [False] * self.capacity
+            return self.epoch.value
+
+    def cancelled(self, job):
+        """
+        Return whether a claimed job belongs to an epoch that is over
+        """
+        return job[1] != self.epoch.value
+
+    def pending(self):
+        """
+        Return the number of jobs not claimed yet
+        """
+        with self.lock:
+            return sum(self.counts)
+
+    def slot(self, worker, index):
+        """
+        Return the position in deques of the index-th game ID of a worker's deque
+        """
+        return worker * self.capacity + (self.heads[worker] + index) % self.capacity
+
+    def push(self, worker, game_ID):
+        # Games are queued once at most, so a deque never holds more than capacity
+        assert self.counts[worker] < self.capacity, 'Deque of worker {} is full'.format(worker)
+        self.deques[self.slot(worker, self.counts[worker])] = game_ID
+        self.counts[worker] += 1
@@ -6,13 +6,23 @@ import sys
 import random
 import os
 import glob
+import logging
 from collections import deque
 
 import graphics
 import player_game
 import display_game
 import networking
+import protocol
 import ai
+import zobrist
+import vector_ai
+import board_arena
+import job_board
+import scheduler
+import events
+import tetramino
+import game_clock
 
 
 class Screen:
@@ -189,7 +199,7 @@ class LoadScreen(Screen):
 
         if not is_connected:
             # start solo game
-            network.task = 'scan'
+            network.command('scan')
             game_data = self.dispatcher()
             self.next = GameScreen(game_data, is_master=True, is_connected=False)
 
@@ -206,7 +216,7 @@ class LoadScreen(Screen):
                 try:
                     action = menu_keys[pygame.key.name(event.key)]
                     if action == 'quit':
-                        network.task = 'reset'
+                        network.command('reset')
                         self.next = MainScreen()
                     else:
                         network.my_data['status'] = 'start'
@@ -263,36 +273,32 @@ class LoadScreen(Screen):
             is_master = bool(master_IP == network.my_IP)
 
             if is_master:
-                # set up game data
-                network.game_data = self.dispatcher(True)
-                # sync up other games
-                network.task = 'sync_master'
+                # set up game data and sync up other games
+                task = 'sync_master'
+                game_data = self.dispatcher(True)
+                network.command(task, game_data, [IP for IP in decode_game_data(game_data) if IP != 'AI'])
                 # Delay to give clients a headstart
                 time.sleep(1)
             else:
                 # sync with master
-                network.task = 'sync'
-
-            time_out = time.process_time()
-            while time.process_time() - time_out < self.time_to_expire:
-                ready = True
-                for ready_item in network.sync_status:
-                    if not ready_item:
-                        ready = False
-                if ready:
-                    decoded_data = decode_game_data(network.game_data)
-                    # Make certain this host is in game and join
-                    if network.my_IP in decoded_data:
-                        self.next = GameScreen(decoded_data, is_master, self.is_connected)
-                        network.task = 'game'
-                        return
-                    else:
-                        # Reset scan results
-                        for IP in network.host_data:
-                            network.host_data[IP]['status'] = ''
+                task = 'sync'
+                network.command(task)
+
+            # The network thread tells once the sync is through
+            if network.wait_for_sync(self.time_to_expire):
+                decoded_data = decode_game_data(network.game_data)
+                # Make certain this host is in game and join
+                if network.my_IP in decoded_data:
+                    self.next = GameScreen(decoded_data, is_master, self.is_connected)
+                    network.command('game')
+                    return
+                else:
+                    # Reset scan results
+                    for IP in network.host_data:
+                        network.host_data[IP]['status'] = ''
 
             # If something failed
-            network.task = 'reset'
+            network.command('reset')
             self.next = MainScreen()
 
     def game_ready(self):
@@ -401,6 +407,10 @@ class GameScreen(Screen):
     Object controlling the set up and organization of a Tetris game, meant to be called from main loop
     """
     from data import side_moves_per_second
+    # Seconds AI pieces stay in place before dropping
+    AI_DROP_DELAY = 2
+    # Board updates broadcast as changes between two full boards
+    KEYFRAME_INTERVAL = 32
 
     def __init__(self, game_data=None, is_master=False, is_connected=False):
         """
@@ -419,6 +429,11 @@ class GameScreen(Screen):
         self.winner = None
         self.updated_boards = deque()
         self.ready_games = {}
+        self.AI_speculations = {}
+        # Board updates each local game has left before its next keyframe
+        self.keyframe_countdowns = {}
+        # Updates of remote games, put back in order
+        self.reorder_buffer = protocol.ReorderBuffer()
         self.lost_range = []
 
         # Something went wrong...
@@ -485,6 +500,12 @@ class GameScreen(Screen):
             self.AI_range = []
 
         # Prepare the data structures
+        self.tick_scheduler = scheduler.TickScheduler()
+        self.AI_scheduler = scheduler.DecisionScheduler(AI_jobs.workers)
+        # Evaluation cache hits and misses, summed over the workers
+        self.AI_cache_stats = [0, 0]
+        # Jobs left over from earlier screens are cancelled, results carrying their epoch ignored
+        self.AI_epoch = AI_jobs.new_epoch()
         active_games = []
         AI_games = []
         remote_games = []
@@ -496,14 +517,15 @@ class GameScreen(Screen):
             games.append(None)
 
         global ghost
-        now = time.process_time()
+        now = clock.time()
         for index in range(len(games)):
             # Populate actively played games
             if index in self.active_range:
-                new_local_game = player_game.ActiveBoard(ghost)
+                new_local_game = player_game.ActiveBoard(ghost, clock=clock.time)
                 new_display_game = display_game.Board(ghost)
                 active_games[index] = new_local_game
                 games[index] = new_display_game
+                self.tick_scheduler.schedule(index, new_local_game.deadline())
 
             # Populate remote games
             elif index in self.remote_range and self.is_connected:
@@ -513,10 +535,11 @@ class GameScreen(Screen):
 
             # Populate AI games
             elif index in self.AI_range and self.is_master and run_AI:
-                new_AI_game = player_game.ActiveBoard(ghost=False)
+                new_AI_game = player_game.ActiveBoard(ghost=False, clock=clock.time)
                 new_display_game = display_game.Board(ghost=False)
                 AI_games[index] = new_AI_game
                 games[index] = new_display_game
+                self.tick_scheduler.schedule(index, new_AI_game.deadline())
                 # Delay first move to avoid early performance bottlenecks
                 self.ready_games[index] = now + random.randint(100, 300) / 200
             else:pass
@@ -550,7 +573,7 @@ class GameScreen(Screen):
         Return whether gameplay is paused
         """
         #Process all pygame events
-        now = time.process_time()
+        now = clock.time()
         for event in pygame.event.get():
             global players_with_sound
             if event.type == pygame.QUIT:
@@ -563,9 +586,13 @@ class GameScreen(Screen):
                     game_ID, action = game_keys[pygame.key.name(event.key)]
                     if action == 'quit':
                         self.next = MainScreen()
+                        self.cancel_AI()
+                        self.log_AI_stats()
                     if self.active_games[game_ID] is not None:
                         if action == 'pause' and self.is_master and not self.is_connected:
                             self.pause_triggered = not self.pause_triggered
+                            if self.pause_triggered:
+                                self.cancel_AI()
                         elif self.pause_triggered:
                             return self.pause_triggered
                         elif action == 'move right':
@@ -702,132 +729,112 @@ class GameScreen(Screen):
         -Perform end of tick maintenance
         -End if winning condition
         """
-        def process_reports(reports, game_ID, broadcast):
+        def process_reports(game, game_ID, broadcast):
             """
-            Loop through all reports in the queue for a given game.
+            Drain the event ring of a given game.
 
-            Manage data as needed for each (update display, score...)
+            Manage data as needed for each event (update display, score...)
 
-            Broadcast update if needed (remote games)
+            Broadcast update if needed (remote games), as the game updates of protocol.py
 
-            Clear report queue on exit
             Return True if game is still ongoing, False if it lost
 
             """
-            def encode_board(report):
-                """
-                Encode board data report for network transmission
-
-                Board report in the form of (game_ID, board_data)
-
-                Result is a string where each line is separated by ':'
-
-                Return report as (game_ID, encoded_board)
-                """
-                # Create a string from each element in a row, for each row
-                encoded = ''
-                for row in range(len(self.games[game_ID].board)):
-                    for col in range(len(self.games[game_ID].board[0])):
-                        encoded = encoded + str(self.games[game_ID].board[row][col])
-                    # Omit ':' for last row
-                    if row != len(self.games[game_ID].board) - 1:
-                        encoded = encoded + ':'
+            def send(opcode, args=()):
+                network.queue_update(self.network_ID(game_ID), opcode, args)
 
-                return report[0], encoded
+            def send_keyframe():
+                self.keyframe_countdowns[game_ID] = self.KEYFRAME_INTERVAL
+                send(protocol.KEYFRAME, (game.board,))
 
             # For graphic performance: track whether this game has changed this frame
             self.updated_boards.append(game_ID)
 
-            # Loop through reports
-            for report in reports:
-                if report[0] == 'loss':
-                    if len(self.games) > 1:
-                        self.games[game_ID].score = -1
-                    else:
-                        self.winner = 0
-                    return False
-                elif report[0] == 'winner':
-                    self.winner = report[1]
-                elif report[0] == 'move':
+            # Loop through events
+            shown_game = self.games[game_ID]
+            buffer = game.events.buffer
+            keyframe_due = False
+            for record in game.events.drain():
+                opcode = buffer[record]
+                if opcode == events.MOVE:
                     # Update piece position
-                    self.games[game_ID].piece_row = report[1]
-                    self.games[game_ID].piece_col = report[2] - 3
-                elif report[0] == 'hold':
-                    # Update hold piece
-                    self.games[game_ID].hold_piece = report[1]
-                elif report[0] == 'shape':
+                    shown_game.piece_row = buffer[record + 1]
+                    shown_game.piece_col = buffer[record + 2] - 3
+                    if broadcast:
+                        send(opcode, (buffer[record + 1], buffer[record + 2]))
+                elif opcode == events.SHAPE:
                     # Update piece shape
-                    self.games[game_ID].piece = report[1]
-                elif report[0] == 'piece':
+                    shown_game.piece = tetramino.SHAPES[buffer[record + 1]]
+                    if broadcast:
+                        send(opcode, (buffer[record + 1],))
+                elif opcode == events.PIECE:
                     # Update piece and location
-                    self.games[game_ID].piece = report[1]
-                    self.games[game_ID].piece_row = report[2]
-                    self.games[game_ID].piece_col = report[3] - 3
-                elif report[0] == 'board':
+                    shown_game.piece = tetramino.SHAPES[buffer[record + 1]]
+                    shown_game.piece_row = buffer[record + 2]
+                    shown_game.piece_col = buffer[record + 3] - 3
+                    if broadcast:
+                        send(opcode, (buffer[record + 1], buffer[record + 2], buffer[record + 3]))
+                elif opcode == events.BOARD:
                     # Update game board
-                    self.games[game_ID].board = report[1]
-                elif report[0] == 'queue':
+                    shown_game.board = game.board
+                    if broadcast and not keyframe_due:
+                        # Changes only, the whole board once in a while or when a receiver lost track.
+                        # The board can only be sent as it is after the whole drain: a keyframe goes out
+                        # then, standing for the changes of this BOARD and of any later one
+                        if self.keyframe_countdowns.get(game_ID, 0) > 0:
+                            self.keyframe_countdowns[game_ID] -= 1
+                            send(opcode, buffer[record + 1:record + 1 + events.ARITY[events.BOARD]])
+                        else:
+                            keyframe_due = True
+                elif opcode == events.HOLD:
+                    # Update hold piece
+                    shown_game.hold_piece = tetramino.SHAPES[buffer[record + 1]]
+                    if broadcast:
+                        send(opcode, (buffer[record + 1],))
+                elif opcode == events.QUEUE:
                     # Update the piece queue
-                    self.games[game_ID].pieces = []
-                    for piece in report[1]:
-                        self.games[game_ID].pieces.append(piece)
-                elif report[0] == 'clear':
-                    bad_lines = report[1] // 2
+                    shape_ids = buffer[record + 1:record + 1 + events.ARITY[events.QUEUE]]
+                    shown_game.pieces = [tetramino.SHAPES[shape_id] for shape_id in shape_ids]
+                    if broadcast:
+                        send(opcode, shape_ids)
+                elif opcode == events.CLEAR:
+                    bad_lines = buffer[record + 1] // 2
                     # Select and notify victim if master
                     if self.is_master and bad_lines > 0 and len(self.games) > 1:
                         victims = set().union(self.AI_range, self.remote_range, self.active_range)
                         victims.discard(game_ID)
-                        victim = random.sample(victims, 1)[0]
+                        victim = random.choice(sorted(victims))
 
                         if victim in self.AI_range:
                             self.AI_games[victim].bonus_lines = bad_lines
                         elif victim in self.active_range:
                             self.active_games[victim].bonus_lines = bad_lines
                         elif broadcast:
-                            network.send_update(victim, ('bonus', bad_lines))
+                            network.queue_update(victim, protocol.BONUS, (bad_lines,))
                     # Update score
-                    self.games[game_ID].score = report[2]
-                elif report[0] == 'bonus':
-                    # Update game receiving bonus lines
-                    if game_ID in self.AI_range:
-                        self.AI_games.bonus_lines += report[1]
-                    elif game_ID in self.active_games:
-                        self.active_games.bonus_lines += report[1]
-
-                if broadcast:
-                    # pack up board data for size
-                    if report[0] == 'board':
-                        report = encode_board(report)
-                    # Check for shifted games
-                    if game_ID < self.remote_offset:
-                        network.send_update(game_ID + self.my_offset, report)
+                    shown_game.score = buffer[record + 2]
+                    if broadcast:
+                        send(opcode, (buffer[record + 1], buffer[record + 2]))
+                elif opcode == events.WINNER:
+                    self.winner = buffer[record + 1]
+                    if broadcast:
+                        send(opcode, (self.winner,))
+                elif opcode == events.LOSS:
+                    game.events.clear()
+                    if broadcast:
+                        if keyframe_due:
+                            send_keyframe()
+                        send(opcode)
+                    if len(self.games) > 1:
+                        shown_game.score = -1
                     else:
-                        network.send_update(game_ID, report)
+                        self.winner = 0
+                    return False
 
-            reports.clear()
+            if keyframe_due:
+                send_keyframe()
             return True
 
-        def decode_board(report):
-            """
-            Decode board info from its string representation and return it
-
-            Board reports are of the form (game_ID, encoded_board)
-
-            Encoded boards are strings with each line separated by ':'
-
-            Return (game_ID, decoded_board)
-            """
-            # Separate the lines and prep decoded with correct amount of elements
-            decoded = report[1].split(':')
-            for line in range(len(decoded)):
-                # Decode each line/element
-                new_line = list(decoded[line])
-                decoded[line] = []
-                for ch in new_line:
-                    decoded[line].append(int(ch))
-
-            return report[0], decoded
-
         def end_tick():
             """
             Perform clean up tasks at the end of a tick:
@@ -839,6 +846,12 @@ class GameScreen(Screen):
                 # remove lost games from activity checks
                 for ID in invalids:
                     self.lost_range.append(ID)
+                    self.tick_scheduler.cancel(ID)
+                    self.AI_scheduler.cancel(ID)
+                    if ID in self.AI_range:
+                        AI_jobs.cancel(ID)
+                        AI_boards.invalidate(ID)
+                        self.AI_speculations.pop(ID, None)
                     self.active_games[ID] = None
                     self.remote_games[ID] = None
                     self.AI_games[ID] = None
@@ -854,33 +867,70 @@ class GameScreen(Screen):
                     if len(self.active_range) + len(self.remote_range) + len(self.AI_range) < 2:
                         for ID in range(len(self.games)):
                             if ID in self.active_range:
-                                self.active_games[ID].reports.append(('winner', ID))
+                                self.active_games[ID].events.push(events.WINNER, ID)
                             if ID in self.remote_range:
-                                self.remote_games[ID].reports.append(('winner', ID))
+                                self.remote_games[ID].events.push(events.WINNER, ID)
                             if ID in self.AI_range:
-                                self.AI_games[ID].reports.append(('winner', ID))
+                                self.AI_games[ID].events.push(events.WINNER, ID)
 
-            # check for gameplay tick
-            for game in self.active_games:
-                if game is not None:
-                    game.tick()
-            for game in self.AI_games:
+            # Player input may have brought deadlines forward (speed up, new piece)
+            for ID in self.active_range:
+                self.tick_scheduler.schedule(ID, self.active_games[ID].deadline())
+
+            # check for gameplay tick, only for games whose deadline has passed
+            for ID in self.tick_scheduler.due(clock.time()):
+                game = self.active_games[ID] or self.AI_games[ID]
                 if game is not None:
                     game.tick()
+                    self.tick_scheduler.schedule(ID, game.deadline())
 
         if self.winner is None:
             # Extract reports from network queue and add them to correct game report queue
             # Consider limiting rate if performance suffers
-            while self.is_connected and len(network.game_updates) > 0:
-                # handle oldest message
-                game_ID, report = network.game_updates.popleft()
-                # check whether display has been moved to relocate local games
-                if game_ID < self.my_offset:
-                    game_ID = game_ID + self.remote_offset
-
-                if report[0] == 'board':
-                    report = decode_board(report)
-                self.remote_games[game_ID].reports.append(report)
+            updates = []
+            if self.is_connected:
+                now = clock.time()
+                while len(network.game_updates) > 0:
+                    # Oldest message first, held back while those sent before it are missing
+                    updates.extend(self.reorder_buffer.receive(*network.game_updates.popleft(), now))
+                ready, lost = self.reorder_buffer.expire(now)
+                updates.extend(ready)
+                for game_ID in lost:
+                    # Board changes were lost: only a keyframe can set the board right
+                    displayed_ID = self.display_ID(game_ID)
+                    if displayed_ID in self.remote_range:
+                        self.remote_games[displayed_ID].has_keyframe = False
+                        network.queue_update(game_ID, protocol.KEYFRAME_REQUEST)
+
+            for game_ID, opcode, args in updates:
+                game_ID = self.display_ID(game_ID)
+
+                if opcode == protocol.BONUS:
+                    # Bonus lines sent to one of the local games
+                    if game_ID in self.active_range:
+                        self.active_games[game_ID].bonus_lines = args[0]
+                    continue
+                if opcode == protocol.KEYFRAME_REQUEST:
+                    # Next board update of a local game goes out whole
+                    if game_ID in self.active_range or game_ID in self.AI_range:
+                        self.keyframe_countdowns[game_ID] = 0
+                    continue
+                # Only remote games still playing take updates, any other ID is dropped
+                if game_ID not in self.remote_range:
+                    continue
+                remote_game = self.remote_games[game_ID]
+                if opcode == protocol.KEYFRAME:
+                    remote_game.board = args[0]
+                    remote_game.has_keyframe = True
+                    opcode, args = events.BOARD, ()
+                elif opcode == events.BOARD:
+                    if not remote_game.has_keyframe:
+                        # Changes can't apply to a board never received
+                        network.queue_update(self.network_ID(game_ID), protocol.KEYFRAME_REQUEST)
+                        continue
+                    remote_game.apply_changes(*args)
+                    args = ()
+                events.push_args(remote_game.events, opcode, args)
 
             #  process game reports for each type and note lost games
             invalids = []
@@ -889,57 +939,197 @@ class GameScreen(Screen):
                 global ghost
                 if ghost:
                     self.games[game_ID].ghost = self.active_games[game_ID].ghost
-                if len(self.active_games[game_ID].reports) > 0:
-                    if not process_reports(self.active_games[game_ID].reports, game_ID, self.is_connected):
+                if len(self.active_games[game_ID].events) > 0:
+                    if not process_reports(self.active_games[game_ID], game_ID, self.is_connected):
                         invalids.append(game_ID)
             for game_ID in self.remote_range:
-                if len(self.remote_games[game_ID].reports) > 0:
-                    if not process_reports(self.remote_games[game_ID].reports, game_ID, False):
+                if len(self.remote_games[game_ID].events) > 0:
+                    if not process_reports(self.remote_games[game_ID], game_ID, False):
                         invalids.append(game_ID)
             for game_ID in self.AI_range:
-                if len(self.AI_games[game_ID].reports) > 0:
-                    if not process_reports(self.AI_games[game_ID].reports, game_ID, self.is_connected):
+                if len(self.AI_games[game_ID].events) > 0:
+                    if not process_reports(self.AI_games[game_ID], game_ID, self.is_connected):
                         invalids.append(game_ID)
 
             end_tick()
 
+            # Everything local games reported this frame goes out together
+            if self.is_connected:
+                network.flush_updates()
+
         else:
             # Game over, we have a winner
             time.sleep(3)
             self.next = MainScreen()
+            self.cancel_AI()
+            self.log_AI_stats()
             pygame.event.clear()
 
     def process_AI(self):
         """
         Manage the AI games and the AI workers
 
-        Relies on self.ready_games to track drop timer and
-        AI_ready_queue to receive data from workers, and
-        AI_todo_queue to send them AI data in need of calculation
+        Relies on self.ready_games to track drop timer,
+        self.AI_scheduler to order decisions by the time their piece would lock,
+        self.AI_speculations to hold decisions worked out ahead for the next piece,
+        AI_ready_queue to receive data from workers,
+        AI_boards and AI_jobs to send them AI data in need of calculation, and
+        AI_todo_queue to wake them up
 
         """
-        now = time.process_time()
+        now = clock.time()
 
         # Process returns from AI workers and timestamp results
         while not AI_ready_queue.empty():
-            game_ID, new_shape, new_col = AI_ready_queue.get()
-            if game_ID not in self.lost_range:
-                self.AI_games[game_ID].unsafe_move_to(new_shape, self.AI_games[game_ID].piece_row, new_col)
-                self.ready_games[game_ID] = now
-
-        # Check AI games for drop timer
-        need_to_move = []
-        for game_ID in self.ready_games:
-            if game_ID not in self.lost_range and now - self.ready_games[game_ID] > 2:
-                self.AI_games[game_ID].drop()
-                need_to_move.append(game_ID)
-
-        # Send AI workers the data for next move when ready
-        for game_ID in need_to_move:
-            del(self.ready_games[game_ID])
-            AI_todo_queue.put((game_ID, self.AI_games[game_ID].board,
-                               self.AI_games[game_ID].piece.piece_data,
-                               self.AI_games[game_ID].piece_row))
+            results, hits, misses = AI_ready_queue.get()
+            self.AI_cache_stats[0] += hits
+            self.AI_cache_stats[1] += misses
+            for game_ID, epoch, generation, moves in results:
+                # Results from a cancelled epoch or for a board that was written over since are stale
+                if epoch != self.AI_epoch or game_ID in self.lost_range or generation != AI_boards.generation(game_ID):
+                    continue
+                on_time = self.AI_scheduler.complete(game_ID, now)
+                game = self.AI_games[game_ID]
+                speculation = self.AI_speculations.get(game_ID)
+                if speculation is not None:
+                    if speculation['piece'] is None:
+                        # Piece not dropped yet, keep the moves for the next one
+                        speculation['moves'] = moves
+                    else:
+                        # Speculation confirmed before its moves came
+                        del(self.AI_speculations[game_ID])
+                        if game.piece is speculation['piece']:
+                            self.apply_AI_moves(game_ID, moves, now)
+                        else:
+                            self.AI_scheduler.request(game_ID, game.lock_deadline(), now)
+                elif on_time:
+                    self.apply_AI_moves(game_ID, moves, now)
+                elif on_time is False:
+                    # Gravity locked the piece before its moves came, ask again for the new one
+                    self.AI_scheduler.request(game_ID, game.lock_deadline(), now)
+                    decisions, mean, worst, misses = self.AI_scheduler.report()[game_ID]
+                    logging.info('AI game %d missed a deadline: %d misses in %d decisions, latency %.3fs mean, '
+                                 '%.3fs worst', game_ID, misses, decisions, mean, worst)
+
+        # Check AI games for drop timer, or for gravity having locked their piece first
+        for game_ID in list(self.ready_games):
+            if game_ID in self.lost_range:
+                continue
+            game = self.AI_games[game_ID]
+            speculation = self.AI_speculations.get(game_ID)
+            locked = speculation is not None and game.piece is not speculation['dropping']
+            if locked or now - self.ready_games[game_ID] > self.AI_DROP_DELAY:
+                del(self.ready_games[game_ID])
+                if not locked:
+                    game.drop()
+                    self.tick_scheduler.schedule(game_ID, game.deadline())
+                self.AI_speculations.pop(game_ID, None)
+                # Anything but the predicted board and piece (bonus lines...) makes the speculation worthless
+                if speculation is not None and speculation['position'] == self.AI_position(game):
+                    if speculation['moves'] is not None:
+                        self.apply_AI_moves(game_ID, speculation['moves'], now)
+                    else:
+                        speculation['piece'] = game.piece
+                        self.AI_speculations[game_ID] = speculation
+                else:
+                    self.AI_scheduler.request(game_ID, game.lock_deadline(), now)
+
+        # Send AI workers the data for next move, all in one batch with the most urgent first
+        jobs = []
+        for game_ID, cheap in self.AI_scheduler.submit(now):
+            game = self.AI_games[game_ID]
+            speculation = self.AI_speculations.get(game_ID)
+            if speculation is not None:
+                generation = AI_boards.write(game_ID, speculation['board'])
+                jobs.append((game_ID, self.AI_epoch, generation, *speculation['position'], cheap,
+                             *speculation['queue']))
+            else:
+                generation = AI_boards.write(game_ID, game.board)
+                jobs.append((game_ID, self.AI_epoch, generation, *self.AI_position(game), cheap, *game.pieces))
+        # Wake up as many workers as were dealt jobs
+        for _ in range(AI_jobs.submit(jobs)):
+            AI_todo_queue.put(True)
+
+    def cancel_AI(self):
+        """
+        Cancel every AI job of the screen so workers move on, decisions still needed are asked again on resuming
+        """
+        self.AI_epoch = AI_jobs.new_epoch()
+        self.AI_scheduler.requeue()
+
+    def log_AI_stats(self):
+        """
+        Log how the AI workers fared over the match: evaluation cache use, then decision latency per game
+        """
+        hits, misses = self.AI_cache_stats
+        if hits or misses:
+            logging.info('AI evaluation cache: %d hits, %d misses (%.0f%% hit rate)',
+                         hits, misses, 100 * hits / (hits + misses))
+        for game_ID, (decisions, mean, worst, misses) in sorted(self.AI_scheduler.report().items()):
+            logging.info('AI game %d: %d decisions, latency %.3fs mean, %.3fs worst, %d deadline misses',
+                         game_ID, decisions, mean, worst, misses)
+
+    def apply_AI_moves(self, game_ID, moves, now):
+        """
+        Play the moves of an AI decision, then start working out the next piece's
+        """
+        game = self.AI_games[game_ID]
+        # Moves go through the game's own checks, any that no longer fits is refused
+        for move in moves:
+            getattr(game, move)()
+        self.ready_games[game_ID] = now
+
+        # The board after the drop and the next piece are already known: ask for its decision right away
+        board = game.predict_drop()
+        masks = [line.mask for line in board]
+        type_id = game.pieces[0]
+        hold_type, hold_shape = self.AI_hold(game)
+        self.AI_speculations[game_ID] = {
+            'position': (zobrist.board_hash(masks), type_id, hold_type, hold_shape,
+                         *ai.spawn_position(masks, type_id)),
+            'board': board,
+            # The piece joining the queue on the drop is not known yet
+            'queue': list(game.pieces)[1:] + [-1],
+            'moves': None,
+            'dropping': game.piece,
+            'piece': None}
+        self.AI_scheduler.request(game_ID, now + self.AI_DROP_DELAY, now)
+
+    def network_ID(self, game_ID):
+        """
+        Return the ID a displayed game goes by on the network, local games being displayed first
+        """
+        if game_ID < self.remote_offset:
+            return game_ID + self.my_offset
+        elif game_ID < self.my_offset + self.remote_offset:
+            return game_ID - self.remote_offset
+        return game_ID
+
+    def display_ID(self, game_ID):
+        """
+        Return the displayed game a network game ID stands for (see network_ID)
+        """
+        if game_ID < self.my_offset:
+            return game_ID + self.remote_offset
+        elif game_ID < self.my_offset + self.remote_offset:
+            return game_ID - self.my_offset
+        return game_ID
+
+    @staticmethod
+    def AI_hold(game):
+        """
+        Return the type and rotation of the hold piece, -1 and 0 when nothing is held
+        """
+        if game.hold_piece is None:
+            return -1, 0
+        return game.hold_piece.type_id, game.hold_piece.shape_index
+
+    @staticmethod
+    def AI_position(game):
+        """
+        Return what an AI decision depends on: board hash, piece type, hold type and rotation, piece row and column
+        """
+        return (game.hash, game.piece.type_id, *GameScreen.AI_hold(game), game.piece_row, game.piece_col)
 
 
 def play_next_song(menu=False):
@@ -1000,6 +1190,14 @@ def load_config(default=False):
     run_AI = config['Gameplay'].getboolean('AI')
     global max_games
     max_games = config['Gameplay'].getint('max games')
+    global AI_lookahead
+    AI_lookahead = config['Gameplay'].getboolean('AI lookahead', fallback=True)
+    # Vectorized AI needs numpy, the search AI is used without it
+    global AI_vectorized
+    AI_vectorized = config['Gameplay'].getboolean('AI vectorized', fallback=False) and vector_ai.numpy is not None
+    # AI workers' stats are logged at the end of each match, deadline misses as they happen
+    if config['Gameplay'].getboolean('AI stats', fallback=False):
+        logging.basicConfig(level=logging.INFO)
     global ghost
     ghost = config['Gameplay'].getboolean('ghost')
 
@@ -1099,6 +1297,10 @@ def set_up():
     finally:
         os.chdir(base_dir)
 
+    # Game time for every gameplay timer
+    global clock
+    clock = game_clock.GameClock()
+
     # Network configuration and threads
     global network
     network = networking.Network(*network_conf)
@@ -1117,8 +1319,16 @@ def set_up():
         pass
     AI_ready_queue = multiprocessing.SimpleQueue()
     AI_todo_queue = multiprocessing.SimpleQueue()
-    for _ in range(CPU_count):
-        process = multiprocessing.Process(target=ai.AI_worker, args=(AI_ready_queue, AI_todo_queue))
+    # Boards are shared with the workers rather than sent through the queue, one slot per game
+    global AI_boards
+    AI_boards = board_arena.BoardArena(max_games)
+    # Jobs of a frame are submitted at once and balanced between workers
+    global AI_jobs
+    # Vectorized workers decide a whole chunk at once, larger chunks make larger batches
+    AI_jobs = job_board.JobBoard(CPU_count, max_games, chunk=8 if AI_vectorized else 2)
+    for worker in range(CPU_count):
+        process = multiprocessing.Process(target=ai.AI_worker, args=(AI_ready_queue, AI_todo_queue, AI_boards.name,
+                                                                     AI_jobs, worker, AI_lookahead, AI_vectorized))
         process.daemon = True
         process.start()
 
@@ -1182,6 +1392,12 @@ def quit_game():
     except:
         pass
 
+    # Free the shared boards
+    try:
+        AI_boards.close(unlink=True)
+    except:
+        pass
+
 
 def main():
     pygame.mixer.pre_init(44100, -16, 1, 512)
@@ -1202,6 +1418,7 @@ def main():
     while True:
         pause_triggered = active_screen.process_input()
         if not pause_triggered and not exit_triggered:
+            clock.advance()
             active_screen.process_events()
             active_screen.process_AI()
             active_screen = active_screen.next
@@ -1211,6 +1428,7 @@ def main():
                 pygame.quit()
                 sys.exit()
             time.sleep(0.1)
+            clock.hold()
 
 
 if __name__ == '__main__':
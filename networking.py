@@ -1,15 +1,23 @@
+import queue
+import selectors
 import socket
 import struct
-import pickle
-import time
+import threading
 from collections import deque
 
+import game_clock
+import protocol
+
 
 class Network:
     """
     Network interface for tetramino game
+
+    The network thread runs loop(): it sleeps in a selector until datagrams come in, the main thread sends
+    a command or a timer is due. The main thread steers it through command(), reads its results
+    (task, host_data, sync_status, game_data, game_updates) and waits for syncs to end with wait_for_sync()
     """
-    from data import socket_time_out, broadcast_delay, time_to_expire, incoming_buffer
+    from data import broadcast_delay, time_to_expire, incoming_buffer
 
     def __init__(self, port, multicast_address, time_to_live):
         self.port = port
@@ -18,37 +26,76 @@ class Network:
         self.time_to_live = time_to_live
 
         self.set_up_sockets()
+
+        # Datagrams are received into one buffer and decoded through views of it
+        self.buffer = bytearray(self.incoming_buffer)
+        self.view = memoryview(self.buffer)
+
+        # Game updates of the frame, sent together by flush_updates
+        self.outbox = protocol.Outbox()
+
+        # Commands from the main thread, each written along with a byte on a socket pair to wake the selector
+        self.commands = queue.SimpleQueue()
+        self.wake_in, self.wake_out = socket.socketpair()
+        self.wake_in.setblocking(False)
+        # Set by the network thread once a sync or sync_master task is through
+        self.synced = threading.Event()
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock_in, selectors.EVENT_READ, self.read_datagrams)
+        self.selector.register(self.wake_in, selectors.EVENT_READ, self.read_commands)
+
+        # Also starts the timers: wall time at which each is due, by name of the method to call
         self.reset_data()
 
+    def command(self, task, game_data=None, hosts=()):
+        """
+        Ask the network thread to switch task: 'reset', 'scan', 'sync', 'sync_master' (with the encoded
+        game data to send and the IPs of the hosts it gives games to), 'game' or 'stop'
+
+        Safe to call from any thread
+        """
+        # Whatever sync came before, the new task has not been through yet
+        self.synced.clear()
+        self.commands.put((task, game_data, hosts))
+        self.wake_out.send(b'\0')
+
+    def wait_for_sync(self, timeout):
+        """
+        Block until the current sync or sync_master task is through
+
+        Return whether it was before timeout seconds
+        """
+        return self.synced.wait(timeout)
+
     def loop(self):
         """
         Control structure of the network thread
 
-        Controlled by the main thread through task variable
+        Wait for sockets to be ready or the next timer, then serve all that is ready, until stopped
         """
-        while True:
-            if self.task == 'reset':
-                # Start up or after a game
-                self.reset_data()
-            elif self.task == 'sync':
-                # Client for multi host game
-                self.sync()
-            elif self.task == 'sync_master':
-                # Master host for multi host game
-                self.sync_master()
-            elif self.task == 'game':
-                # Game in progress - both master and client
-                self.game()
+        while self.task != 'stop':
+            if self.timers:
+                timeout = max(0, min(self.timers.values()) - game_clock.wall_time())
             else:
-                # Fallback on scanning local network for other hosts
-                self.task = 'scan'
-                self.scan_local_network()
+                timeout = None
+            for key, mask in self.selector.select(timeout):
+                key.data()
+            now = game_clock.wall_time()
+            for name, due in list(self.timers.items()):
+                if due <= now:
+                    del self.timers[name]
+                    getattr(self, name)()
+
+        self.selector.close()
+        for sock in (self.sock_in, self.sock_out, self.wake_in, self.wake_out):
+            sock.close()
 
     def set_up_sockets(self):
         '''
         Prepare local network sockets for datagram exchange
 
-        Incoming socket should have short timeout for loops to function smoothly and
+        Incoming socket is non blocking, read once the selector reports it ready, with a
         buffer large enough to handle board data
 
         Outgoing socket is a multicast socket
@@ -61,7 +108,7 @@ class Network:
 
         # Set up incoming socket
         self.sock_in = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock_in.settimeout(self.socket_time_out)
+        self.sock_in.setblocking(False)
         # Bind to all network interfaces
         server_address = ('', self.port)
         self.sock_in.bind(server_address)
@@ -70,6 +117,39 @@ class Network:
         multi = struct.pack('4sL', group, socket.INADDR_ANY)
         self.sock_in.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, multi)
 
+    def read_datagrams(self):
+        """
+        Decode and handle every datagram waiting on the incoming socket (see protocol.py)
+
+        Undecodable datagrams are dropped
+        """
+        while True:
+            try:
+                size, origin = self.sock_in.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                opcode, data = protocol.decode(self.view[:size])
+            except protocol.ProtocolError:
+                continue
+            self.handle(opcode, data, origin[0])
+
+    def read_commands(self):
+        """
+        Carry out every command waiting in the queue
+        """
+        try:
+            while self.wake_in.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while True:
+            try:
+                task, game_data, hosts = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            self.start(task, game_data, hosts)
+
     def reset_data(self):
         '''
         Prepares all variables for a fresh scan
@@ -83,6 +163,7 @@ class Network:
         self.messages = deque()
         self.game_updates = deque()
         self.host_data = {}
+        self.ack_list = {}
 
         # Find local network IP address
         try:
@@ -96,47 +177,124 @@ class Network:
                                       'players': None,
                                       'max': None,
                                       'AI': None}
+        self.timers = {'announce': game_clock.wall_time()}
 
-    def scan_local_network(self):
+    def start(self, task, game_data=None, hosts=()):
         """
-        Listen to local network for other games
-
-        Update host data when recieved
+        Switch to a task, see command()
         """
-        my_task = 'scan'
-        last_msg = time.process_time()
-
-        # Exit if main program requests, otherwise keep listening
-        while self.task == my_task:
-            if time.process_time() - last_msg > self.broadcast_delay and self.my_data is not None:
-                self.update_status()
-                last_msg = time.process_time()
-            try:
-                # Check for messages
-                payload, origin = self.sock_in.recvfrom(self.incoming_buffer)
-                IP = origin[0]
-                msg_task, data = pickle.loads(payload)
-                # Store and time stamp the data if message is relevant
-                if IP != self.my_IP and msg_task == 'announce':
-                    self.host_data[IP] = {key: data[key] for key in data}
-                    self.host_data[IP]['update_time'] = time.process_time()
-            except:
-                pass
+        if self.task == 'scan' and task != 'scan':
+            # One more broadcast on leaving the scan to update status
+            self.update_status()
+        self.timers.clear()
+
+        if task == 'reset':
+            # Start up or after a game
+            self.reset_data()
+        elif task == 'sync':
+            # Client for multi host game: wait for game data from master, send ack, wait for sync signal
+            # Keep track of progress, synced being set once it is all done
+            self.sync_status = {'game_data_recv': False,
+                                'ack': False,
+                                'sync_recv': False}
+            self.task = task
+        elif task == 'sync_master':
+            # Master host for multi host game: broadcast game data, keep track of acks, send start signal
+            # Keep track of progress, synced being set once it is all done
+            self.sync_status = {'game_data_sent': False,
+                                'all_acks': False,
+                                'sync_sent': False}
+            self.game_data = game_data
+            self.sock_out.sendto(protocol.encode_game_data(self.game_data), self.multicast_group)
+            self.sync_status['game_data_sent'] = True
+            # Set up list to check on clients
+            self.ack_list = {IP: False for IP in hosts if IP != self.my_IP}
+            self.check_acks()
+            self.task = task
+        elif task == 'game':
+            # Game in progress - both master and client
+            self.task = task
+            self.game_updates.clear()
+        elif task == 'stop':
+            # Leave the loop and close the sockets
+            self.task = task
+        else:
+            # Fallback on scanning local network for other hosts
+            self.task = 'scan'
+            self.timers['announce'] = game_clock.wall_time()
+
+    def handle(self, opcode, data, IP):
+        """
+        Act on a decoded datagram according to the current task
+        """
+        if self.task == 'scan':
+            # Store and time stamp the data if message is relevant
+            if IP != self.my_IP and opcode == protocol.ANNOUNCE:
+                self.host_data[IP] = {key: data[key] for key in data}
+                self.host_data[IP]['update_time'] = game_clock.wall_time()
+                self.expire()
+
+        elif self.task == 'sync':
+            if opcode == protocol.GAME_DATA and not self.sync_status['game_data_recv']:
+                self.game_data = data
+                if self.my_IP in self.game_data:
+                    self.sync_status['game_data_recv'] = True
+                    self.sock_out.sendto(protocol.encode_signal(protocol.ACK), self.multicast_group)
+                    self.sync_status['ack'] = True
+            elif opcode == protocol.SYNC and self.sync_status['ack']:
+                self.sync_status['sync_recv'] = True
+                self.synced.set()
+
+        elif self.task == 'sync_master':
+            if opcode == protocol.ACK and IP in self.ack_list:
+                self.ack_list[IP] = True
+                self.check_acks()
+
+        elif self.task == 'game':
+            if IP != self.my_IP:
+                if opcode == protocol.BATCH:
+                    self.game_updates.extend(data)
+                elif opcode in protocol.ARGUMENTS:
+                    game_ID, sequence, args = data
+                    self.game_updates.append((game_ID, sequence, opcode, args))
+
+    def check_acks(self):
+        """
+        Broadcast game start sync message once every client acknowledged the game data
+        """
+        if not self.sync_status['all_acks'] and all(self.ack_list.values()):
+            self.sync_status['all_acks'] = True
+            self.sock_out.sendto(protocol.encode_signal(protocol.SYNC), self.multicast_group)
+            self.sync_status['sync_sent'] = True
+            self.synced.set()
 
-            # Check for expired host data or offline games
-            current_time = time.process_time()
-            pop_games = []
-            for IP in self.host_data:
-                if IP != self.my_IP:
-                    # remove if stale or has started offline game
-                    if current_time - self.host_data[IP]['update_time'] > self.time_to_expire or self.host_data[IP]['status'] == 'off':
-                        pop_games.append(IP)
-            # Remove unavailable clients
-            for host in pop_games:
-                self.host_data.pop(host, None)
-
-        # One more broadcast on loop exit to update status
+    def announce(self):
+        """
+        Timer of the scan: broadcast status every broadcast_delay
+        """
         self.update_status()
+        self.timers['announce'] = game_clock.wall_time() + self.broadcast_delay
+
+    def expire(self):
+        """
+        Timer of the scan: remove hosts that went stale or started an offline game, then wait for the next one
+        """
+        current_time = game_clock.wall_time()
+        pop_games = []
+        for IP in self.host_data:
+            if IP != self.my_IP:
+                # remove if stale or has started offline game
+                if current_time - self.host_data[IP]['update_time'] > self.time_to_expire or self.host_data[IP]['status'] == 'off':
+                    pop_games.append(IP)
+        # Remove unavailable clients
+        for host in pop_games:
+            self.host_data.pop(host, None)
+
+        updates = [self.host_data[IP]['update_time'] for IP in self.host_data if IP != self.my_IP]
+        if updates:
+            self.timers['expire'] = min(updates) + self.time_to_expire
+        else:
+            self.timers.pop('expire', None)
 
     def update_status(self):
         """
@@ -147,128 +305,17 @@ class Network:
         if self.my_data is not None:
             for item in self.my_data:
                 self.host_data[self.my_IP][item] = self.my_data[item]
-            message = pickle.dumps(('announce', self.my_data))
-            self.sock_out.sendto(message, self.multicast_group)
+            self.sock_out.sendto(protocol.encode_announce(self.my_data), self.multicast_group)
 
-    def sync(self):
+    def queue_update(self, game_ID, opcode, args=()):
         """
-        Sync up with remote master host
-        -Wait for game data from master
-        -Send ack
-        -Wait for sync signal
-
-        Relies on multigroup socket
+        Queue a game update to be broadcast with the others of the frame (see protocol.Outbox)
         """
-        my_task = 'sync'
-
-        # Keep track of progress, checked by main thread
-        self.sync_status = {'game_data_recv': False,
-                            'ack': False,
-                            'sync_recv': False}
+        self.outbox.queue(game_ID, opcode, args)
 
-        # Wait for game data
-        while self.task == my_task and not self.sync_status['game_data_recv']:
-            try:
-                payload, origin = self.sock_in.recvfrom(self.incoming_buffer)
-                msg_task, data = pickle.loads(payload)
-                if msg_task == 'game_data':
-                    self.game_data = data
-                    if self.my_IP in self.game_data:
-                        self.sync_status['game_data_recv'] = True
-            except:pass
-
-        # Send ack
-        if self.task == my_task:
-            self.sock_out.sendto(pickle.dumps(('ack', ())), self.multicast_group)
-            self.sync_status['ack'] = True
-
-        # waiting for go
-        while self.task == my_task and not self.sync_status['sync_recv']:
-            try:
-                payload, origin = self.sock_in.recvfrom(self.incoming_buffer)
-                task, data = pickle.loads(payload)
-                if task == 'sync' and 'game_data' in payload:
-                    self.sync_status['sync_recv'] = True
-            except:
-                pass
-
-        # Wait for main thread to start game
-        while self.task == my_task:
-            time.sleep(0.1)
-
-    def sync_master(self):
+    def flush_updates(self):
         """
-        Sync up with any clients:
-        -Broadcast game data for game
-        -Keep track of Acks from clients
-        -Send game start signal
-
-        Relies on multigroup outgoing socket
+        Broadcast the game updates queued this frame
         """
-        my_task = 'sync_master'
-        # Progress report checked by main thread
-        self.sync_status = {'game_data_sent': False,
-                            'all_acks': False,
-                            'sync_sent': False}
-
-        # Wait for main thread to release game data
-        data_timeout = time.process_time()
-        while self.game_data is None and time.process_time() - data_timeout < self.time_to_expire:
-            if time.process_time() - data_timeout > self.time_to_expire:
-                self.task = 'reset'
-                return
-            time.sleep(0.1)
-        # Broadcast game data
-        self.sock_out.sendto(pickle.dumps(('game_data', self.game_data)), self.multicast_group)
-        self.sync_status['game_data_sent'] = True
-
-        # Set up list to check on clients
-        all_acks = False
-        ack_list = {}
-        for IP in self.game_data:
-            if IP != 'AI' and IP != self.my_IP:
-                ack_list[IP] = False
-
-        # Scan for acks until all received or main thread instructs otherwise
-        while self.task == my_task and not all_acks:
-            try:
-                # Receive acks
-                payload, origin = self.sock_in.recvfrom(self.incoming_buffer)
-                task, data = pickle.loads(payload)
-                if task == 'ack':
-                    ack_list[origin[0]] = True
-
-                # Store received acks
-                all_acks = True
-                for IP in ack_list:
-                    if not ack_list[IP]:
-                        all_acks = False
-            except:
-                pass
-        self.sync_status['all_acks'] = True
-
-        # Broadcast game start sync message
-        if self.task == my_task:
-            self.sock_out.sendto(pickle.dumps(('sync', ())), self.multicast_group)
-            self.sync_status['sync_sent'] = True
-
-        # Wait for main thread to start game
-        while self.task == my_task:
-            time.sleep(0.1)
-
-    def game(self):
-        my_task = 'game'
-        self.game_updates.clear()
-        while self.task == my_task:
-            try:
-                payload, origin = self.sock_in.recvfrom(self.incoming_buffer)
-                IP = origin[0]
-                msg_task, data = pickle.loads(payload)
-                if IP != self.my_IP and msg_task == 'game_update':
-                    self.game_updates.append(data)
-            except:
-                pass
-
-    def send_update(self, game_ID, report):
-        payload = ('game_update', (game_ID, report))
-        self.sock_out.sendto(pickle.dumps(payload), self.multicast_group)
+        for datagram in self.outbox.flush():
+            self.sock_out.sendto(datagram, self.multicast_group)
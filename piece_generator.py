@@ -1,20 +1,20 @@
-from random import shuffle
+import random
 from collections import deque
 
 
-import tetramino
-
-
 class PieceGen:
     """
     Generate semi-random series of tetraminos
 
+    Bags are shuffled with the given random generator so a seeded one makes the series reproducible
+
     Return:
-        Next instance of Piece
+        Type id of the next piece, its index in pieces_data
     """
     from data import pieces_data
 
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.random = rng if rng is not None else random.Random()
         self.base_bag = [0, 1, 2, 3, 4, 5, 6]
         self.queue = deque()
 
@@ -26,10 +26,10 @@ class PieceGen:
         Manage piece queue
 
         A new randomized bag of pieces is appended at the end of the queue every time it contains less than a full set
-        Each iteration returns the next tetramino instance
+        Each iteration returns the next piece type id
         """
         while len(self.queue) <= len(self.pieces_data):
-            shuffle(self.base_bag)
+            self.random.shuffle(self.base_bag)
             for piece in self.base_bag:
                 self.queue.append(piece)
-        return tetramino.Piece(self.pieces_data[self.queue.popleft()])
+        return self.queue.popleft()
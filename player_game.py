@@ -1,32 +1,145 @@
-import time
 import random
 
 from collections import deque
 
-import display_game
 import piece_generator
+import tetramino
+import events
+import zobrist
 
 
-class ActiveBoard(display_game.Board):
-    """Represent a classic Tetris Board"""
-    from data import QUEUE_LENGTH, STARTING_TICK_LENGTH, score_map, bad_block,\
-        default_speed, fast_speed, lines_per_level, EMPTY
+class Row(list):
+    """
+    Board row that keeps an integer bitmask of its occupied slots next to their colors
 
+    Bit n of mask is set whenever slot n holds anything but EMPTY. Every list operation that changes
+    slots keeps it in step, those moving slots around rebuilding it
+    """
+    __slots__ = ('mask',)
 
-    def __init__(self, ghost):
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.update_mask()
+
+    def update_mask(self):
+        """
+        Rebuild the bitmask from the slots
+        """
+        self.mask = 0
+        for col in range(len(self)):
+            if self[col]:
+                self.mask |= 1 << col
+
+    def reset(self, items, mask):
+        """
+        Overwrite every slot in place so the row object can be reused, mask being the bitmask of items
+        """
+        super().__setitem__(slice(None), items)
+        self.mask = mask
+
+    def __setitem__(self, col, item):
+        super().__setitem__(col, item)
+        if isinstance(col, slice):
+            self.update_mask()
+            return
+        if col < 0:
+            col += len(self)
+        if item:
+            self.mask |= 1 << col
+        else:
+            self.mask &= ~(1 << col)
+
+    def __delitem__(self, col):
+        super().__delitem__(col)
+        self.update_mask()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def append(self, item):
+        super().append(item)
+        if item:
+            self.mask |= 1 << (len(self) - 1)
+
+    def extend(self, items):
+        super().extend(items)
+        self.update_mask()
+
+    def insert(self, col, item):
+        super().insert(col, item)
+        self.update_mask()
+
+    def pop(self, col=-1):
+        item = super().pop(col)
+        self.update_mask()
+        return item
+
+    def remove(self, item):
+        super().remove(item)
+        self.update_mask()
+
+    def clear(self):
+        super().clear()
+        self.mask = 0
+
+
+class ActiveBoard:
+    """
+    Represent a classic Tetris Board
+
+    Pure game engine: no display, no wall clock and no global random state.
+    Time comes from the clock callable given at creation, or when there is none from the
+    engine's own time advanced by step(), and all randomness from a generator seeded by seed
+    """
+    from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, EMPTY, WALL,\
+        QUEUE_LENGTH, STARTING_TICK_LENGTH, score_map, bad_block, default_speed, fast_speed, lines_per_level
+    NEW_LINE = [WALL]*FIELD_H_BOUND + [EMPTY] * FIELD_WIDTH + [WALL] * FIELD_H_BOUND
+    # Actions accepted by step()
+    ACTIONS = {'move_left', 'move_right', 'move_down', 'turn_clockwise', 'turn_counter_clockwise', 'drop',
+               'store_piece', 'speed_up', 'unsafe_move_to'}
+    # Board changes reported with each new piece (see events.BOARD): nothing locked, cleared or added
+    NO_CHANGES = (tetramino.EMPTY_SHAPE, 0, 0, 0, 0, 0)
+
+
+    def __init__(self, ghost, seed=None, clock=None):
         """"""
-        super().__init__(ghost)
+        # Bitboard rows: collision checks become AND operations between masks
+        self.board = [Row(self.NEW_LINE) for _ in range(self.FIELD_HEIGHT + self.FIELD_V_BOUND)]
+        self.FULL_ROW = (1 << len(self.NEW_LINE)) - 1
+        self.NEW_LINE_MASK = self.board[0].mask
+
+        # Expand it with bottom walls for easy movement checks
+        self.BOTTOM_BUFFER = self.FIELD_WIDTH // 2
+        while len(self.board) < (self.FIELD_HEIGHT + self.FIELD_V_BOUND + self.BOTTOM_BUFFER):
+            self.board.append(Row([self.WALL for _ in self.NEW_LINE]))
+
+        # Deterministic sources of time and randomness
+        self.random = random.Random(seed)
+        self.engine_time = 0
+        self.clock = clock if clock is not None else self.engine_clock
+
+        # Needed variables
+        self.events = events.EventRing()
+        self.ghost = True if ghost else False
+        self.score = 0
+        self.lost = False
 
         # Set where new pieces spawn
         self.SPAWN_ROW = 0
         self.SPAWN_COL = len(self.NEW_LINE)//2 - 2        # Larger than any piece's gap to its side
 
+        # Surface of each column and hash of the board, kept up to date as the board changes
+        self.update_heights()
+        self.update_hash()
+
         # Piece generator
         self.pieces = deque()
-        self.piece_gen = piece_generator.PieceGen()
+        self.piece_gen = piece_generator.PieceGen(self.random)
 
         # Get first piece started
         self.bonus_lines = False
+        self.board_changes = list(self.NO_CHANGES)
         self.next_piece()
 
         # Prepare needed variables
@@ -46,17 +159,37 @@ class ActiveBoard(display_game.Board):
 
         # Check each row in turn for lack of an empty slot and add to list
         for row in reversed(range(len(self.board) - self.BOTTOM_BUFFER)):
-            if self.EMPTY not in self.board[row]:
+            if self.board[row].mask == self.FULL_ROW:
                 full_lines.append(row)
         cleared_count = len(full_lines)
 
-        # Remove the full lines and replace with empy row
-        for full in reversed(full_lines):
-            self.board.pop(full)
-            self.board.insert(0, [item for item in self.NEW_LINE])
-
         # Update game data
         if cleared_count > 0:
+            # Full rows are emptied and reused on top, rows above them fall in a single slice assignment
+            bottom = full_lines[0] + 1
+            old_masks = [line.mask for line in self.board[:bottom]]
+            recycled = []
+            kept = []
+            for line in self.board[:bottom]:
+                if line.mask == self.FULL_ROW:
+                    line.reset(self.NEW_LINE, self.NEW_LINE_MASK)
+                    recycled.append(line)
+                else:
+                    kept.append(line)
+            self.board[:bottom] = recycled + kept
+            self.rehash_rows(old_masks)
+            for row in full_lines:
+                self.board_changes[3] |= 1 << row
+
+            # Rows above the cleared lines fell by the number of lines cleared
+            top = full_lines[-1]
+            for col in range(self.FIELD_H_BOUND, self.FIELD_H_BOUND + self.FIELD_WIDTH):
+                if self.heights[col] < top:
+                    self.heights[col] += cleared_count
+                else:
+                    # Surface was part of a cleared line
+                    self.heights[col] = self.column_height(col, top)
+
             self.lines_cleared += cleared_count
             self.level_up()
             self.score += self.level * self.score_map[cleared_count]
@@ -66,7 +199,7 @@ class ActiveBoard(display_game.Board):
                 if self.bonus_lines <= 0:
                     self.bonus_lines = False
                     cleared_count = 0
-            self.report('clear' + str(cleared_count))
+            self.events.push(events.CLEAR, cleared_count, self.score)
 
     def next_piece(self):
         """
@@ -75,15 +208,27 @@ class ActiveBoard(display_game.Board):
         # Check if we have any bonus lines queued to be added to the field
         if self.bonus_lines:
             # Pick empty slot in bonus lines
-            empty = random.randint(self.FIELD_H_BOUND, self.FIELD_H_BOUND + self.FIELD_WIDTH - 1)
-            # Spawn one new line per bonus line, pushing others to the top
-            for _ in range(self.bonus_lines):
-                self.board.pop(0)
-                row = self.FIELD_HEIGHT - 1
-                self.board.insert(row, [x for x in self.NEW_LINE])
-                for col in range(self.FIELD_H_BOUND, self.FIELD_H_BOUND + self.FIELD_WIDTH):
-                    if col != empty:
-                        self.board[row][col] = self.bad_block
+            empty = self.random.randint(self.FIELD_H_BOUND, self.FIELD_H_BOUND + self.FIELD_WIDTH - 1)
+            line = [self.WALL] * self.FIELD_H_BOUND + [self.bad_block] * self.FIELD_WIDTH + [self.WALL] * self.FIELD_H_BOUND
+            line[empty] = self.EMPTY
+            mask = self.FULL_ROW & ~(1 << empty)
+            # Rows pushed off the top are reused as the bonus lines, others rise in a single slice assignment
+            count = min(self.bonus_lines, self.FIELD_HEIGHT)
+            old_masks = [old_line.mask for old_line in self.board[:self.FIELD_HEIGHT]]
+            recycled = self.board[:count]
+            for bonus_line in recycled:
+                bonus_line.reset(line, mask)
+            self.board[:self.FIELD_HEIGHT] = self.board[count:self.FIELD_HEIGHT] + recycled
+            self.rehash_rows(old_masks)
+            self.board_changes[4:6] = count, empty
+            for col in range(self.FIELD_H_BOUND, self.FIELD_H_BOUND + self.FIELD_WIDTH):
+                # Everything moved up, only a surface pushed off the top needs a rescan
+                if col == empty and self.heights[col] >= self.FIELD_HEIGHT:
+                    continue
+                elif self.heights[col] < count:
+                    self.heights[col] = self.column_height(col)
+                else:
+                    self.heights[col] -= count
             # Reset bonus line status
             self.bonus_lines = False
 
@@ -95,7 +240,7 @@ class ActiveBoard(display_game.Board):
             self.pieces.append(self.piece_gen.__next__())
 
         # Move next piece from queue to current
-        self.piece = self.pieces.popleft()
+        self.piece = tetramino.Piece(self.pieces.popleft())
         # self.piece_row = self.SPAWN_ROW
         # self.piece_col = self.SPAWN_COL
         self.piece_row, self.piece_col = self.move_to_top(self.SPAWN_ROW, self.SPAWN_COL)
@@ -103,13 +248,14 @@ class ActiveBoard(display_game.Board):
 
         # Check if spawning is possible or if board is full
         if not self.is_position_valid(self.piece_row, self.piece_col):
-            self.report('queue')
-            self.report('piece')
-            self.report('loss')
+            self.events.push_values(events.QUEUE, [tetramino.SPAWN_SHAPE_IDS[type_id] for type_id in self.pieces])
+            self.report_piece()
+            self.events.push(events.LOSS)
+            self.lost = True
             return
         else:
-            self.report('queue')
-            self.report('piece')
+            self.events.push_values(events.QUEUE, [tetramino.SPAWN_SHAPE_IDS[type_id] for type_id in self.pieces])
+            self.report_piece()
 
         # Update ghost
         if self.ghost:
@@ -128,16 +274,72 @@ class ActiveBoard(display_game.Board):
         Can be called to reset timer on new piece entering
         """
         if reset:
-            self.tick_time = time.process_time()
+            self.tick_time = self.clock()
         else:
-            # Compare time since last tick with time allowed per level (modified by player using speed button)
-            if time.process_time() - self.tick_time >= self.base_tick / (self.level * self.light_speed_flag):
+            # Compare time with the deadline set by time allowed per level (modified by player using speed button)
+            if self.clock() >= self.deadline():
                 if self.piece_row == self.lowest_possible():
                     self.lock_piece()
                     self.next_piece()
                 else:
                     self.move_down()
-                self.tick_time = time.process_time()
+                self.tick_time = self.clock()
+
+    def tick_length(self):
+        """
+        Return time allowed per gravity tick at the current level and speed
+        """
+        return self.base_tick / (self.level * self.light_speed_flag)
+
+    def deadline(self):
+        """
+        Return the clock time at which the next gravity tick is due
+        """
+        return self.tick_time + self.tick_length()
+
+    def lock_deadline(self):
+        """
+        Return the clock time at which gravity alone would lock the current piece
+        """
+        return self.deadline() + (self.lowest_possible() - self.piece_row) * self.tick_length()
+
+    def engine_clock(self):
+        """
+        Time source of headless games: only moves forward through step()
+        """
+        return self.engine_time
+
+    def step(self, actions=(), dt=0):
+        """
+        Apply player actions then advance the game by dt seconds
+
+        Actions are names from ACTIONS, or tuples of a name followed by its arguments,
+        e.g. ('speed_up', True) or ('unsafe_move_to', shape, row, col)
+
+        Gravity gets at most one move per tick length, so long steps are split into ticks.
+        Engine time goes to each tick deadline exactly, deadlines being compared to the end of the step
+        to the nanosecond, so float rounding never costs a tick
+
+        Return the events produced during the step as (opcode, arguments...) tuples
+        """
+        for action in actions:
+            if self.lost:
+                break
+            if isinstance(action, tuple):
+                action, *arguments = action
+            else:
+                arguments = ()
+            if action not in self.ACTIONS:
+                raise ValueError(f'Unknown action: {action}')
+            getattr(self, action)(*arguments)
+
+        end = self.engine_time + dt
+        while not self.lost and round(self.deadline(), 9) <= round(end, 9):
+            self.engine_time = self.deadline()
+            self.tick()
+        self.engine_time = max(self.engine_time, end)
+
+        return self.events.decode()
 
     def store_piece(self):
         """
@@ -148,8 +350,8 @@ class ActiveBoard(display_game.Board):
             self.hold_piece = self.piece
             self.next_piece()
             self.hold_lock = True
-            self.report('hold')
-            self.report('piece')
+            self.events.push(events.HOLD, self.hold_piece.current_shape_id)
+            self.report_piece()
         else:
             # If hold slot is taken, drop hold piece and put current piece in there
             # Only if they haven't been swapped yet
@@ -157,8 +359,8 @@ class ActiveBoard(display_game.Board):
                 self.piece, self.hold_piece = self.hold_piece, self.piece
                 self.piece_col, self.piece_row = self.SPAWN_COL, self.SPAWN_ROW
                 self.hold_lock = True
-                self.report('hold')
-                self.report('piece')
+                self.events.push(events.HOLD, self.hold_piece.current_shape_id)
+                self.report_piece()
 
     def speed_up(self, fast_drop=False):
         """
@@ -176,63 +378,137 @@ class ActiveBoard(display_game.Board):
         self.lock_piece()
         self.next_piece()
 
+    def predict_drop(self):
+        """
+        Return copies of the board rows as they would be once the current piece is dropped, lines cleared
+
+        The board itself is left untouched. Bonus lines waiting to come in are not accounted for
+        """
+        row = self.lowest_possible()
+        board = [Row(line) for line in self.board]
+        for cell_row, col, color in self.piece.current_cells:
+            board[row + cell_row][self.piece_col + col] = color
+        field = len(board) - self.BOTTOM_BUFFER
+        kept = [line for line in board[:field] if line.mask != self.FULL_ROW]
+        return [Row(self.NEW_LINE) for _ in range(field - len(kept))] + kept + board[field:]
+
     def lock_piece(self):
         """
         Add current piece to the board
         """
         self.piece_row = self.lowest_possible()
-        for row in range(self.piece.size):
-            for col in range(self.piece.size):
-                if self.piece.current_shape[row][col] != self.EMPTY:
-                    self.board[self.piece_row + row][self.piece_col + col] = self.piece.current_shape[row][col]
+        self.board_changes[:3] = self.piece.current_shape_id, self.piece_row, self.piece_col
+        for row, col, color in self.piece.current_cells:
+            line = self.board[self.piece_row + row]
+            old_mask = line.mask
+            line[self.piece_col + col] = color
+            self.hash ^= zobrist.row_key(self.piece_row + row, old_mask) ^ zobrist.row_key(self.piece_row + row, line.mask)
+            if self.piece_row + row < self.heights[self.piece_col + col]:
+                self.heights[self.piece_col + col] = self.piece_row + row
         # Update board state
         self.clear_full_lines()
 
-    def move_to_top(self, row=None, col=None, shape=None):
+    def move_to_top(self, row=None, col=None, masks=None):
         if row is None:
             row = self.piece_row
         if col is None:
             col = self.piece_col
-        if shape is None:
-            shape = self.piece.current_shape
-        while self.is_position_valid(row - 1, col, shape):
+        if masks is None:
+            masks = self.piece.current_masks
+        while self.is_position_valid(row - 1, col, masks):
             row -= 1
         return row, col
 
-    def lowest_possible(self, row=None, col=None, shape=None):
+    def lowest_possible(self, row=None, col=None, masks=None, bottoms=None):
         """
         Return lowest row current piece can fit
 
-        Check each row below piece in turn
+        Pieces entirely above the surface drop straight onto the column heights,
+        others (tucked under an overhang) check each row below piece in turn
         """
         if row is None:
             row = self.piece_row
         if col is None:
             col = self.piece_col
-        if shape is None:
-            shape = self.piece.current_shape
+        if masks is None:
+            masks = self.piece.current_masks
+            bottoms = self.piece.current_bottoms
+        if bottoms is not None and row + masks[1][0][0] >= 0:
+            lowest_row = None
+            for piece_col, bottom in bottoms:
+                landing = self.heights[col + piece_col] - 1 - bottom
+                if landing < row:
+                    # Piece is not above this column's surface
+                    lowest_row = None
+                    break
+                if lowest_row is None or landing < lowest_row:
+                    lowest_row = landing
+            if lowest_row is not None:
+                return lowest_row
         lowest_row = 0
         for test_row in range(row, len(self.board)):
             # If lower row not valid then lowest is current
-            if not self.is_position_valid(test_row, col, shape):
+            if not self.is_position_valid(test_row, col, masks):
                 return lowest_row
             lowest_row = test_row
         return lowest_row
 
-    def is_position_valid(self, test_row, test_col, shape=None):
+    def update_heights(self):
         """
-        Fast checking of potential location for a given piece
+        Rebuild the height map of every column from the board
+
+        Only needed when the board was modified outside of the game methods
         """
-        if shape == None:
-            shape = self.piece.current_shape
-        for row in range(len(shape)):
-            for col in range(len(shape)):
-                # Empty slots are marked by 0, any number means collision
-                if self.board[test_row+row][test_col+col] and shape[row][col]:
-                    return False
+        self.heights = [self.column_height(col) for col in range(len(self.NEW_LINE))]
+
+    def update_hash(self):
+        """
+        Rebuild the Zobrist hash of the board, see zobrist.board_hash
+
+        Only needed when the board was modified outside of the game methods
+        """
+        self.hash = zobrist.board_hash(line.mask for line in self.board)
+
+    def rehash_rows(self, old_masks):
+        """
+        Update the hash for the top rows of the board, old_masks being what they held before
+        """
+        for row, old_mask in enumerate(old_masks):
+            new_mask = self.board[row].mask
+            if new_mask != old_mask:
+                self.hash ^= zobrist.row_key(row, old_mask) ^ zobrist.row_key(row, new_mask)
+
+    def column_height(self, col, start=0):
+        """
+        Return the first occupied row of a column, starting the search at row start
+        """
+        bit = 1 << col
+        for row in range(start, len(self.board)):
+            if self.board[row].mask & bit:
+                return row
+        return len(self.board)
+
+    def is_position_valid(self, test_row, test_col, masks=None):
+        """
+        Fast checking of potential location for a given piece
+
+        masks are the precompiled (left, rows) row bitmasks of a shape, see tetramino.compile_piece
+        """
+        if masks is None:
+            masks = self.piece.current_masks
+        left, rows = masks
+        shift = test_col + left
+        # Left of the board edge is wall
+        if shift < 0:
+            return False
+        board = self.board
+        for row, mask in rows:
+            # Any overlapping bit means collision
+            if board[test_row + row].mask & (mask << shift):
+                return False
         return True
 
-    def check_kick(self, shape):
+    def check_kick(self, masks):
         """
         Check whether piece rotation requires lateral movement to perform
 
@@ -241,10 +517,10 @@ class ActiveBoard(display_game.Board):
         # Check from smallest amount of movement to largest
         for step in range(self.piece.size):
             # Try one direction
-            if self.is_position_valid(self.piece_row, self.piece_col + step, shape):
+            if self.is_position_valid(self.piece_row, self.piece_col + step, masks):
                 return step
             # Then the other
-            elif self.is_position_valid(self.piece_row, self.piece_col - step, shape):
+            elif self.is_position_valid(self.piece_row, self.piece_col - step, masks):
                 return -step
         return None
 
@@ -257,20 +533,19 @@ class ActiveBoard(display_game.Board):
         Pieces don't rotate, then convert to a different shape
         """
         # Check simple rotation first
-        if self.is_position_valid(self.piece_row, self.piece_col, self.piece.counter_clockwise()):
-            self.piece.current_shape = self.piece.counter_clockwise()
+        if self.is_position_valid(self.piece_row, self.piece_col, self.piece.counter_clockwise_masks()):
             self.piece.turn_counter_clockwise()
-            self.report('shape')
+            self.events.push(events.SHAPE, self.piece.current_shape_id)
             if self.ghost:
                 self.ghost = self.lowest_possible()
         else:
             # Check if it is possible with a kick
-            kick = self.check_kick(self.piece.counter_clockwise())
+            kick = self.check_kick(self.piece.counter_clockwise_masks())
             if kick:
                 self.piece.turn_counter_clockwise()
                 self.piece_col += kick
-                self.report('move')
-                self.report('shape')
+                self.events.push(events.MOVE, self.piece_row, self.piece_col)
+                self.events.push(events.SHAPE, self.piece.current_shape_id)
                 if self.ghost:
                     self.ghost = self.lowest_possible()
 
@@ -284,20 +559,19 @@ class ActiveBoard(display_game.Board):
 
         """
         # Check simple rotation first
-        if self.is_position_valid(self.piece_row, self.piece_col, self.piece.clockwise()):
-            self.piece.current_shape = self.piece.clockwise()
+        if self.is_position_valid(self.piece_row, self.piece_col, self.piece.clockwise_masks()):
             self.piece.turn_clockwise()
-            self.report('shape')
+            self.events.push(events.SHAPE, self.piece.current_shape_id)
             if self.ghost:
                 self.ghost = self.lowest_possible()
         else:
             # Check if it is possible with a kick
-            kick = self.check_kick(self.piece.counter_clockwise())
+            kick = self.check_kick(self.piece.clockwise_masks())
             if kick:
                 self.piece.turn_clockwise()
                 self.piece_col += kick
-                self.report('move')
-                self.report('shape')
+                self.events.push(events.MOVE, self.piece_row, self.piece_col)
+                self.events.push(events.SHAPE, self.piece.current_shape_id)
                 if self.ghost:
                     self.ghost = self.lowest_possible()
 
@@ -307,7 +581,7 @@ class ActiveBoard(display_game.Board):
         """
         if self.is_position_valid(self.piece_row, self.piece_col - 1):
             self.piece_col -= 1
-            self.report('move')
+            self.events.push(events.MOVE, self.piece_row, self.piece_col)
             if self.ghost:
                 self.ghost = self.lowest_possible()
 
@@ -317,7 +591,7 @@ class ActiveBoard(display_game.Board):
         """
         if self.is_position_valid(self.piece_row, self.piece_col + 1):
             self.piece_col += 1
-            self.report('move')
+            self.events.push(events.MOVE, self.piece_row, self.piece_col)
             if self.ghost:
                 self.ghost = self.lowest_possible()
 
@@ -327,7 +601,7 @@ class ActiveBoard(display_game.Board):
         """
         if self.is_position_valid(self.piece_row + 1, self.piece_col):
             self.piece_row += 1
-            self.report('move')
+            self.events.push(events.MOVE, self.piece_row, self.piece_col)
 
     def unsafe_move_to(self, shape, row, col):
         """
@@ -338,8 +612,8 @@ class ActiveBoard(display_game.Board):
         self.piece.unsafe_shape_change(shape)
         self.piece_row = max(0, row)  # Prevent vertical I tetramino display bug
         self.piece_col = col
-        self.report('move')
-        self.report('shape')
+        self.events.push(events.MOVE, self.piece_row, self.piece_col)
+        self.events.push(events.SHAPE, self.piece.current_shape_id)
 
     def level_up(self):
         """
@@ -347,25 +621,11 @@ class ActiveBoard(display_game.Board):
         """
         self.level = 1 + self.lines_cleared // self.lines_per_level
 
-    def report(self, info):
-        """
-        Report all gameplay status changes for handling
-        """
-        if info == 'loss':
-            self.reports.append(('loss', ()))
-        elif info == 'move':
-            self.reports.append(('move', self.piece_row, self.piece_col))
-        elif info == 'hold':
-            self.reports.append(('hold', self.hold_piece.current_shape))
-        elif info == 'shape':
-            self.reports.append(('shape', self.piece.current_shape))
-        elif info == 'piece':
-            self.reports.append(('piece', self.piece.current_shape, self.piece_row, self.piece_col))
-            self.reports.append(('board', self.board))
-        elif info == 'queue':
-            self.reports.append(('queue', [piece.current_shape for piece in self.pieces]))
-        elif 'clear' in info:
-            # In the case of cleared lines, the message does double duty and also carries cleared lines count
-            self.reports.append(('clear', int(info[-1:]), self.score))
-        else:
-            pass
+    def report_piece(self):
+        """
+        Report a new piece along with the board it now plays on
+        """
+        self.events.push(events.PIECE, self.piece.current_shape_id, self.piece_row, self.piece_col)
+        # Changes made to the board since the previous report go along, for remote copies to follow
+        self.events.push_values(events.BOARD, self.board_changes)
+        self.board_changes[:] = self.NO_CHANGES
@@ -0,0 +1,354 @@
+import struct
+from itertools import chain
+
+import tetramino
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, QUEUE_LENGTH
+from events import LOSS, MOVE, HOLD, SHAPE, PIECE, BOARD, QUEUE, CLEAR, WINNER
+
+# Bumped whenever the layout of a message changes, messages of other versions are refused
+VERSION = 4
+
+# Message opcodes. Game updates share theirs with the event they carry (see events.py)
+BONUS = 9
+KEYFRAME = 10
+KEYFRAME_REQUEST = 11
+ANNOUNCE = 16
+GAME_DATA = 17
+ACK = 18
+SYNC = 19
+BATCH = 20
+
+# Updates about a game sent by other hosts than its owner, left out of its sequence numbers
+UNSEQUENCED = (BONUS, KEYFRAME_REQUEST)
+
+# Largest datagram sent, so a batch fits a 1500 bytes Ethernet frame along with IP and UDP headers
+MAX_DATAGRAM = 1400
+
+# Every message starts with version and opcode
+HEADER = struct.Struct('!BB')
+# Game updates: opcode, game ID and sequence number in the game's updates,
+# preceded by the version when sent alone or by the header of their batch
+VERSION_BYTE = struct.Struct('!B')
+ENTRY = struct.Struct('!BHH')
+SEQUENCE_MODULO = 1 << 16
+
+# Arguments of game updates, KEYFRAME being followed by the slot values row after row
+ARGUMENTS = {
+    LOSS: struct.Struct('!'),
+    MOVE: struct.Struct('!bb'),         # piece row, piece col
+    HOLD: struct.Struct('!B'),          # hold shape id
+    SHAPE: struct.Struct('!B'),         # piece shape id
+    PIECE: struct.Struct('!Bbb'),       # piece shape id, piece row, piece col
+    BOARD: struct.Struct('!BbbIBB'),    # changes since the previous board (see events.BOARD)
+    QUEUE: struct.Struct('!{}B'.format(QUEUE_LENGTH)),  # shape id of every queued piece
+    CLEAR: struct.Struct('!Bi'),        # cleared lines count, score
+    WINNER: struct.Struct('!H'),        # winning game ID
+    BONUS: struct.Struct('!B'),         # bonus lines count
+    KEYFRAME: struct.Struct('!BB'),     # rows, cols
+    KEYFRAME_REQUEST: struct.Struct('!'),
+}
+
+# Arguments of game updates holding shape ids, which index tetramino.SHAPES
+SHAPE_ARGUMENTS = {
+    HOLD: slice(0, 1),
+    SHAPE: slice(0, 1),
+    PIECE: slice(0, 1),
+    BOARD: slice(0, 1),
+    QUEUE: slice(None),
+}
+
+# Size of the boards sent as KEYFRAME, bottom walls included (see player_game.ActiveBoard)
+KEYFRAME_ROWS = FIELD_HEIGHT + FIELD_V_BOUND + FIELD_WIDTH // 2
+KEYFRAME_COLS = FIELD_WIDTH + 2 * FIELD_H_BOUND
+
+# Announce: local players, max games, AI on, then status and host name as length prefixed strings
+ANNOUNCE_DATA = struct.Struct('!HH?')
+TEXT_LENGTH = struct.Struct('!H')
+
+
+class ProtocolError(ValueError):
+    """
+    Message that can't be decoded: other version, unknown opcode, wrong size or arguments out of range
+    """
+
+
+def encode_text(text):
+    encoded = text.encode()
+    return TEXT_LENGTH.pack(len(encoded)) + encoded
+
+
+def decode_text(message, offset):
+    """
+    Return a length prefixed string read at offset and the offset following it
+    """
+    length, = TEXT_LENGTH.unpack_from(message, offset)
+    offset += TEXT_LENGTH.size
+    if offset + length > len(message):
+        raise ProtocolError('Truncated text')
+    return str(message[offset:offset + length], 'utf-8'), offset + length
+
+
+def encode_announce(data):
+    """
+    Encode the availability of a host: dict of status, host, players, max and AI
+    """
+    return (HEADER.pack(VERSION, ANNOUNCE) + ANNOUNCE_DATA.pack(data['players'], data['max'], data['AI'])
+            + encode_text(data['status'] or '') + encode_text(data['host'] or ''))
+
+
+def encode_game_data(game_data):
+    """
+    Encode the game data string sent by the master host (see MainScreen.dispatcher)
+    """
+    return HEADER.pack(VERSION, GAME_DATA) + encode_text(game_data)
+
+
+def encode_signal(opcode):
+    """
+    Encode a message made of its opcode alone, ACK or SYNC
+    """
+    return HEADER.pack(VERSION, opcode)
+
+
+def encode_arguments(opcode, args=()):
+    """
+    Encode the arguments of a game update, KEYFRAME taking the board rows as its only argument
+    """
+    if opcode == KEYFRAME:
+        board, = args
+        return ARGUMENTS[KEYFRAME].pack(len(board), len(board[0])) + bytes(chain.from_iterable(board))
+    return ARGUMENTS[opcode].pack(*args)
+
+
+def encode_entry(game_ID, opcode, args=(), sequence=0):
+    """
+    Encode a game update without version, to be sent in a batch (see encode_batch)
+    """
+    return ENTRY.pack(opcode, game_ID, sequence) + encode_arguments(opcode, args)
+
+
+def encode_update(game_ID, opcode, args=(), sequence=0):
+    """
+    Encode a game update: opcode and arguments of a game event, BONUS lines for a game,
+    a KEYFRAME of its whole board or a KEYFRAME_REQUEST to its owner
+    """
+    return VERSION_BYTE.pack(VERSION) + encode_entry(game_ID, opcode, args, sequence)
+
+
+def encode_batch(entries):
+    """
+    Encode game updates given by encode_entry as one message, up to MAX_DATAGRAM bytes long overall
+    """
+    return HEADER.pack(VERSION, BATCH) + b''.join(entries)
+
+
+def decode_entry(message, offset):
+    """
+    Return opcode, game ID, sequence number and arguments of a game update read at offset,
+    and the offset following it
+    """
+    opcode, game_ID, sequence = ENTRY.unpack_from(message, offset)
+    if opcode not in ARGUMENTS:
+        raise ProtocolError('Unknown update opcode {}'.format(opcode))
+    arguments = ARGUMENTS[opcode]
+    args = arguments.unpack_from(message, offset + ENTRY.size)
+    offset += ENTRY.size + arguments.size
+    if opcode in SHAPE_ARGUMENTS:
+        for shape_id in args[SHAPE_ARGUMENTS[opcode]]:
+            if shape_id >= len(tetramino.SHAPES):
+                raise ProtocolError('Unknown shape id {}'.format(shape_id))
+    if opcode == KEYFRAME:
+        rows, cols = args
+        if (rows, cols) != (KEYFRAME_ROWS, KEYFRAME_COLS):
+            raise ProtocolError('Board of {}x{} is not {}x{}'.format(rows, cols, KEYFRAME_ROWS, KEYFRAME_COLS))
+        if offset + rows * cols > len(message):
+            raise ProtocolError('Truncated board')
+        args = ([list(message[row:row + cols]) for row in range(offset, offset + rows * cols, cols)],)
+        offset += rows * cols
+    return opcode, game_ID, sequence, args, offset
+
+
+def decode(message):
+    """
+    Decode a message from any bytes-like object, such as a memoryview over a receive buffer
+
+    Fields are unpacked straight from message, without copying it first
+
+    Return (opcode, data), data being:
+     - the dict given to encode_announce for ANNOUNCE
+     - the game data string for GAME_DATA
+     - None for ACK and SYNC
+     - (game_ID, sequence, arguments) for game updates, KEYFRAME arguments being the board as a list of rows
+     - a list of (game_ID, sequence, opcode, arguments) for BATCH
+    Raise ProtocolError for any message that can't be decoded
+    """
+    try:
+        version, opcode = HEADER.unpack_from(message)
+        if version != VERSION:
+            raise ProtocolError('Protocol version {} is not {}'.format(version, VERSION))
+
+        if opcode in ARGUMENTS:
+            opcode, game_ID, sequence, args, offset = decode_entry(message, VERSION_BYTE.size)
+            if offset != len(message):
+                raise ProtocolError('Update size does not match')
+            return opcode, (game_ID, sequence, args)
+
+        elif opcode == BATCH:
+            updates = []
+            offset = HEADER.size
+            while offset < len(message):
+                update_opcode, game_ID, sequence, args, offset = decode_entry(message, offset)
+                updates.append((game_ID, sequence, update_opcode, args))
+            return opcode, updates
+
+        elif opcode == ANNOUNCE:
+            players, max_games, AI = ANNOUNCE_DATA.unpack_from(message, HEADER.size)
+            status, offset = decode_text(message, HEADER.size + ANNOUNCE_DATA.size)
+            host, offset = decode_text(message, offset)
+            return opcode, {'status': status, 'host': host, 'players': players, 'max': max_games, 'AI': AI}
+
+        elif opcode == GAME_DATA:
+            game_data, offset = decode_text(message, HEADER.size)
+            return opcode, game_data
+
+        elif opcode in (ACK, SYNC):
+            return opcode, None
+
+    except (struct.error, UnicodeDecodeError) as error:
+        raise ProtocolError(error)
+    raise ProtocolError('Unknown opcode {}'.format(opcode))
+
+
+class Outbox:
+    """
+    Game updates of a frame, encoded as they come and sent as batches once the frame is over
+
+    Only the last position and shape of a piece matter: a MOVE or SHAPE still queued for a game is
+    dropped by the next one of its kind, both by a PIECE
+
+    Updates are numbered per game as they are sent, so dropped ones leave no gap in the sequence
+    """
+
+    def __init__(self):
+        self.entries = []
+        # Index of the queued MOVE and SHAPE entries by (game_ID, opcode), dropped entries being left as None
+        self.replaceable = {}
+        # Sequence number of the next update sent for each game
+        self.sequences = {}
+
+    def queue(self, game_ID, opcode, args=()):
+        if opcode == PIECE:
+            replaced = (MOVE, SHAPE)
+        elif opcode in (MOVE, SHAPE):
+            replaced = (opcode,)
+        else:
+            replaced = ()
+        for other in replaced:
+            index = self.replaceable.pop((game_ID, other), None)
+            if index is not None:
+                self.entries[index] = None
+        if opcode in (MOVE, SHAPE):
+            self.replaceable[game_ID, opcode] = len(self.entries)
+        self.entries.append((game_ID, opcode, encode_arguments(opcode, args)))
+
+    def flush(self):
+        """
+        Return the queued updates as few BATCH messages as fit in MAX_DATAGRAM bytes each, emptying the outbox
+        """
+        datagrams = []
+        batch = []
+        size = HEADER.size
+        for entry in self.entries:
+            if entry is None:
+                continue
+            game_ID, opcode, arguments = entry
+            if opcode in UNSEQUENCED:
+                sequence = 0
+            else:
+                sequence = self.sequences.get(game_ID, 0)
+                self.sequences[game_ID] = (sequence + 1) % SEQUENCE_MODULO
+            encoded = ENTRY.pack(opcode, game_ID, sequence) + arguments
+            if batch and size + len(encoded) > MAX_DATAGRAM:
+                datagrams.append(encode_batch(batch))
+                batch = []
+                size = HEADER.size
+            batch.append(encoded)
+            size += len(encoded)
+        if batch:
+            datagrams.append(encode_batch(batch))
+        self.entries.clear()
+        self.replaceable.clear()
+        return datagrams
+
+
+class ReorderBuffer:
+    """
+    Put the updates of remote games back in the order they were sent, as numbered by their owner's Outbox
+
+    Updates coming early are held until the ones before them come in. Once a gap stayed open for WINDOW
+    seconds its updates are given up as lost and the held ones go through: the game is reported lost,
+    for its board to be requested whole again (see KEYFRAME_REQUEST). Late and duplicate updates are dropped
+
+    The first update of a game sets where its sequence starts
+    """
+    WINDOW = 0.1
+
+    def __init__(self):
+        # Sequence number expected next for each game, updates held for each game by sequence number
+        # and time the gap before them opened
+        self.expected = {}
+        self.held = {}
+        self.gaps = {}
+
+    def receive(self, game_ID, sequence, opcode, args, now):
+        """
+        Take a received update
+
+        Return the updates now in order as (game_ID, opcode, arguments)
+        """
+        if opcode in UNSEQUENCED:
+            return [(game_ID, opcode, args)]
+        expected = self.expected.setdefault(game_ID, sequence)
+        ahead = (sequence - expected) % SEQUENCE_MODULO
+        if ahead >= SEQUENCE_MODULO // 2:
+            return []
+        self.held.setdefault(game_ID, {})[sequence] = (opcode, args)
+        if ahead:
+            self.gaps.setdefault(game_ID, now)
+            return []
+        return self.release(game_ID, now)
+
+    def expire(self, now):
+        """
+        Give up on the gaps open for too long
+
+        Return the updates held behind them, as receive, and the IDs of the games that lost updates
+        """
+        ready = []
+        lost = []
+        for game_ID, opened in list(self.gaps.items()):
+            if now - opened >= self.WINDOW:
+                expected = self.expected[game_ID]
+                self.expected[game_ID] = min(self.held[game_ID],
+                                             key=lambda sequence: (sequence - expected) % SEQUENCE_MODULO)
+                ready.extend(self.release(game_ID, now))
+                lost.append(game_ID)
+        return ready, lost
+
+    def release(self, game_ID, now):
+        """
+        Return the held updates of a game following on from the expected one, noting where the next gap opens
+        """
+        held = self.held[game_ID]
+        sequence = self.expected[game_ID]
+        ready = []
+        while sequence in held:
+            opcode, args = held.pop(sequence)
+            ready.append((game_ID, opcode, args))
+            sequence = (sequence + 1) % SEQUENCE_MODULO
+        self.expected[game_ID] = sequence
+        if held:
+            self.gaps[game_ID] = now
+        else:
+            self.gaps.pop(game_ID, None)
+        return ready
@@ -0,0 +1,98 @@
+from collections import deque
+from functools import lru_cache
+
+from tetramino import pieces_data
+
+# Moves a piece can make, named after the ActiveBoard methods performing them
+MOVES = ('move_left', 'move_right', 'move_down', 'turn_clockwise', 'turn_counter_clockwise')
+
+
+def is_position_valid(masks, test_row, test_col, shape_masks):
+    """
+    Same check as ActiveBoard.is_position_valid, on a tuple of row bitmasks
+    """
+    left, rows = shape_masks
+    shift = test_col + left
+    if shift < 0:
+        return False
+    for row, mask in rows:
+        if masks[test_row + row] & (mask << shift):
+            return False
+    return True
+
+
+def turn(masks, row, col, shape_index, new_shape_index, piece_data):
+    """
+    Return the column a piece ends up in when turned to new_shape_index, None if it can't turn
+
+    Follows ActiveBoard.turn_clockwise: simple rotation first, then kicks from smallest to largest
+    """
+    new_masks = piece_data['masks'][new_shape_index]
+    if is_position_valid(masks, row, col, new_masks):
+        return col
+    for step in range(len(piece_data['positions'][shape_index])):
+        if is_position_valid(masks, row, col + step, new_masks):
+            return col + step
+        elif is_position_valid(masks, row, col - step, new_masks):
+            return col - step
+    return None
+
+
+@lru_cache(maxsize=1024)
+def landing_positions(masks, type_id, row, col, shape_index=0):
+    """
+    Find every position a piece can come to rest in, along with the moves leading there
+
+    masks is the tuple of board row bitmasks and (row, col, shape_index) where the piece starts
+
+    Breadth first search over (row, col, shape_index) states using the moves and kicks of ActiveBoard,
+    so tucks under overhangs and spins are found along with straight drops.
+    Results are memoized per board, piece type and start
+
+    Returns a tuple of ((row, col, shape_index), moves) for every state the piece can't move down from
+    """
+    piece_data = pieces_data[type_id]
+    size = len(piece_data['positions'][0])
+    start = (row, col, shape_index)
+    if not is_position_valid(masks, row, col, piece_data['masks'][shape_index]):
+        return ()
+
+    # Every state reached, pointing to the state and move it was first reached from
+    came_from = {start: None}
+    todo = deque([start])
+    landings = []
+    while todo:
+        state = todo.popleft()
+        row, col, shape_index = state
+        shape_masks = piece_data['masks'][shape_index]
+
+        neighbours = []
+        if is_position_valid(masks, row, col - 1, shape_masks):
+            neighbours.append(((row, col - 1, shape_index), 'move_left'))
+        if is_position_valid(masks, row, col + 1, shape_masks):
+            neighbours.append(((row, col + 1, shape_index), 'move_right'))
+        if is_position_valid(masks, row + 1, col, shape_masks):
+            neighbours.append(((row + 1, col, shape_index), 'move_down'))
+        else:
+            landings.append(state)
+        for new_shape_index, move in (((shape_index + 1) % size, 'turn_clockwise'),
+                                      ((size + shape_index - 1) % size, 'turn_counter_clockwise')):
+            new_col = turn(masks, row, col, shape_index, new_shape_index, piece_data)
+            if new_col is not None:
+                neighbours.append(((row, new_col, new_shape_index), move))
+
+        for neighbour, move in neighbours:
+            if neighbour not in came_from:
+                came_from[neighbour] = (state, move)
+                todo.append(neighbour)
+
+    # Walk back from each landing to the start
+    results = []
+    for landing in landings:
+        moves = []
+        state = landing
+        while came_from[state] is not None:
+            state, move = came_from[state]
+            moves.append(move)
+        results.append((landing, tuple(reversed(moves))))
+    return tuple(results)
@@ -0,0 +1,139 @@
+import heapq
+
+
+class TickScheduler:
+    """
+    Keep track of when each game is next due for a gravity tick
+
+    Deadlines are held in a heap so a frame only touches the games that are due.
+    Rescheduling leaves the old heap entry behind, it is skipped when popped
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+
+    def schedule(self, game_ID, deadline):
+        """
+        Set the next deadline of a game, replacing any previous one
+        """
+        if self.deadlines.get(game_ID) == deadline:
+            return
+        self.deadlines[game_ID] = deadline
+        heapq.heappush(self.heap, (deadline, game_ID))
+
+        # Drop stale entries once they outnumber live ones
+        if len(self.heap) > 2 * len(self.deadlines) + 16:
+            self.heap = [(deadline, ID) for ID, deadline in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    def cancel(self, game_ID):
+        """
+        Stop tracking a game
+        """
+        self.deadlines.pop(game_ID, None)
+
+    def due(self, now):
+        """
+        Remove and return the IDs of games whose deadline is not after now, earliest first
+        """
+        due_games = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, game_ID = heapq.heappop(self.heap)
+            if self.deadlines.get(game_ID) == deadline:
+                del self.deadlines[game_ID]
+                due_games.append(game_ID)
+        return due_games
+
+    def next_deadline(self):
+        """
+        Return the earliest live deadline, None if no game is scheduled
+        """
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+
+class DecisionScheduler:
+    """
+    Order AI decisions by the time their piece would lock under gravity
+
+    Requests wait here until submitted, most urgent first. Each submitted decision is expected to take
+    a search time per round of jobs ahead of it on the workers: when that would run past its deadline,
+    it is flagged for the cheap search instead
+
+    Decision latency runs from request to result, a result coming after its deadline being a miss
+    """
+
+    def __init__(self, workers, smoothing=0.2):
+        self.workers = workers
+        self.smoothing = smoothing
+        self.requests = {}   # game_ID: (deadline, request time)
+        self.in_flight = {}  # game_ID: (deadline, request time, submit time, rounds of jobs ahead)
+        self.search_time = 0
+        # game_ID: [decisions, total latency, worst latency, deadline misses]
+        self.stats = {}
+
+    def request(self, game_ID, deadline, now):
+        """
+        Ask for a decision, needed before deadline
+        """
+        self.requests[game_ID] = (deadline, now)
+
+    def cancel(self, game_ID):
+        """
+        Forget any decision asked for a game, its stats are kept
+        """
+        self.requests.pop(game_ID, None)
+        self.in_flight.pop(game_ID, None)
+
+    def requeue(self):
+        """
+        Put every submitted decision back with the waiting requests, after their jobs were cancelled
+        """
+        for game_ID, (deadline, requested, submitted, rounds) in self.in_flight.items():
+            self.requests[game_ID] = (deadline, requested)
+        self.in_flight.clear()
+
+    def submit(self, now):
+        """
+        Hand over every waiting request, earliest deadline first
+
+        Return a list of (game_ID, cheap), cheap being True when the full search would miss the deadline
+        """
+        order = sorted(self.requests, key=lambda game_ID: self.requests[game_ID])
+        submitted = []
+        for rank, game_ID in enumerate(order, len(self.in_flight)):
+            deadline, requested = self.requests.pop(game_ID)
+            rounds = rank // self.workers + 1
+            self.in_flight[game_ID] = (deadline, requested, now, rounds)
+            submitted.append((game_ID, now + rounds * self.search_time > deadline))
+        return submitted
+
+    def complete(self, game_ID, now):
+        """
+        Record the result of a decision
+
+        Return True if it came in time, False if it missed its deadline, None if it was not asked for
+        """
+        if game_ID not in self.in_flight:
+            return None
+        deadline, requested, submitted, rounds = self.in_flight.pop(game_ID)
+        self.search_time += self.smoothing * ((now - submitted) / rounds - self.search_time)
+
+        latency = now - requested
+        stats = self.stats.setdefault(game_ID, [0, 0, 0, 0])
+        stats[0] += 1
+        stats[1] += latency
+        stats[2] = max(stats[2], latency)
+        if now > deadline:
+            stats[3] += 1
+            return False
+        return True
+
+    def report(self):
+        """
+        Return {game_ID: (decisions, mean latency, worst latency, deadline misses)}
+        """
+        return {game_ID: (decisions, total / decisions, worst, misses)
+                for game_ID, (decisions, total, worst, misses) in self.stats.items()}
@@ -0,0 +1,150 @@
+import random
+
+import ai
+import batch_engine
+import events
+import player_game
+import vector_ai
+
+
+class HeadlessMatch:
+    """
+    Headless AI versus AI match, reproducible from its seed
+
+    Subclasses hold the games: drop_pieces places and drops one piece in every game still in play,
+    passing cleared lines to send_lines and taking lost games out of alive, and set_bonus_lines
+    queues incoming lines for a game
+    """
+
+    def __init__(self, players, seed, step_length):
+        """
+        step_length is the game time elapsed between two AI pieces
+        """
+        self.random = random.Random(seed)
+        self.players = players
+        self.step_length = step_length
+        self.alive = list(range(players))
+        self.steps = 0
+        self.winner = None
+
+    def step(self):
+        """
+        Let every game still in play place and drop one piece
+
+        Return what drop_pieces returns
+        """
+        results = self.drop_pieces()
+        self.steps += 1
+        if self.players > 1 and len(self.alive) == 1:
+            self.winner = self.alive[0]
+        return results
+
+    def send_lines(self, game_ID, cleared):
+        """
+        Route the lines a game cleared to a victim the same way GameScreen does
+        """
+        bad_lines = cleared // 2
+        victims = [victim for victim in self.alive if victim != game_ID]
+        if bad_lines > 0 and victims:
+            self.set_bonus_lines(self.random.choice(victims), bad_lines)
+
+    def play(self, max_steps=1000):
+        """
+        Step the match until a single game is left or max_steps is reached
+
+        Return the winner, None if there was none
+        """
+        while self.steps < max_steps and len(self.alive) > 1:
+            self.step()
+        return self.winner
+
+
+class Match(HeadlessMatch):
+    """
+    Headless AI versus AI match
+
+    Every game is a seeded player_game.ActiveBoard stepped explicitly, so a match is fully
+    reproducible from its seed and runs without pygame, clocks or worker processes
+    """
+
+    def __init__(self, players=2, seed=None, step_length=0.5):
+        """
+        Prepare one seeded game per player
+
+        step_length is the game time elapsed between two AI pieces
+        """
+        super().__init__(players, seed, step_length)
+        self.games = [player_game.ActiveBoard(False, seed=self.random.getrandbits(32)) for _ in range(players)]
+
+    def drop_pieces(self):
+        """
+        Place and drop one piece in every game still in play, one game after the other
+
+        Return a dictionary of the events produced by each game
+        """
+        all_events = {}
+        for game_ID in list(self.alive):
+            game = self.games[game_ID]
+            new_shape, new_col = ai.quick_fill(game.board, game.piece.piece_data)
+            game_events = game.step((('unsafe_move_to', new_shape, game.piece_row, new_col), 'drop'), self.step_length)
+            all_events[game_ID] = game_events
+
+            for event in game_events:
+                if event[0] == events.CLEAR:
+                    self.send_lines(game_ID, event[1])
+                elif event[0] == events.LOSS:
+                    self.alive.remove(game_ID)
+                    break
+        return all_events
+
+    def set_bonus_lines(self, game_ID, lines):
+        self.games[game_ID].bonus_lines = lines
+
+
+class BatchMatch(HeadlessMatch):
+    """
+    Headless AI versus AI match played on a batch_engine.BatchEngine, for many players at once
+
+    Same interface and line routing as Match, every game being decided by one call to the vectorized
+    evaluator per step (see vector_ai.py). Reproducible from its seed, but BatchEngine rules are not
+    ActiveBoard's to the piece, so a seed does not replay the match of Match
+    """
+
+    def __init__(self, players=2, seed=None, step_length=0.5):
+        """
+        Prepare one batch game per player, numpy being required
+
+        step_length is the game time elapsed between two AI pieces
+        """
+        super().__init__(players, seed, step_length)
+        self.engine = batch_engine.BatchEngine(players, seed=self.random.getrandbits(32))
+
+    def drop_pieces(self):
+        """
+        Place and drop one piece in every game still in play, all at once
+
+        Return the per game arrays of batch_engine.BatchEngine.step for the drop
+        """
+        engine = self.engine
+        playing = vector_ai.numpy.array(self.alive, dtype=vector_ai.numpy.intp)
+        shapes, cols, rows = vector_ai.best_drops(engine.boards[playing], engine.piece[playing].tolist())
+        actions = vector_ai.numpy.full(engine.games, batch_engine.NOTHING, dtype=vector_ai.numpy.int8)
+        rotations = engine.rotation.copy()
+        new_cols = engine.piece_col.copy()
+        # Games where no drop fits drop where they are
+        placed = shapes >= 0
+        actions[playing[placed]] = batch_engine.PLACE
+        rotations[playing[placed]] = shapes[placed]
+        new_cols[playing[placed]] = cols[placed]
+        engine.step(actions, 0, rotations, new_cols)
+        results = engine.step(vector_ai.numpy.where(engine.lost, batch_engine.NOTHING, batch_engine.DROP),
+                              self.step_length)
+
+        for game_ID in list(self.alive):
+            self.send_lines(game_ID, int(results['cleared'][game_ID]))
+            if results['lost'][game_ID]:
+                self.alive.remove(game_ID)
+        return results
+
+    def set_bonus_lines(self, game_ID, lines):
+        self.engine.bonus_lines[game_ID] = lines
@@ -0,0 +1,259 @@
+import queue
+import unittest
+import ai
+import board_arena
+import job_board
+import player_game
+import reachability
+import tetramino
+
+
+class TestQuickFill(unittest.TestCase):
+    '''
+    The AI should drop pieces on the lowest reachable rows without covering holes
+    '''
+
+    def setUp(self):
+        self.test_board = player_game.ActiveBoard(False, seed=1)
+        self.bottom = self.test_board.FIELD_HEIGHT + self.test_board.FIELD_V_BOUND - 1
+
+    def test_column_heights(self):
+        '''
+        ==> Heights match the first occupied row of every column
+        '''
+        self.test_board.board[self.bottom][5] = 2
+        self.test_board.board[self.bottom - 3][7] = 2
+        self.test_board.update_heights()
+        self.assertEqual(ai.column_heights(self.test_board.board), self.test_board.heights)
+
+    def test_fills_gap(self):
+        '''
+        ==> A vertical I piece goes down the only gap of a nearly full bottom
+        '''
+        gap = self.test_board.FIELD_H_BOUND + 4
+        for row in range(self.bottom - 3, self.bottom + 1):
+            for col in range(self.test_board.FIELD_H_BOUND, self.test_board.FIELD_H_BOUND + self.test_board.FIELD_WIDTH):
+                if col != gap:
+                    self.test_board.board[row][col] = 2
+        piece_data = tetramino.pieces_data[0]
+        new_shape, new_col = ai.quick_fill(self.test_board.board, piece_data)
+        self.test_board.piece = tetramino.Piece(0)
+        self.test_board.unsafe_move_to(new_shape, 0, new_col)
+        self.test_board.drop()
+        self.assertEqual(self.test_board.lines_cleared, 4)
+
+    def test_selectable_evaluator(self):
+        '''
+        ==> Without a bonus for what lies under the piece, the lowest landing row wins
+        '''
+        piece_data = tetramino.pieces_data[0]
+        new_shape, new_col = ai.quick_fill(self.test_board.board, piece_data, lambda *position: 0, 0)
+        self.assertEqual(new_shape, 0)
+
+
+    def test_quick_move(self):
+        '''
+        ==> Playing the cheap moves puts the piece above the column quick_fill picked
+        '''
+        for seed in range(5):
+            test_board = player_game.ActiveBoard(False, seed=seed)
+            for _ in range(8):
+                piece_data = tetramino.pieces_data[test_board.piece.type_id]
+                new_shape, new_col = ai.quick_fill(test_board.board, piece_data)
+                test_board.step(ai.quick_move(test_board.board, test_board.piece.type_id,
+                                              test_board.piece_row, test_board.piece_col))
+                self.assertEqual((test_board.piece.shape_index, test_board.piece_col), (new_shape, new_col))
+                test_board.step(('drop',))
+
+class TestBestMove(unittest.TestCase):
+    '''
+    Positions found by the reachability search should be reached by playing its moves
+    '''
+
+    def test_moves_reach_position(self):
+        '''
+        ==> Playing the moves through the game lands the piece where the search said
+        '''
+        for seed in range(5):
+            test_board = player_game.ActiveBoard(False, seed=seed)
+            for _ in range(8):
+                new_shape, new_row, new_col, moves = ai.best_move(test_board.board, test_board.piece.type_id,
+                                                                  test_board.piece_row, test_board.piece_col)
+                test_board.step(moves)
+                self.assertEqual((test_board.piece.shape_index, test_board.piece_row, test_board.piece_col),
+                                 (new_shape, new_row, new_col))
+                test_board.step(('drop',))
+
+    def test_tuck(self):
+        '''
+        ==> A piece slides under an overhang a straight drop can't reach
+        '''
+        test_board = player_game.ActiveBoard(False, seed=1)
+        bottom = test_board.FIELD_HEIGHT + test_board.FIELD_V_BOUND - 1
+        left = test_board.FIELD_H_BOUND
+        # A 4 wide gap on the left of the bottom row, under a roof two rows up
+        for col in range(left + 4, left + test_board.FIELD_WIDTH):
+            test_board.board[bottom][col] = 2
+        for col in range(left, left + 4):
+            test_board.board[bottom - 2][col] = 2
+        masks = tuple(line.mask for line in test_board.board)
+        test_board.piece = tetramino.Piece(0)
+        test_board.piece_row, test_board.piece_col = test_board.move_to_top(0, test_board.SPAWN_COL)
+        landings = reachability.landing_positions(masks, 0, test_board.piece_row, test_board.piece_col)
+        self.assertIn((bottom - 1, left, 0), [landing for landing, moves in landings])
+
+    def test_memoized(self):
+        '''
+        ==> The same board and piece are only searched once
+        '''
+        test_board = player_game.ActiveBoard(False, seed=2)
+        reachability.landing_positions.cache_clear()
+        for _ in range(2):
+            ai.best_move(test_board.board, test_board.piece.type_id, test_board.piece_row, test_board.piece_col)
+        self.assertEqual(reachability.landing_positions.cache_info().hits, 1)
+
+
+class TestLookahead(unittest.TestCase):
+    '''
+    The beam search should return moves the game can play, using the hold piece when it pays
+    '''
+
+    def test_moves_replay(self):
+        '''
+        ==> Every decision plays through the game, hold swaps included
+        '''
+        for seed in range(3):
+            test_board = player_game.ActiveBoard(False, seed=seed)
+            for _ in range(8):
+                hold_type = test_board.hold_piece.type_id if test_board.hold_piece is not None else -1
+                hold_shape = test_board.hold_piece.shape_index if test_board.hold_piece is not None else 0
+                masks = tuple(line.mask for line in test_board.board)
+                moves = ai.lookahead_move(masks, test_board.piece.type_id, list(test_board.pieces), hold_type,
+                                          test_board.piece_row, test_board.piece_col, budget=1, hold_shape=hold_shape)
+                self.assertIsNotNone(moves)
+                for move in moves:
+                    row, col, shape_index = test_board.piece_row, test_board.piece_col, test_board.piece.shape_index
+                    getattr(test_board, move)()
+                    if move != 'store_piece':
+                        self.assertNotEqual((test_board.piece_row, test_board.piece_col,
+                                             test_board.piece.shape_index), (row, col, shape_index))
+                test_board.step(('drop',))
+            self.assertFalse(test_board.lost)
+
+    def test_uses_hold(self):
+        '''
+        ==> A held I piece is swapped in to fill a four deep well
+        '''
+        test_board = player_game.ActiveBoard(False, seed=1)
+        bottom = test_board.FIELD_HEIGHT + test_board.FIELD_V_BOUND - 1
+        left = test_board.FIELD_H_BOUND
+        for row in range(bottom - 3, bottom + 1):
+            for col in range(left + 1, left + test_board.FIELD_WIDTH):
+                test_board.board[row][col] = 2
+        masks = tuple(line.mask for line in test_board.board)
+        # An O piece up, the I piece held
+        moves = ai.lookahead_move(masks, 3, [3, 3, 3], 0, 0, test_board.SPAWN_COL, depth=1, budget=1)
+        self.assertEqual(moves[0], 'store_piece')
+
+    def test_held_rotation(self):
+        '''
+        ==> A held piece comes back in the rotation it was held in
+        '''
+        test_board = player_game.ActiveBoard(False, seed=1)
+        bottom = test_board.FIELD_HEIGHT + test_board.FIELD_V_BOUND - 1
+        left = test_board.FIELD_H_BOUND
+        for row in range(bottom - 3, bottom + 1):
+            for col in range(left + 1, left + test_board.FIELD_WIDTH):
+                test_board.board[row][col] = 2
+        # An I piece held upright
+        test_board.hold_piece = tetramino.Piece(0)
+        test_board.hold_piece.unsafe_shape_change(1)
+        masks = tuple(line.mask for line in test_board.board)
+        moves = ai.lookahead_move(masks, test_board.piece.type_id, [], 0, test_board.piece_row,
+                                  test_board.piece_col, depth=1, budget=1, hold_shape=1)
+        self.assertEqual(moves[0], 'store_piece')
+        test_board.step(moves)
+        test_board.step(('drop',))
+        self.assertEqual(test_board.lines_cleared, 4)
+
+    def test_no_budget(self):
+        '''
+        ==> Even out of time, a decision is returned
+        '''
+        test_board = player_game.ActiveBoard(False, seed=3)
+        masks = tuple(line.mask for line in test_board.board)
+        moves = ai.lookahead_move(masks, test_board.piece.type_id, list(test_board.pieces), -1,
+                                  test_board.piece_row, test_board.piece_col, budget=0)
+        self.assertIsNotNone(moves)
+
+
+class TestEvaluationCache(unittest.TestCase):
+    '''
+    The cache should keep the most recently used decisions and count its hits
+    '''
+
+    def test_least_recently_used(self):
+        '''
+        ==> The least recently used decision is the one forgotten
+        '''
+        cache = ai.EvaluationCache(maxsize=2)
+        cache.put('a', ('drop',))
+        cache.put('b', ())
+        cache.get('a')
+        cache.put('c', ())
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), ('drop',))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_worker_counts(self):
+        '''
+        ==> Workers send the hits and misses of a round of jobs with its results
+        '''
+        arena = board_arena.BoardArena(2)
+        try:
+            jobs = job_board.JobBoard(1, 2)
+            epoch = jobs.new_epoch()
+            test_board = player_game.ActiveBoard(False, seed=2)
+            # Two games on the same board, the second one reuses the decision of the first
+            submitted = []
+            for game_ID in range(2):
+                generation = arena.write(game_ID, test_board.board)
+                submitted.append((game_ID, epoch, generation, test_board.hash, test_board.piece.type_id, -1, 0,
+                                  test_board.piece_row, test_board.piece_col, False, *test_board.pieces))
+            jobs.submit(submitted)
+            ready_queue, todo_queue = queue.SimpleQueue(), queue.SimpleQueue()
+            todo_queue.put(True)
+            todo_queue.put(-1)
+            ai.evaluation_cache.entries.clear()
+            ai.AI_worker(ready_queue, todo_queue, arena.name, jobs, 0)
+            results, hits, misses = ready_queue.get()
+            self.assertEqual([result[0] for result in results], [0, 1])
+            self.assertEqual(results[0][3], results[1][3])
+            self.assertEqual((hits, misses), (1, 1))
+        finally:
+            arena.close(unlink=True)
+
+    def test_lookahead_effort(self):
+        '''
+        ==> Lookahead decisions are only served to requests of the same width and depth, never when cut short
+        '''
+        arena = board_arena.BoardArena(1)
+        try:
+            test_board = player_game.ActiveBoard(False, seed=2)
+            generation = arena.write(0, test_board.board)
+            job = (0, 0, generation, test_board.hash, test_board.piece.type_id, -1, 0, test_board.piece_row,
+                   test_board.piece_col, False, *test_board.pieces)
+            ai.evaluation_cache.entries.clear()
+            hits, misses = ai.evaluation_cache.hits, ai.evaluation_cache.misses
+            ai.solve_job(arena, job, (1, 1, 0))
+            ai.solve_job(arena, job, (1, 1, 10))
+            ai.solve_job(arena, job, (6, 3, 10))
+            ai.solve_job(arena, job, (6, 3, 5))
+            ai.solve_job(arena, job, (1, 1, 10))
+            self.assertEqual((ai.evaluation_cache.hits - hits, ai.evaluation_cache.misses - misses), (2, 3))
+        finally:
+            arena.close(unlink=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
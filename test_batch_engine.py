@@ -0,0 +1,119 @@
+import unittest
+import random
+
+import ai
+import batch_engine
+import player_game
+
+
+@unittest.skipIf(batch_engine.numpy is None, 'numpy not installed')
+class TestBatchEngine(unittest.TestCase):
+    '''
+    Batch games should follow the rules of player_game.ActiveBoard
+    '''
+
+    def random_boards(self, count):
+        '''
+        Return count ActiveBoards with a random number of pieces placed by the AI
+        '''
+        boards = []
+        for seed in range(count):
+            test_board = player_game.ActiveBoard(False, seed=seed)
+            for _ in range(random.Random(seed).randint(0, 40)):
+                new_shape, new_col = ai.quick_fill(test_board.board, test_board.piece.piece_data)
+                test_board.step((('unsafe_move_to', new_shape, test_board.piece_row, new_col), 'drop'))
+            boards.append(test_board)
+        return boards
+
+    def load(self, engine, boards):
+        '''
+        Copy the boards and current pieces of ActiveBoards into engine
+        '''
+        for game, test_board in enumerate(boards):
+            engine.boards[game] = [list(row) for row in test_board.board]
+            engine.piece[game] = test_board.piece.type_id
+            engine.rotation[game] = test_board.piece.shape_index
+            engine.piece_row[game] = test_board.piece_row
+            engine.piece_col[game] = test_board.piece_col
+            engine.score[game] = test_board.score
+            engine.level[game] = test_board.level
+            engine.lines_cleared[game] = test_board.lines_cleared
+
+    def test_drop_matches_active_board(self):
+        '''
+        ==> Pieces land where ActiveBoard drops them and full lines clear the same way
+        '''
+        boards = self.random_boards(30)
+        engine = batch_engine.BatchEngine(len(boards), seed=1)
+        self.load(engine, boards)
+        games = batch_engine.numpy.arange(len(boards))
+        self.assertEqual(list(engine.lowest_possible(games)), [test_board.lowest_possible() for test_board in boards])
+
+        # Place every piece where the AI would and drop it
+        placements = [ai.quick_fill(test_board.board, test_board.piece.piece_data) for test_board in boards]
+        rotations, cols = batch_engine.numpy.array(placements).T
+        engine.step(batch_engine.numpy.full(len(boards), batch_engine.PLACE), 0, rotations, cols)
+        engine.step(batch_engine.numpy.full(len(boards), batch_engine.DROP))
+        cleared = 0
+        for game, test_board in enumerate(boards):
+            if not test_board.lost:
+                score = test_board.score
+                test_board.unsafe_move_to(rotations[game], test_board.piece_row, cols[game])
+                test_board.lock_piece()
+                cleared += test_board.score != score
+                self.assertEqual(engine.boards[game].tolist(), [list(row) for row in test_board.board])
+                self.assertEqual(engine.score[game], test_board.score)
+        self.assertGreater(cleared, 0)
+
+    def test_hold_keeps_rotation(self):
+        '''
+        ==> Held pieces come back in the rotation they were held in, as on an ActiveBoard
+        '''
+        boards = self.random_boards(8)
+        engine = batch_engine.BatchEngine(len(boards), seed=5)
+        self.load(engine, boards)
+        for game, test_board in enumerate(boards):
+            engine.queue[game] = list(test_board.pieces)
+        for action, code in (('turn_clockwise', batch_engine.TURN_CLOCKWISE), ('store_piece', batch_engine.HOLD),
+                             ('drop', batch_engine.DROP), ('store_piece', batch_engine.HOLD)):
+            for test_board in boards:
+                test_board.step((action,))
+            engine.step(batch_engine.numpy.full(len(boards), code))
+        for game, test_board in enumerate(boards):
+            self.assertEqual((engine.piece[game], engine.rotation[game]),
+                             (test_board.piece.type_id, test_board.piece.shape_index))
+            self.assertEqual((engine.hold[game], engine.hold_rotation[game]),
+                             (test_board.hold_piece.type_id, test_board.hold_piece.shape_index))
+            self.assertEqual(engine.boards[game].tolist(), [list(row) for row in test_board.board])
+
+    def test_bonus_lines(self):
+        '''
+        ==> Bonus lines push the field up with a single hole per line
+        '''
+        engine = batch_engine.BatchEngine(3, seed=2)
+        engine.bonus_lines[:] = [0, 1, 4]
+        engine.spawn(batch_engine.numpy.arange(3))
+        bottom = engine.FIELD_ROWS - 1
+        field = engine.boards[:, :engine.FIELD_ROWS, engine.field_cols]
+        self.assertEqual(int((field[0] != 0).sum()), 0)
+        self.assertEqual(list((field[1] == 0).sum(axis=1))[bottom - 1:], [10, 1])
+        self.assertEqual(list((field[2] == 0).sum(axis=1))[bottom - 4:], [10, 1, 1, 1, 1])
+
+    def test_same_seed_same_games(self):
+        '''
+        ==> Stepping two engines with the same seed and actions gives the same boards
+        '''
+        engines = [batch_engine.BatchEngine(16, seed=3) for _ in range(2)]
+        rng = batch_engine.numpy.random.default_rng(4)
+        actions = rng.integers(0, batch_engine.SLOW_DOWN + 1, size=(200, 16))
+        rotations = rng.integers(0, 4, size=(200, 16))
+        cols = rng.integers(2, 12, size=(200, 16))
+        for engine in engines:
+            for step in range(len(actions)):
+                engine.step(actions[step], 0.1, rotations[step], cols[step])
+        self.assertTrue((engines[0].boards == engines[1].boards).all())
+        self.assertTrue((engines[0].score == engines[1].score).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import ai
+import board_arena
+import player_game
+
+
+class TestBoardArena(unittest.TestCase):
+    '''
+    Boards written into the arena should read back the same from another attachment
+    '''
+
+    def setUp(self):
+        self.arena = board_arena.BoardArena(4)
+        self.reader = board_arena.BoardArena(name=self.arena.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.arena.close(unlink=True)
+
+    def test_round_trip(self):
+        '''
+        ==> Masks and slot values read back as written, and the AI finds the same move on them
+        '''
+        test_board = player_game.ActiveBoard(False, seed=3)
+        for _ in range(6):
+            test_board.step(('move_right', 'drop'))
+        generation = self.arena.write(2, test_board.board)
+        self.assertEqual(self.reader.generation(2), generation)
+        masks, rows = self.reader.read(2)
+        self.assertEqual(masks, tuple(line.mask for line in test_board.board))
+        self.assertEqual(self.reader.read_masks(2), masks)
+        self.assertEqual([list(row) for row in rows], [list(line) for line in test_board.board])
+        start = (test_board.piece.type_id, test_board.piece_row, test_board.piece_col)
+        self.assertEqual(ai.best_move(rows, *start, masks=masks), ai.best_move(test_board.board, *start))
+        del rows
+
+    def test_generation(self):
+        '''
+        ==> Every write moves the slot generation forward, other slots are left alone
+        '''
+        test_board = player_game.ActiveBoard(False)
+        first = self.arena.write(1, test_board.board)
+        self.assertEqual(self.arena.write(1, test_board.board), first + 1)
+        self.assertEqual(self.reader.generation(0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import events
+import tetramino
+
+
+class TestEventRing(unittest.TestCase):
+    '''
+    Events should come out of the ring in order, whatever its size
+    '''
+
+    def test_wrap_and_grow(self):
+        '''
+        ==> Records survive wrapping around and growing past capacity
+        '''
+        ring = events.EventRing(capacity=2)
+        ring.push(events.MOVE, 1, 2)
+        self.assertEqual(ring.decode(), [(events.MOVE, 1, 2)])
+        for col in range(5):
+            ring.push(events.MOVE, 0, col)
+        ring.push(events.LOSS)
+        self.assertEqual(ring.capacity, 8)
+        self.assertEqual(ring.decode(), [(events.MOVE, 0, col) for col in range(5)] + [(events.LOSS,)])
+        self.assertEqual(len(ring), 0)
+
+    def test_network_updates(self):
+        '''
+        ==> Arguments decoded from the network become events, the queue included
+        '''
+        ring = events.EventRing()
+        shape_ids = tetramino.pieces_data[0]['shape_ids']
+        events.push_args(ring, events.PIECE, (shape_ids[1], 3, 4))
+        events.push_args(ring, events.QUEUE, shape_ids[:events.ARITY[events.QUEUE]])
+        events.push_args(ring, events.LOSS, ())
+        self.assertEqual(ring.decode(), [(events.PIECE, shape_ids[1], 3, 4),
+                                         (events.QUEUE,) + tuple(shape_ids[:events.ARITY[events.QUEUE]]),
+                                         (events.LOSS,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
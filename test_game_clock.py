@@ -0,0 +1,79 @@
+import unittest
+import game_clock
+
+
+class FakeSource:
+    '''
+    Monotonic nanosecond source moved by hand
+    '''
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestGameClock(unittest.TestCase):
+    '''
+    Game time should only move in whole timesteps and degrade predictably on heavy frames
+    '''
+
+    def setUp(self):
+        self.source = FakeSource()
+
+    def make_clock(self, policy):
+        return game_clock.GameClock(timestep=0.01, max_steps=5, policy=policy, max_lag=0.2, source=self.source)
+
+    def test_fixed_timesteps(self):
+        '''
+        ==> Partial timesteps are carried over to later frames
+        '''
+        clock = self.make_clock(game_clock.CATCH_UP)
+        self.source.now = 25000000
+        self.assertEqual(clock.advance(), 2)
+        self.source.now = 30000000
+        self.assertEqual(clock.advance(), 1)
+        self.assertAlmostEqual(clock.time(), 0.03)
+
+    def test_catch_up(self):
+        '''
+        ==> Steps owed by a heavy frame are spread over the next frames
+        '''
+        clock = self.make_clock(game_clock.CATCH_UP)
+        self.source.now = 80000000
+        self.assertEqual(clock.advance(), 5)
+        self.assertEqual(clock.advance(), 3)
+        self.assertAlmostEqual(clock.time(), 0.08)
+
+    def test_catch_up_lag_limit(self):
+        '''
+        ==> Long stalls are only caught up to max_lag
+        '''
+        clock = self.make_clock(game_clock.CATCH_UP)
+        self.source.now = 10 * 1000000000
+        clock.advance()
+        self.assertAlmostEqual(clock.lag(), 0.2)
+
+    def test_slow_motion(self):
+        '''
+        ==> Steps owed beyond max_steps are dropped
+        '''
+        clock = self.make_clock(game_clock.SLOW_MOTION)
+        self.source.now = 85000000
+        self.assertEqual(clock.advance(), 5)
+        self.assertEqual(clock.advance(), 0)
+        self.assertAlmostEqual(clock.lag(), 0.005)
+
+    def test_hold(self):
+        '''
+        ==> Time spent on hold never reaches game time
+        '''
+        clock = self.make_clock(game_clock.CATCH_UP)
+        self.source.now = 500000000
+        clock.hold()
+        self.source.now = 510000000
+        self.assertEqual(clock.advance(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import job_board
+from data import QUEUE_LENGTH
+
+
+class TestJobBoard(unittest.TestCase):
+    '''
+    Jobs should be dealt between workers, idle workers stealing from busy ones
+    '''
+
+    def make_jobs(self, game_IDs, epoch=0):
+        return [(game_ID, epoch, 1, 2 ** 63 + game_ID, game_ID % 7, -1, 0, 0, 5, False, *range(QUEUE_LENGTH))
+                for game_ID in game_IDs]
+
+    def test_dealt_in_chunks(self):
+        '''
+        ==> Every worker gets a contiguous share and takes it chunk by chunk
+        '''
+        jobs = job_board.JobBoard(workers=2, capacity=8, chunk=2)
+        self.assertEqual(jobs.submit(self.make_jobs(range(6))), 2)
+        self.assertEqual(jobs.take(0), self.make_jobs([0, 1]))
+        self.assertEqual(jobs.take(1), self.make_jobs([3, 4]))
+        self.assertEqual(jobs.pending(), 2)
+
+    def test_work_stealing(self):
+        '''
+        ==> A worker out of jobs takes the back half of the fullest deque
+        '''
+        jobs = job_board.JobBoard(workers=3, capacity=8, chunk=8)
+        self.assertEqual(jobs.submit(self.make_jobs(range(4))), 2)
+        self.assertEqual(jobs.take(2), self.make_jobs([1]))
+        self.assertEqual(jobs.take(0), self.make_jobs([0]))
+        self.assertEqual(jobs.take(0), self.make_jobs([3]))
+        self.assertEqual(jobs.take(1), self.make_jobs([2]))
+        self.assertEqual(jobs.take(1), [])
+
+    def test_submitted_twice(self):
+        '''
+        ==> A game submitted again while queued keeps one place, with its newer job
+        '''
+        jobs = job_board.JobBoard(workers=2, capacity=4, chunk=8)
+        self.assertEqual(jobs.submit(self.make_jobs(range(4))), 2)
+        self.assertEqual(jobs.submit(self.make_jobs([2, 1], epoch=1)), 0)
+        self.assertEqual(jobs.pending(), 4)
+        self.assertEqual(jobs.take(0), self.make_jobs([0]) + self.make_jobs([1], epoch=1))
+        # Claimed jobs are no longer queued, their game gets a new place
+        self.assertEqual(jobs.submit(self.make_jobs([0, 1])), 2)
+        self.assertEqual(jobs.take(1), self.make_jobs([2], epoch=1) + self.make_jobs([3, 1]))
+        self.assertEqual(jobs.take(0), self.make_jobs([0]))
+
+    def test_cancel(self):
+        '''
+        ==> Cancelled games lose their queued job, a new epoch cancels every job, claimed ones included
+        '''
+        jobs = job_board.JobBoard(workers=2, capacity=8, chunk=8)
+        jobs.submit(self.make_jobs(range(4)))
+        jobs.cancel(1)
+        self.assertEqual(jobs.take(0), self.make_jobs([0]))
+        jobs.submit(self.make_jobs([4]))
+        claimed = jobs.take(1)
+        self.assertEqual(claimed, self.make_jobs([2, 3]))
+        self.assertFalse(jobs.cancelled(claimed[0]))
+        self.assertEqual(jobs.new_epoch(), 1)
+        self.assertTrue(jobs.cancelled(claimed[0]))
+        self.assertEqual(jobs.pending(), 0)
+        jobs.submit(self.make_jobs([5], epoch=1))
+        self.assertEqual(jobs.take(1), self.make_jobs([5], epoch=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
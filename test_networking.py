@@ -0,0 +1,126 @@
+import socket
+import threading
+import time
+import unittest
+
+import events
+import networking
+import protocol
+
+
+class TestNetwork(unittest.TestCase):
+    '''
+    The network thread should follow the commands of the main thread and serve datagrams as they come in
+    '''
+
+    def setUp(self):
+        # Datagrams from this test come from 127.0.0.1, which must not pass for the network's own IP
+        self.peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.peer.bind(('127.0.0.1', 0))
+        self.peer.settimeout(2)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.bind(('', 0))
+            port = probe.getsockname()[1]
+        self.network = networking.Network(port, '224.3.29.71', 1)
+        self.network.host_data['10.9.9.9'] = self.network.host_data.pop(self.network.my_IP)
+        self.network.my_IP = '10.9.9.9'
+        # Broadcasts go to the peer socket instead of the multicast group
+        self.network.multicast_group = self.peer.getsockname()
+        self.address = ('127.0.0.1', port)
+        self.thread = threading.Thread(target=self.network.loop, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.network.command('stop')
+        self.thread.join(2)
+        self.peer.close()
+
+    def wait_for(self, condition):
+        '''
+        Wait for the network thread to bring condition about
+        '''
+        limit = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), limit, 'network thread did not get there in time')
+            time.sleep(0.01)
+
+    def broadcast(self):
+        '''
+        Return the opcode and data of the next datagram the network sent
+        '''
+        buffer = bytearray(protocol.MAX_DATAGRAM)
+        size = self.peer.recv_into(buffer)
+        return protocol.decode(memoryview(buffer)[:size])
+
+    def test_scan(self):
+        '''
+        ==> The status is announced on a timer and announces from other hosts are kept, junk being ignored
+        '''
+        status = {'status': 'scan', 'host': 'here', 'players': 1, 'max': 8, 'AI': True}
+        self.network.my_data = status
+        self.assertEqual(self.broadcast(), (protocol.ANNOUNCE, status))
+        other = {'status': 'scan', 'host': 'there', 'players': 2, 'max': 16, 'AI': False}
+        self.peer.sendto(b'junk', self.address)
+        self.peer.sendto(protocol.encode_announce(other), self.address)
+        self.wait_for(lambda: '127.0.0.1' in self.network.host_data)
+        self.assertEqual(self.network.host_data['127.0.0.1']['host'], 'there')
+
+    def test_sync_master(self):
+        '''
+        ==> The master sends game data, then the start signal once every host acknowledged it, and is through
+        '''
+        game_data = '10.9.9.9%0%0&127.0.0.1%1%1&AI%2%7'
+        self.network.command('sync_master', game_data, ['10.9.9.9', '127.0.0.1'])
+        opcode, data = self.broadcast()
+        while opcode == protocol.ANNOUNCE:
+            opcode, data = self.broadcast()
+        self.assertEqual((opcode, data), (protocol.GAME_DATA, game_data))
+        self.wait_for(lambda: self.network.task == 'sync_master')
+        self.assertFalse(self.network.sync_status['all_acks'])
+        self.assertFalse(self.network.wait_for_sync(0))
+        self.peer.sendto(protocol.encode_signal(protocol.ACK), self.address)
+        self.assertEqual(self.broadcast(), (protocol.SYNC, None))
+        self.assertTrue(self.network.wait_for_sync(2))
+        self.assertTrue(all(self.network.sync_status.values()))
+        # The next command starts over
+        self.network.command('reset')
+        self.assertFalse(self.network.wait_for_sync(0))
+
+    def test_sync(self):
+        '''
+        ==> A client acknowledges game data giving it games, then is through once the start signal comes
+        '''
+        self.network.command('sync')
+        self.wait_for(lambda: self.network.task == 'sync')
+        self.peer.sendto(protocol.encode_game_data('127.0.0.1%0%0&AI%1%7'), self.address)
+        self.peer.sendto(protocol.encode_game_data('127.0.0.1%0%0&10.9.9.9%1%1&AI%2%7'), self.address)
+        opcode, data = self.broadcast()
+        while opcode == protocol.ANNOUNCE:
+            opcode, data = self.broadcast()
+        self.assertEqual(opcode, protocol.ACK)
+        self.assertEqual(self.network.game_data, '127.0.0.1%0%0&10.9.9.9%1%1&AI%2%7')
+        self.assertFalse(self.network.sync_status['sync_recv'])
+        self.assertFalse(self.network.wait_for_sync(0))
+        self.peer.sendto(protocol.encode_signal(protocol.SYNC), self.address)
+        self.assertTrue(self.network.wait_for_sync(2))
+        self.assertTrue(all(self.network.sync_status.values()))
+
+    def test_game(self):
+        '''
+        ==> Every update waiting on the socket comes out in order, batched or alone
+        '''
+        self.network.command('game')
+        self.wait_for(lambda: self.network.task == 'game')
+        outbox = protocol.Outbox()
+        outbox.queue(3, events.MOVE, (0, 5))
+        outbox.queue(3, events.CLEAR, (1, 100))
+        for datagram in outbox.flush():
+            self.peer.sendto(datagram, self.address)
+        self.peer.sendto(protocol.encode_update(4, events.MOVE, (1, 2), 7), self.address)
+        self.wait_for(lambda: len(self.network.game_updates) == 3)
+        self.assertEqual(list(self.network.game_updates), [(3, 0, events.MOVE, (0, 5)), (3, 1, events.CLEAR, (1, 100)),
+                                                           (4, 7, events.MOVE, (1, 2))])
+
+
+if __name__ == '__main__':
+    unittest.main()
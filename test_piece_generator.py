@@ -0,0 +1,33 @@
+import random
+import unittest
+import piece_generator
+import tetramino
+
+
+class TestPieceGen(unittest.TestCase):
+    '''
+    Pieces should come as type ids, every type once per bag
+    '''
+
+    def test_bags_of_type_ids(self):
+        '''
+        ==> Each run of seven pieces holds every type exactly once
+        '''
+        piece_gen = piece_generator.PieceGen(random.Random(3))
+        series = [next(piece_gen) for _ in range(70)]
+        for start in range(0, 70, 7):
+            self.assertEqual(sorted(series[start:start + 7]), list(range(7)))
+
+    def test_shared_piece_tables(self):
+        '''
+        ==> Pieces of a type share its compiled tables and carry no attribute dictionary
+        '''
+        first, second = tetramino.Piece(2), tetramino.Piece(2)
+        second.turn_clockwise()
+        self.assertIs(first.piece_data, second.piece_data)
+        self.assertIs(second.current_masks, tetramino.pieces_data[2]['masks'][1])
+        self.assertFalse(hasattr(first, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,43 @@
 import unittest
+import ai
 import player_game
+import tetramino
+
+
+class TestRow(unittest.TestCase):
+    '''
+    The bitmask of a row should follow its slots through every list operation
+    '''
+
+    def assert_mask_matches(self, row):
+        self.assertEqual(row.mask, sum(1 << col for col, item in enumerate(row) if item))
+
+    def test_mask_follows_slots(self):
+        '''
+        ==> Item and slice assignment, append, insert, pop, removal and extension keep the mask in step
+        '''
+        row = player_game.Row([9, 0, 0, 2, 0, 9])
+        self.assert_mask_matches(row)
+        operations = [
+            lambda: row.__setitem__(1, 4),
+            lambda: row.__setitem__(-3, 0),
+            lambda: row.__setitem__(slice(1, 3), [0, 5, 6]),
+            lambda: row.append(3),
+            lambda: row.append(0),
+            lambda: row.insert(0, 0),
+            lambda: row.insert(2, 7),
+            lambda: row.pop(),
+            lambda: row.pop(0),
+            lambda: row.__delitem__(slice(0, 2)),
+            lambda: row.remove(0),
+            lambda: row.extend([1, 0]),
+            lambda: row.__iadd__([0, 2]),
+        ]
+        for operation in operations:
+            operation()
+            self.assert_mask_matches(row)
+        row.clear()
+        self.assertEqual(row.mask, 0)
 
 
 class TestClearLines(unittest.TestCase):
@@ -9,7 +47,7 @@ class TestClearLines(unittest.TestCase):
     '''
     # Set up board
     test_board = player_game.ActiveBoard(False)
-    test_board.piece = test_board.piece_gen.__next__()
+    test_board.piece = tetramino.Piece(test_board.piece_gen.__next__())
 
 
     def test_clear_full_lines(self):
@@ -93,7 +131,7 @@ class TestValidPositions(unittest.TestCase):
     '''
     # Set up board
     test_board = player_game.ActiveBoard(False)
-    test_board.piece = test_board.piece_gen.__next__()
+    test_board.piece = tetramino.Piece(test_board.piece_gen.__next__())
 
     # Testing locations
     # index: 0, 1, 2, 3, 4,  ...  11, 12, 13, 14, 15
@@ -108,6 +146,7 @@ class TestValidPositions(unittest.TestCase):
 
     # Inject a piece in the middle
     test_board.board[test_piece_row][test_piece_col] = 9
+    test_board.update_heights()
 
     # Set up test piece
     # 0 0 0 0
@@ -204,7 +243,7 @@ class TestCorrectLock(unittest.TestCase):
     '''
     # Set up board
     test_board = player_game.ActiveBoard(False)
-    test_board.piece = test_board.piece_gen.__next__()
+    test_board.piece = tetramino.Piece(test_board.piece_gen.__next__())
 
 
     def test_floor_lock(self):
@@ -261,5 +300,157 @@ class TestCorrectLock(unittest.TestCase):
 
 
 
+class TestKicks(unittest.TestCase):
+    '''
+    Kicked rotations should only land pieces on valid positions
+    '''
+
+    def test_clockwise_kick(self):
+        '''
+        ==> A clockwise turn is kicked according to the clockwise shape
+        '''
+        test_board = player_game.ActiveBoard(False)
+        test_board.board[6][5] = 2
+        test_board.update_heights()
+        test_board.piece = tetramino.Piece(4)
+        test_board.piece.unsafe_shape_change(1)
+        test_board.piece_row, test_board.piece_col = 5, 2
+        test_board.turn_clockwise()
+        self.assertEqual(test_board.piece.shape_index, 2)
+        self.assertTrue(test_board.is_position_valid(test_board.piece_row, test_board.piece_col))
+
+
+class TestColumnHeights(unittest.TestCase):
+    '''
+    Column heights should follow the board through locks, line clears and bonus lines
+    '''
+
+    def assert_heights_match_board(self, test_board):
+        heights = list(test_board.heights)
+        test_board.update_heights()
+        self.assertEqual(heights, test_board.heights)
+
+    def test_heights_after_lock_and_clear(self):
+        '''
+        ==> Locking and clearing pieces keeps heights in sync with board
+        '''
+        test_board = player_game.ActiveBoard(False)
+        bottom = test_board.FIELD_HEIGHT + test_board.FIELD_V_BOUND - 1
+        # Fill the bottom row except for one slot, then drop a piece in it
+        for col in range(test_board.FIELD_H_BOUND, test_board.FIELD_H_BOUND + test_board.FIELD_WIDTH - 1):
+            test_board.board[bottom][col] = 9
+        test_board.board[bottom - 2][test_board.FIELD_H_BOUND] = 9
+        test_board.update_heights()
+        test_board.drop()
+        self.assert_heights_match_board(test_board)
+        test_board.piece_col = test_board.FIELD_H_BOUND + test_board.FIELD_WIDTH - 2
+        test_board.drop()
+        self.assert_heights_match_board(test_board)
+
+    def test_rows_are_recycled(self):
+        '''
+        ==> Line clears and bonus lines reuse the board's own row objects
+        '''
+        test_board = player_game.ActiveBoard(False)
+        rows = set(map(id, test_board.board))
+        bottom = test_board.FIELD_HEIGHT + test_board.FIELD_V_BOUND - 1
+        for col in range(test_board.FIELD_H_BOUND, test_board.FIELD_H_BOUND + test_board.FIELD_WIDTH):
+            test_board.board[bottom][col] = 9
+        test_board.clear_full_lines()
+        test_board.bonus_lines = 2
+        test_board.drop()
+        self.assertEqual(rows, set(map(id, test_board.board)))
+        self.assertEqual(test_board.board[0].mask, test_board.NEW_LINE_MASK)
+        self.assert_heights_match_board(test_board)
+
+    def test_hash_follows_board(self):
+        '''
+        ==> The incrementally updated hash matches a hash rebuilt from the board
+        '''
+        test_board = player_game.ActiveBoard(False, seed=4)
+        for turn in range(30):
+            if turn % 7 == 0:
+                test_board.bonus_lines = 2
+            test_board.step(('move_left', 'drop'))
+            board_hash = test_board.hash
+            test_board.update_hash()
+            self.assertEqual(board_hash, test_board.hash)
+
+    def test_predict_drop(self):
+        '''
+        ==> The predicted board is the board left by the drop, line clears included, the game untouched
+        '''
+        test_board = player_game.ActiveBoard(False, seed=5)
+        for _ in range(40):
+            new_shape, new_col = ai.quick_fill(test_board.board, test_board.piece.piece_data)
+            test_board.step((('unsafe_move_to', new_shape, test_board.piece_row, new_col),))
+            board_hash = test_board.hash
+            predicted = test_board.predict_drop()
+            self.assertEqual(test_board.hash, board_hash)
+            test_board.step(('drop',))
+            self.assertEqual(predicted, test_board.board)
+            self.assertEqual([line.mask for line in predicted], [line.mask for line in test_board.board])
+        self.assertGreater(test_board.lines_cleared, 0)
+
+    def test_heights_after_bonus_lines(self):
+        '''
+        ==> Bonus lines push every column surface up
+        '''
+        test_board = player_game.ActiveBoard(False)
+        test_board.drop()
+        test_board.bonus_lines = 3
+        test_board.drop()
+        self.assert_heights_match_board(test_board)
+        self.assertEqual(test_board.lowest_possible(), test_board.lowest_possible(masks=test_board.piece.current_masks))
+
+
+class TestHeadlessEngine(unittest.TestCase):
+    '''
+    Seeded games stepped explicitly should be reproducible and only move with game time
+    '''
+
+    def test_same_seed_same_game(self):
+        '''
+        ==> Two games with the same seed and actions produce the same reports and board
+        '''
+        actions = ['move_left', 'turn_clockwise', 'drop', 'move_right', 'store_piece', 'drop', 'drop']
+        games = [player_game.ActiveBoard(False, seed=1234) for _ in range(2)]
+        steps = [[game.step((action,), 0.3) for action in actions] for game in games]
+        self.assertEqual(steps[0], steps[1])
+        self.assertEqual(games[0].board, games[1].board)
+
+    def test_gravity_follows_step_time(self):
+        '''
+        ==> Pieces only fall once a full tick length of game time has elapsed
+        '''
+        test_board = player_game.ActiveBoard(False, seed=1)
+        row = test_board.piece_row
+        test_board.step(dt=test_board.tick_length() / 2)
+        self.assertEqual(test_board.piece_row, row)
+        test_board.step(dt=test_board.tick_length() * 3)
+        self.assertEqual(test_board.piece_row, row + 3)
+
+    def test_tick_count(self):
+        '''
+        ==> Gravity moves once per tick length over several seconds, whatever the speed and level
+        '''
+        for level, fast, seconds, moves in ((1, False, 4, 4), (1, True, 3, 15), (5, False, 1, 5), (3, False, 5, 15)):
+            test_board = player_game.ActiveBoard(False, seed=1)
+            test_board.level = level
+            test_board.speed_up(fast)
+            row = test_board.piece_row
+            for _ in range(seconds * 10):
+                test_board.step(dt=0.1)
+            self.assertEqual(test_board.piece_row - row, moves, (level, fast))
+
+    def test_unknown_action(self):
+        '''
+        ==> Only game actions can be stepped
+        '''
+        test_board = player_game.ActiveBoard(False, seed=1)
+        with self.assertRaises(ValueError):
+            test_board.step(('lock_piece',))
+
+
 if __name__ == '__main__':
     unittest.main()
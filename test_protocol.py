@@ -0,0 +1,137 @@
+import unittest
+import ai
+import display_game
+import events
+import player_game
+import protocol
+import tetramino
+
+
+class TestProtocol(unittest.TestCase):
+    '''
+    Messages should come out of decode as they went into their encoder, anything else being refused
+    '''
+
+    def test_round_trip(self):
+        '''
+        ==> Every message decodes to what was encoded, from a view of a receive buffer
+        '''
+        board = player_game.ActiveBoard(False, seed=1).board
+        announce = {'status': 'scan', 'host': 'hôte', 'players': 2, 'max': 32, 'AI': True}
+        messages = [
+            (protocol.encode_announce(announce), (protocol.ANNOUNCE, announce)),
+            (protocol.encode_game_data('10.0.0.1%0%1&AI%2%31'), (protocol.GAME_DATA, '10.0.0.1%0%1&AI%2%31')),
+            (protocol.encode_signal(protocol.ACK), (protocol.ACK, None)),
+            (protocol.encode_update(3, events.MOVE, (-1, 12), 65535), (events.MOVE, (3, 65535, (-1, 12)))),
+            (protocol.encode_update(3, events.PIECE, (20, 0, 6)), (events.PIECE, (3, 0, (20, 0, 6)))),
+            (protocol.encode_update(3, events.QUEUE, (1, 2, 3, 4)), (events.QUEUE, (3, 0, (1, 2, 3, 4)))),
+            (protocol.encode_update(3, events.CLEAR, (4, 12800)), (events.CLEAR, (3, 0, (4, 12800)))),
+            (protocol.encode_update(31, protocol.BONUS, (2,)), (protocol.BONUS, (31, 0, (2,)))),
+            (protocol.encode_update(3, events.LOSS), (events.LOSS, (3, 0, ()))),
+            (protocol.encode_update(3, events.BOARD, (17, 18, 5, 1 << 19 | 1 << 18, 2, 7)),
+             (events.BOARD, (3, 0, (17, 18, 5, 1 << 19 | 1 << 18, 2, 7)))),
+            (protocol.encode_update(3, protocol.KEYFRAME, (board,)), (protocol.KEYFRAME, (3, 0, (board,)))),
+            (protocol.encode_update(3, protocol.KEYFRAME_REQUEST), (protocol.KEYFRAME_REQUEST, (3, 0, ()))),
+        ]
+        buffer = bytearray(1024)
+        view = memoryview(buffer)
+        for message, decoded in messages:
+            buffer[:len(message)] = message
+            self.assertEqual(protocol.decode(view[:len(message)]), decoded)
+
+    def test_refused(self):
+        '''
+        ==> Other versions, unknown opcodes and truncated messages raise ProtocolError
+        '''
+        message = protocol.encode_update(3, events.MOVE, (1, 2))
+        for bad in (bytes([protocol.VERSION + 1]) + message[1:], bytes([protocol.VERSION, 200]), message[:-1],
+                    message + b'\x00', protocol.encode_announce({'status': 'scan', 'host': 'a', 'players': 1,
+                                                                 'max': 4, 'AI': False})[:-1]):
+            with self.assertRaises(protocol.ProtocolError):
+                protocol.decode(bad)
+
+    def test_out_of_range(self):
+        '''
+        ==> Unknown shape ids and keyframes of another board size raise ProtocolError, alone or in a batch
+        '''
+        shape_id = len(tetramino.SHAPES)
+        board = player_game.ActiveBoard(False, seed=1).board
+        for opcode, args in ((events.HOLD, (shape_id,)), (events.SHAPE, (shape_id,)),
+                             (events.PIECE, (shape_id, 0, 6)), (events.QUEUE, (1, 2, 3, shape_id)),
+                             (events.BOARD, (shape_id, 18, 5, 0, 0, 0)), (protocol.KEYFRAME, (board[:-1],)),
+                             (protocol.KEYFRAME, ([line[1:] for line in board],))):
+            for message in (protocol.encode_update(3, opcode, args),
+                            protocol.encode_batch([protocol.encode_entry(2, events.MOVE, (0, 5)),
+                                                   protocol.encode_entry(3, opcode, args)])):
+                with self.assertRaises(protocol.ProtocolError):
+                    protocol.decode(message)
+
+    def test_outbox(self):
+        '''
+        ==> A frame's updates come out as batches of datagram size, superseded moves and shapes left out
+        '''
+        board = player_game.ActiveBoard(False, seed=1).board
+        outbox = protocol.Outbox()
+        outbox.queue(2, events.MOVE, (0, 5))
+        outbox.queue(3, events.MOVE, (1, 5))
+        outbox.queue(2, events.SHAPE, (4,))
+        outbox.queue(2, events.MOVE, (0, 6))
+        outbox.queue(3, events.PIECE, (7, 0, 6))
+        for game_ID in range(4):
+            outbox.queue(game_ID, protocol.KEYFRAME, (board,))
+        outbox.queue(2, events.MOVE, (1, 6))
+        datagrams = outbox.flush()
+        self.assertEqual(outbox.flush(), [])
+        self.assertEqual(len(datagrams), 2)
+        self.assertTrue(all(len(datagram) <= protocol.MAX_DATAGRAM for datagram in datagrams))
+        updates = [update for datagram in datagrams for update in protocol.decode(datagram)[1]]
+        self.assertEqual(updates, [(2, 0, events.SHAPE, (4,)), (3, 0, events.PIECE, (7, 0, 6))]
+                         + [(game_ID, 1 if game_ID in (2, 3) else 0, protocol.KEYFRAME, (board,))
+                            for game_ID in range(4)]
+                         + [(2, 2, events.MOVE, (1, 6))])
+
+    def test_reorder(self):
+        '''
+        ==> Updates come out in the order they were sent, gaps left open too long being reported
+        '''
+        # Sequence numbers wrap around after 65535
+        updates = [(2, (65534 + col) % 65536, events.PIECE, (7, 0, col)) for col in range(6)]
+        reorder_buffer = protocol.ReorderBuffer()
+        in_order = []
+        for update in (updates[0], updates[2], updates[1], updates[1], updates[3], (5, 0, protocol.BONUS, (1,)),
+                       updates[5]):
+            in_order.extend(reorder_buffer.receive(*update, now=0))
+        self.assertEqual(in_order, [(2, events.PIECE, (7, 0, col)) for col in range(4)] + [(5, protocol.BONUS, (1,))])
+        self.assertEqual(reorder_buffer.expire(0.05), ([], []))
+        self.assertEqual(reorder_buffer.expire(0.1), ([(2, events.PIECE, (7, 0, 5))], [2]))
+        self.assertEqual(reorder_buffer.receive(*updates[4], now=0.2), [])
+
+
+class TestBoardChanges(unittest.TestCase):
+    '''
+    A remote copy of a board should follow the game from the changes reported with each piece
+    '''
+
+    def test_replay_changes(self):
+        '''
+        ==> Locks, line clears and bonus lines replayed from BOARD events rebuild the board
+        '''
+        test_board = player_game.ActiveBoard(False, seed=5)
+        remote = display_game.Board()
+        remote.board = [list(line) for line in test_board.board]
+        test_board.events.clear()
+        for turn in range(60):
+            if turn % 12 == 11:
+                test_board.bonus_lines = 2
+            new_shape, new_col = ai.quick_fill(test_board.board, test_board.piece.piece_data)
+            reports = test_board.step((('unsafe_move_to', new_shape, test_board.piece_row, new_col), 'drop'))
+            for opcode, *args in reports:
+                if opcode == events.BOARD:
+                    remote.apply_changes(*args)
+            self.assertEqual(remote.board, test_board.board)
+        self.assertFalse(test_board.lost)
+        self.assertGreater(test_board.lines_cleared, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import scheduler
+
+
+class TestTickScheduler(unittest.TestCase):
+    '''
+    Only games whose deadline has passed should come out of the scheduler
+    '''
+
+    def test_due_in_deadline_order(self):
+        '''
+        ==> Due games come out earliest first, others stay scheduled
+        '''
+        ticks = scheduler.TickScheduler()
+        for game_ID, deadline in enumerate([3, 1, 2, 5]):
+            ticks.schedule(game_ID, deadline)
+        self.assertEqual(ticks.due(2.5), [1, 2])
+        self.assertEqual(ticks.next_deadline(), 3)
+        self.assertEqual(ticks.due(10), [0, 3])
+        self.assertEqual(ticks.due(20), [])
+
+    def test_reschedule_and_cancel(self):
+        '''
+        ==> Moved deadlines replace old ones, cancelled games never come out
+        '''
+        ticks = scheduler.TickScheduler()
+        ticks.schedule(0, 1)
+        ticks.schedule(1, 1)
+        ticks.schedule(0, 4)
+        ticks.cancel(1)
+        self.assertEqual(ticks.due(2), [])
+        ticks.schedule(0, 0.5)
+        self.assertEqual(ticks.due(2), [0])
+        self.assertIsNone(ticks.next_deadline())
+
+
+class TestDecisionScheduler(unittest.TestCase):
+    '''
+    AI decisions should go out most urgent first, cheap when they can't make it in time
+    '''
+
+    def test_deadline_order_and_degrade(self):
+        '''
+        ==> Earliest deadlines come first, jobs beyond the workers' reach are flagged cheap
+        '''
+        decisions = scheduler.DecisionScheduler(workers=2, smoothing=1)
+        decisions.search_time = 1
+        for game_ID, deadline in enumerate([5, 1.5, 3, 1.5]):
+            decisions.request(game_ID, deadline, 0)
+        self.assertEqual(decisions.submit(0), [(1, False), (3, False), (2, False), (0, False)])
+        for game_ID, deadline in enumerate([5, 1.5, 3]):
+            decisions.request(game_ID + 4, deadline, 0)
+        # Four jobs already in flight: new ones are three rounds away at best
+        self.assertEqual(decisions.submit(0), [(5, True), (6, False), (4, False)])
+
+    def test_latency_and_misses(self):
+        '''
+        ==> Latency runs from request to result, late results count as misses
+        '''
+        decisions = scheduler.DecisionScheduler(workers=1)
+        decisions.request(0, 1, 0)
+        decisions.submit(0.5)
+        self.assertTrue(decisions.complete(0, 0.75))
+        decisions.request(0, 2, 1)
+        decisions.submit(1)
+        self.assertFalse(decisions.complete(0, 2.25))
+        self.assertIsNone(decisions.complete(0, 3))
+        self.assertEqual(decisions.report(), {0: (2, 1, 1.25, 1)})
+
+
+    def test_requeue(self):
+        '''
+        ==> Cancelled decisions go back to waiting, to be submitted again
+        '''
+        decisions = scheduler.DecisionScheduler(workers=1)
+        decisions.request(0, 2, 0)
+        decisions.request(1, 1, 0)
+        self.assertEqual(len(decisions.submit(0)), 2)
+        decisions.requeue()
+        self.assertIsNone(decisions.complete(0, 1))
+        self.assertEqual(decisions.submit(1), [(1, False), (0, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
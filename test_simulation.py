@@ -0,0 +1,60 @@
+import unittest
+import simulation
+import vector_ai
+
+
+class TestMatch(unittest.TestCase):
+    '''
+    Headless AI matches should be reproducible from their seed
+    '''
+
+    def test_same_seed_same_match(self):
+        '''
+        ==> Replaying a seed gives the same winner, length and scores
+        '''
+        results = []
+        for _ in range(2):
+            match = simulation.Match(players=3, seed=42)
+            winner = match.play(max_steps=60)
+            results.append((winner, match.steps, [game.score for game in match.games],
+                            [list(row) for game in match.games for row in game.board]))
+        self.assertEqual(results[0], results[1])
+
+    def test_match_ends_with_a_winner(self):
+        '''
+        ==> Playing on until a single game remains names it the winner
+        '''
+        match = simulation.Match(players=2, seed=7)
+        winner = match.play(max_steps=5000)
+        self.assertEqual(match.alive, [winner])
+
+
+@unittest.skipIf(vector_ai.numpy is None, 'numpy not installed')
+class TestBatchMatch(unittest.TestCase):
+    '''
+    Batched headless matches should be reproducible from their seed too
+    '''
+
+    def test_same_seed_same_match(self):
+        '''
+        ==> Replaying a seed gives the same winner, length, scores and boards
+        '''
+        results = []
+        for _ in range(2):
+            match = simulation.BatchMatch(players=8, seed=42)
+            winner = match.play(max_steps=60)
+            results.append((winner, match.steps, match.engine.score.tolist(), match.engine.boards.tolist()))
+        self.assertEqual(results[0], results[1])
+
+    def test_match_ends_with_a_winner(self):
+        '''
+        ==> Playing on until a single game remains names it the winner, every other game being lost
+        '''
+        match = simulation.BatchMatch(players=3, seed=5)
+        winner = match.play(max_steps=5000)
+        self.assertEqual(match.alive, [winner])
+        self.assertEqual(match.engine.lost.tolist(), [game_ID != winner for game_ID in range(3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
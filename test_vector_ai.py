@@ -0,0 +1,75 @@
+import unittest
+
+import board_arena
+import ai
+import player_game
+import tetramino
+import vector_ai
+
+
+@unittest.skipIf(vector_ai.numpy is None, 'numpy not installed')
+class TestVectorAI(unittest.TestCase):
+    '''
+    Vectorized evaluation should pick sound straight drops, the same one by one or in a batch
+    '''
+
+    def setUp(self):
+        self.test_board = player_game.ActiveBoard(False, seed=1)
+        self.bottom = self.test_board.FIELD_HEIGHT + self.test_board.FIELD_V_BOUND - 1
+        self.left = self.test_board.FIELD_H_BOUND
+
+    def play(self, test_board, pieces):
+        '''
+        Drop pieces where the vectorized evaluator says
+        '''
+        for _ in range(pieces):
+            new_shape, new_col = vector_ai.best_drop(test_board.board, test_board.piece.type_id)
+            test_board.step((('unsafe_move_to', new_shape, test_board.piece_row, new_col), 'drop'))
+
+    def test_fills_well(self):
+        '''
+        ==> A vertical I piece goes down the only gap of a nearly full bottom
+        '''
+        for row in range(self.bottom - 3, self.bottom + 1):
+            for col in range(self.left + 1, self.left + self.test_board.FIELD_WIDTH):
+                self.test_board.board[row][col] = 2
+        self.test_board.piece = tetramino.Piece(0)
+        self.play(self.test_board, 1)
+        self.assertEqual(self.test_board.lines_cleared, 4)
+
+    def test_batch_matches_single(self):
+        '''
+        ==> Deciding many boards at once gives the decision of each board alone
+        '''
+        test_boards = []
+        for seed in range(6):
+            test_board = player_game.ActiveBoard(False, seed=seed)
+            self.play(test_board, seed * 5)
+            test_boards.append(test_board)
+        boards = vector_ai.numpy.array([test_board.board for test_board in test_boards], dtype=vector_ai.numpy.uint8)
+        shapes, cols, rows = vector_ai.best_drops(boards, [test_board.piece.type_id for test_board in test_boards])
+        self.assertEqual(list(zip(shapes.tolist(), cols.tolist())),
+                         [vector_ai.best_drop(test_board.board, test_board.piece.type_id)
+                          for test_board in test_boards])
+
+    def test_solve_batch(self):
+        '''
+        ==> Jobs read from a board arena get moves leading to the chosen drop
+        '''
+        arena = board_arena.BoardArena(2)
+        try:
+            self.play(self.test_board, 6)
+            generation = arena.write(1, self.test_board.board)
+            job = (1, 0, generation, self.test_board.hash, self.test_board.piece.type_id, -1, 0,
+                   self.test_board.piece_row, self.test_board.piece_col, False)
+            ai.evaluation_cache.entries.clear()
+            [(game_ID, epoch, generation, moves)] = ai.solve_batch(arena, [job])
+            new_shape, new_col = vector_ai.best_drop(self.test_board.board, self.test_board.piece.type_id)
+            self.test_board.step(moves)
+            self.assertEqual((self.test_board.piece.shape_index, self.test_board.piece_col), (new_shape, new_col))
+        finally:
+            arena.close(unlink=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,34 +1,142 @@
+from data import pieces_data
+
+
+def shape_masks(shape):
+    '''
+    Convert a square shape into row bitmasks for board collision checks
+
+    Return (left, rows) where left is the first occupied column and rows holds a
+    (row, mask) pair for every occupied row, bit 0 of each mask being column left
+    '''
+    occupied = [col for line in shape for col in range(len(line)) if line[col]]
+    left = min(occupied) if occupied else 0
+    rows = []
+    for row in range(len(shape)):
+        mask = 0
+        for col in range(left, len(shape[row])):
+            if shape[row][col]:
+                mask |= 1 << (col - left)
+        if mask:
+            rows.append((row, mask))
+    return left, tuple(rows)
+
+
+def shape_cells(shape):
+    '''
+    Return the (row, col, color) of every occupied slot in a square shape
+    '''
+    return tuple((row, col, shape[row][col]) for row in range(len(shape)) for col in range(len(shape[row]))
+                 if shape[row][col])
+
+
+def shape_bottoms(shape):
+    '''
+    Return the (col, row) of the lowest occupied slot in every occupied column of a shape
+    '''
+    bottoms = {}
+    for row, col, color in shape_cells(shape):
+        bottoms[col] = max(row, bottoms.get(col, row))
+    return tuple(sorted(bottoms.items()))
+
+
+# Every shape met so far, indexed by shape id so events can refer to shapes by a small integer
+SHAPES = []
+shape_ids = {}
+
+
+def shape_id(shape):
+    '''
+    Return the id of a shape, registering it on first sight
+    '''
+    key = tuple(tuple(line) for line in shape)
+    if key not in shape_ids:
+        shape_ids[key] = len(SHAPES)
+        SHAPES.append(shape)
+    return shape_ids[key]
+
+
+# Id 0 is the empty shape, shown before any piece is held
+EMPTY_SHAPE = shape_id([[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+
+
+def compile_piece(piece_data):
+    '''
+    Add per-rotation cells, row masks, column bottoms and shape ids to a piece_data entry
+
+    Compiled once so collision checks never scan the empty slots of a shape
+    '''
+    piece_data['cells'] = [shape_cells(shape) for shape in piece_data['positions']]
+    piece_data['masks'] = [shape_masks(shape) for shape in piece_data['positions']]
+    piece_data['bottoms'] = [shape_bottoms(shape) for shape in piece_data['positions']]
+    piece_data['shape_ids'] = [shape_id(shape) for shape in piece_data['positions']]
+
+
+for type_id, piece in enumerate(pieces_data):
+    piece['type_id'] = type_id
+    compile_piece(piece)
+
+# Shape id of every piece type as it spawns, for queue reports
+SPAWN_SHAPE_IDS = tuple(piece['shape_ids'][0] for piece in pieces_data)
+
+
 class Piece():
     '''
     Hold basic information about a piece and manages it's rotation
+
+    Only the type and rotation belong to a piece, everything else points into the shared
+    compiled tables of its pieces_data entry
     '''
+    __slots__ = ('type_id', 'piece_data', 'size', 'shape_index', '_current_shape', 'current_cells',
+                 'current_masks', 'current_bottoms', 'current_shape_id')
 
-    def __init__(self, piece_data):
-        self.piece_data = piece_data
+    def __init__(self, type_id):
+        self.type_id = type_id
+        self.piece_data = pieces_data[type_id]
         self.size = len(self.piece_data['positions'][0])
         # part of the data where current shape is located
-        self.shape_index = 0
-        self.current_shape = self.piece_data['positions'][self.shape_index]
+        self.unsafe_shape_change(0)
+
+    @property
+    def current_shape(self):
+        return self._current_shape
+
+    @current_shape.setter
+    def current_shape(self, shape):
+        # Shapes set from outside the piece data are compiled on the spot
+        self._current_shape = shape
+        self.current_cells = shape_cells(shape)
+        self.current_masks = shape_masks(shape)
+        self.current_bottoms = shape_bottoms(shape)
+        self.current_shape_id = shape_id(shape)
 
 
     def counter_clockwise(self):
         return self.piece_data['positions'][(self.size + self.shape_index -1) % self.size]
 
 
+    def counter_clockwise_masks(self):
+        return self.piece_data['masks'][(self.size + self.shape_index -1) % self.size]
+
+
     def turn_counter_clockwise(self):
-        self.shape_index = (self.size + self.shape_index -1) % self.size
-        self.current_shape = self.piece_data['positions'][self.shape_index]
+        self.unsafe_shape_change((self.size + self.shape_index -1) % self.size)
 
 
     def clockwise(self):
         return self.piece_data['positions'][(self.shape_index +1) % self.size]
 
 
+    def clockwise_masks(self):
+        return self.piece_data['masks'][(self.shape_index +1) % self.size]
+
+
     def turn_clockwise(self):
-        self.shape_index = (self.shape_index +1) % self.size
-        self.current_shape = self.piece_data['positions'][self.shape_index]
+        self.unsafe_shape_change((self.shape_index +1) % self.size)
 
     def unsafe_shape_change(self, new_shape_index):
         self.shape_index = new_shape_index
-        self.current_shape = self.piece_data['positions'][new_shape_index]
-
+        self._current_shape = self.piece_data['positions'][new_shape_index]
+        self.current_cells = self.piece_data['cells'][new_shape_index]
+        self.current_masks = self.piece_data['masks'][new_shape_index]
+        self.current_bottoms = self.piece_data['bottoms'][new_shape_index]
+        self.current_shape_id = self.piece_data['shape_ids'][new_shape_index]
@@ -0,0 +1,141 @@
+try:
+    import numpy
+except ImportError:
+    # Vectorized evaluation is optional, the AI falls back to the search in ai.py
+    numpy = None
+
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT, EMPTY, WALL
+from tetramino import pieces_data
+
+FIELD_ROWS = FIELD_HEIGHT + FIELD_V_BOUND
+FIELD_COLS = slice(FIELD_H_BOUND, FIELD_H_BOUND + FIELD_WIDTH)
+# Candidate piece columns, as in ai.quick_fill
+COLS = range(FIELD_H_BOUND - 1, FIELD_WIDTH + FIELD_H_BOUND - 1)
+SIZE = 4
+
+# Weights of the placement features, lines cleared being worth the most
+LINES_WEIGHT = 0.8
+HEIGHT_WEIGHT = -0.5
+HOLES_WEIGHT = -0.4
+BUMPINESS_WEIGHT = -0.2
+BELOW_WEIGHT = 0.1
+
+if numpy is not None:
+    # Piece tables: (type, rotation, piece column) and (type, rotation, piece row)
+    PRESENT = numpy.zeros((len(pieces_data), SIZE, SIZE), dtype=bool)
+    BOTTOM = numpy.zeros((len(pieces_data), SIZE, SIZE), dtype=numpy.int16)
+    TOP = numpy.zeros((len(pieces_data), SIZE, SIZE), dtype=numpy.int16)
+    ROW_CELLS = numpy.zeros((len(pieces_data), SIZE, SIZE), dtype=numpy.int16)
+    for type_id, piece in enumerate(pieces_data):
+        for shape_index, cells in enumerate(piece['cells']):
+            for row, col, color in cells:
+                if not PRESENT[type_id, shape_index, col]:
+                    PRESENT[type_id, shape_index, col] = True
+                    TOP[type_id, shape_index, col] = row
+                BOTTOM[type_id, shape_index, col] = max(BOTTOM[type_id, shape_index, col], row)
+                ROW_CELLS[type_id, shape_index, row] += 1
+    # Board columns under each piece column of every candidate column
+    CANDIDATE_COLS = numpy.array(COLS)[:, None] + numpy.arange(SIZE)
+    # below_piece_score as a table of [holes (0, 1, more), floors (none, some)]
+    BELOW_SCORES = numpy.array([[6, 10], [1, 2], [0, 0]], dtype=numpy.int16)
+
+
+def column_heights(boards):
+    """
+    Return the first occupied row of every column of every board, (boards, cols)
+    """
+    occupied = boards != EMPTY
+    return numpy.where(occupied.any(axis=1), occupied.argmax(axis=1), boards.shape[1])
+
+
+def evaluate(boards, type_ids):
+    """
+    Score every straight drop of a piece on each board at once
+
+    boards is a (boards, rows, cols) uint8 array laid out like player_game.ActiveBoard.board,
+    type_ids the piece type of each board
+
+    Candidates are rotations x columns, landing on the column heights like ai.quick_fill. Each is scored
+    from the lines it clears, the aggregate height, holes it covers and bumpiness of the columns after it,
+    plus the below_piece_score bonus of what lies in the piece's square under its blocks
+
+    Return (scores, landing rows), two (boards, rotations, columns) arrays, scores of impossible drops being -inf
+    """
+    if numpy is None:
+        raise ImportError('vectorized evaluation requires numpy')
+    boards = numpy.asarray(boards, dtype=numpy.uint8)
+    type_ids = numpy.asarray(type_ids)
+    games = numpy.arange(len(boards))[:, None, None, None]
+    heights = column_heights(boards)
+
+    # (boards, rotations, candidate columns, piece columns)
+    present = PRESENT[type_ids][:, :, None, :]
+    bottom = BOTTOM[type_ids][:, :, None, :]
+    top = TOP[type_ids][:, :, None, :]
+    under = heights[:, CANDIDATE_COLS][:, None, :, :]
+    landing = numpy.where(present, under - 1 - bottom, FIELD_HEIGHT - 1).min(axis=3)
+    valid = landing >= 0
+    landing = numpy.maximum(landing, 0)
+    piece_rows = landing[..., None]
+
+    # Lines completed by the piece's rows
+    counts = (boards[:, :, FIELD_COLS] != EMPTY).sum(axis=2)
+    rows = piece_rows + numpy.arange(SIZE)
+    row_cells = ROW_CELLS[type_ids][:, :, None, :]
+    lines = ((row_cells > 0) & (counts[games, rows] + row_cells == FIELD_WIDTH)).sum(axis=3)
+
+    # Slots left empty between the piece and the surface under it
+    holes = numpy.where(present, under - 1 - (piece_rows + bottom), 0).sum(axis=3)
+
+    # Column heights once the piece is in
+    new_heights = numpy.broadcast_to(heights[:, None, None, :], landing.shape + heights.shape[1:]).copy()
+    candidates = numpy.arange(len(COLS))[:, None]
+    new_heights[:, :, candidates, CANDIDATE_COLS] = numpy.where(
+        present, numpy.minimum(piece_rows + top, under), under)
+    field_heights = FIELD_ROWS - new_heights[..., FIELD_COLS]
+    aggregate = field_heights.sum(axis=3) - lines * FIELD_WIDTH
+    bumpiness = numpy.abs(numpy.diff(field_heights, axis=3)).sum(axis=3)
+
+    # below_piece_score: slots of the piece's square under the lowest block of each of its columns
+    below_holes = 0
+    below_floors = 0
+    board_cols = numpy.broadcast_to(CANDIDATE_COLS, landing.shape + (SIZE,))
+    for step in range(1, SIZE):
+        inside = present & (bottom + step < SIZE)
+        slots = boards[games, numpy.minimum(piece_rows + bottom + step, boards.shape[1] - 1), board_cols]
+        below_holes = below_holes + (inside & (slots == EMPTY)).sum(axis=3)
+        below_floors = below_floors + (inside & (slots == WALL)).sum(axis=3)
+    below = BELOW_SCORES[numpy.minimum(below_holes, 2), numpy.minimum(below_floors, 1)]
+
+    scores = (LINES_WEIGHT * lines + HEIGHT_WEIGHT * aggregate + HOLES_WEIGHT * holes
+              + BUMPINESS_WEIGHT * bumpiness + BELOW_WEIGHT * below)
+    return numpy.where(valid, scores, -numpy.inf), landing
+
+
+def best_drops(boards, type_ids):
+    """
+    Pick the best straight drop of a piece on each board at once (see evaluate)
+
+    Ties go to the first shape and column
+
+    Return (shapes, columns, rows) arrays, shapes of boards where no drop fits being -1
+    """
+    scores, landing = evaluate(boards, type_ids)
+    flat = scores.reshape(len(scores), -1)
+    best = flat.argmax(axis=1)
+    shapes, candidates = numpy.divmod(best, len(COLS))
+    rows = landing[numpy.arange(len(scores)), shapes, candidates]
+    shapes = numpy.where(numpy.isfinite(flat[numpy.arange(len(flat)), best]), shapes, -1)
+    return shapes, candidates + COLS[0], rows
+
+
+def best_drop(board, type_id):
+    """
+    Pick the best straight drop of a piece on one board, rows being lists or buffers of slot values
+
+    Return the new shape and column, like ai.quick_fill, None if no drop fits
+    """
+    shapes, cols, rows = best_drops(numpy.array([board], dtype=numpy.uint8), [type_id])
+    if shapes[0] < 0:
+        return None
+    return int(shapes[0]), int(cols[0])
@@ -0,0 +1,36 @@
+import random
+
+from data import FIELD_H_BOUND, FIELD_V_BOUND, FIELD_WIDTH, FIELD_HEIGHT
+
+# Board dimensions, bottom wall rows included (see player_game.ActiveBoard)
+ROWS = FIELD_HEIGHT + FIELD_V_BOUND + FIELD_WIDTH // 2
+COLS = FIELD_WIDTH + 2 * FIELD_H_BOUND
+CHUNKS = (COLS + 7) // 8
+
+# One random key per row, byte of the row mask and value of that byte.
+# Seeded so every process (AI workers included) agrees on hashes
+_random = random.Random(0x7e7a)
+KEYS = [[[_random.getrandbits(64) for _ in range(256)] for _ in range(CHUNKS)] for _ in range(ROWS)]
+
+
+def row_key(row, mask):
+    """
+    Return the hash contribution of a row holding mask
+    """
+    key = 0
+    for chunk in KEYS[row]:
+        key ^= chunk[mask & 255]
+        mask >>= 8
+    return key
+
+
+def board_hash(masks):
+    """
+    Return the hash of a whole board from its row masks
+
+    Occupied slots are all alike to the hash, as they are to the AI: colors are left out
+    """
+    key = 0
+    for row, mask in enumerate(masks):
+        key ^= row_key(row, mask)
+    return key